@@ -0,0 +1,794 @@
+import asyncio
+import datetime
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import random
+import re
+import time
+from urllib.parse import urlencode, urlsplit
+
+import aiohttp
+
+from metrics import drive_errors, track_drive_call
+from service_accounts import DAILY_LIMIT_REASONS, ServiceAccountPool
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets']
+GOOGLE_API_ROOT = 'https://www.googleapis.com'
+SHEETS_API_ROOT = 'https://sheets.googleapis.com'
+BATCH_MAX_REQUESTS = 100
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Должен быть кратен 256 КБ
+UPLOAD_CHUNK_ALIGNMENT = 256 * 1024
+MULTIPART_THRESHOLD = 5 * 1024 * 1024
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'RESOURCE_EXHAUSTED'}
+UPLOADED_FILE_FIELDS = 'id, md5Checksum'  # Поля файла, которые возвращают загрузки
+
+
+class DriveApiError(Exception):
+    def __init__(self, status, message, reason=None, retry_after=None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def throttled(self):
+        return self.status == 429 or (self.status == 403 and self.reason in RATE_LIMIT_REASONS)
+
+    @property
+    def retryable(self):
+        return self.throttled or self.status in RETRYABLE_STATUSES
+
+
+class ApiResponse:
+    def __init__(self, status, headers, body, account=None):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.account = account
+
+    def json(self):
+        if not self.body:
+            return {}
+        return json.loads(self.body)
+
+
+class UploadStrategyStats:
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, size, seconds):
+        self.count += 1
+        self.bytes += size
+        self.seconds += seconds
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0, 'bytes': 0, 'avg_latency': 0.0, 'throughput_mb_s': 0.0}
+        return {
+            'count': self.count,
+            'bytes': self.bytes,
+            'avg_latency': self.seconds / self.count,
+            'throughput_mb_s': self.bytes / (1024 * 1024) / self.seconds if self.seconds else 0.0
+        }
+
+
+def _prepend_reader(head, read):
+    buffer = head
+
+    async def read_with_head(size):
+        nonlocal buffer
+        if not buffer:
+            return await read(size)
+        data, buffer = buffer[:size], buffer[size:]
+        if len(data) < size:
+            data += await read(size - len(data))
+        return data
+
+    return read_with_head
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def make_statistics_row(date, user_id, folder, file_names):
+    return [
+        date.strftime('%Y-%m-%d %H:%M:%S'),
+        str(user_id),
+        folder,
+        ', '.join(file_names),
+        str(len(file_names))
+    ]
+
+
+def escape_query_value(value):
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+class AsyncGoogleDriveService:
+    def __init__(self, credentials_file, pool_size=20, keepalive_timeout=60, refresh_margin=300,
+                 multipart_threshold=MULTIPART_THRESHOLD, chunk_size=UPLOAD_CHUNK_SIZE, max_retries=5,
+                 backoff_base=1.0, backoff_max=64.0, api_root=GOOGLE_API_ROOT, sheets_root=SHEETS_API_ROOT,
+                 account_strategy='least_loaded', account_cooldown=30.0, shared_drive_id=None):
+        # credentials_file - путь к ключу или список ключей сервисных аккаунтов одного общего диска
+        credentials_files = [credentials_file] if isinstance(credentials_file, str) else list(credentials_file)
+        self.accounts = ServiceAccountPool(credentials_files, SCOPES, strategy=account_strategy,
+                                           cooldown=account_cooldown)
+        self.shared_drive_id = shared_drive_id
+        self.drive_api_url = f"{api_root.rstrip('/')}/drive/v3"
+        self.drive_upload_url = f"{api_root.rstrip('/')}/upload/drive/v3"
+        self.drive_batch_url = f"{api_root.rstrip('/')}/batch/drive/v3"
+        self.sheets_api_url = f"{sheets_root.rstrip('/')}/v4"
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.refresh_margin = refresh_margin
+        self.multipart_threshold = multipart_threshold
+        self.chunk_size = max(UPLOAD_CHUNK_ALIGNMENT, chunk_size // UPLOAD_CHUNK_ALIGNMENT * UPLOAD_CHUNK_ALIGNMENT)
+        self.upload_stats = {'multipart': UploadStrategyStats(), 'resumable': UploadStrategyStats()}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = None
+        self.congestion_control = None
+        self.session = None
+        self._refresh_task = None
+
+    async def start(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        # Первый токен получается в фоне: запуск бота не ждет ответа oauth2.googleapis.com
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _refresh_loop(self):
+        # Токены обновляются заранее, до истечения срока, а не после ошибки 401
+        while True:
+            delay = None
+            for account in self.accounts.accounts:
+                try:
+                    await account.refresh_token(self.refresh_margin)
+                    account_delay = max(account.token_expires_in() - self.refresh_margin, 10)
+                except Exception as e:
+                    logger.error(f"Ошибка при фоновом обновлении токена {account.name}: {e}")
+                    account_delay = 30
+                delay = account_delay if delay is None else min(delay, account_delay)
+            await asyncio.sleep(delay)
+
+    def _session_account(self, session_uri):
+        # Resumable-сессия продолжается тем аккаунтом, который ее создал: его имя хранится
+        # во фрагменте URI сессии, фрагмент не отправляется на сервер и сохраняется в журнале загрузок
+        _, _, fragment = session_uri.partition('#account=')
+        return self.accounts.by_name.get(fragment)
+
+    def _drive_params(self, method, url, params):
+        # Общий диск: все запросы к файлам указывают supportsAllDrives, списки ищут по общему диску
+        path = urlsplit(url).path
+        if 'upload_id=' in url or not path.startswith(urlsplit(self.drive_api_url).path) and \
+                not path.startswith(urlsplit(self.drive_upload_url).path):
+            return params
+        params = dict(params or {}, supportsAllDrives='true')
+        if self.shared_drive_id and method == 'GET' and (path.endswith('/files') or path.endswith('/changes')
+                                                         or path.endswith('/changes/startPageToken')):
+            params['driveId'] = self.shared_drive_id
+            if not path.endswith('/startPageToken'):
+                params['includeItemsFromAllDrives'] = 'true'
+            if path.endswith('/files'):
+                params['corpora'] = 'drive'
+        return params
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        # Экспоненциальная задержка с полным джиттером, но не меньше Retry-After от сервера
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    async def _request(self, method, url, params=None, json_body=None, data=None, headers=None, ok_statuses=(),
+                       retry=True, account=None, idempotent=True):
+        # Все вызовы Drive и Sheets проходят здесь: 429, 5xx и 403 rateLimitExceeded повторяются
+        # с задержкой, 401 - один раз после принудительного обновления токена.
+        # Неидемпотентный запрос (создание файла, append) после 5xx или обрыва соединения мог уже
+        # выполниться, поэтому повторяется только при отказе до выполнения: 429, 403 rateLimitExceeded, 401
+        attempt = 0
+        token_refreshed = False
+        while True:
+            request_account = account or self.accounts.select()
+            token = request_account.token
+            try:
+                response = await self._send(request_account, method, url, params, json_body, data, headers,
+                                            ok_statuses)
+            except DriveApiError as error:
+                if error.status == 401 and not token_refreshed:
+                    token_refreshed = True
+                    await request_account.invalidate_token(token)
+                    continue
+                if error.throttled or error.reason in DAILY_LIMIT_REASONS:
+                    self.accounts.on_throttle(request_account, error)
+                    if account is None and self.accounts.available():
+                        # Квота исчерпана у одного аккаунта: запрос сразу уходит через другой
+                        continue
+                if error.throttled and self.congestion_control:
+                    self.congestion_control.on_throttle()
+                if (not retry or not error.retryable or (not idempotent and not error.throttled)
+                        or attempt >= self.max_retries):
+                    raise
+                delay = self._backoff_delay(attempt, error.retry_after)
+                logger.warning(f"{method} {urlsplit(url).path}: {error}, повтор через {delay:.1f} с")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                drive_errors.inc(status='network')
+                if not retry or not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"{method} {urlsplit(url).path}: сетевая ошибка {error!r}, повтор через {delay:.1f} с")
+            else:
+                self.accounts.on_success(request_account)
+                if self.congestion_control:
+                    self.congestion_control.on_success()
+                return response
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _send(self, account, method, url, params, json_body, data, headers, ok_statuses):
+        if self.session is None:
+            await self.start()
+        await account.ensure_token()
+        rate_limiter = account.rate_limiter or self.rate_limiter
+        if rate_limiter:
+            await rate_limiter.acquire()
+        request_headers = dict(headers or {})
+        request_headers['Authorization'] = f'Bearer {account.token}'
+        self.accounts.on_request(account)
+        account.in_flight += 1
+        try:
+            async with self.session.request(method, url, params=self._drive_params(method, url, params),
+                                            json=json_body, data=data, headers=request_headers,
+                                            allow_redirects=False) as response:
+                body = await response.read()
+        finally:
+            account.in_flight -= 1
+        if response.status >= 400 and response.status not in ok_statuses:
+            drive_errors.inc(status=response.status)
+            raise self._make_error(response.status, body, response.headers.get('Retry-After'))
+        return ApiResponse(response.status, response.headers, body, account)
+
+    @staticmethod
+    def _make_error(status, body, retry_after=None):
+        message = body.decode('utf-8', errors='replace')
+        reason = None
+        try:
+            error = json.loads(body).get('error', {})
+            message = error.get('message', message)
+            errors = error.get('errors') or [{}]
+            reason = errors[0].get('reason') or error.get('status')
+        except (ValueError, AttributeError):
+            pass
+        return DriveApiError(status, message, reason, parse_retry_after(retry_after))
+
+    async def _create(self, create, find):
+        # Повтор создания после 5xx или обрыва соединения: сначала find ищет объект, который мог
+        # успеть создаться, и только если его нет, запрос отправляется снова - второй копии не остается
+        attempt = 0
+        while True:
+            try:
+                return await create()
+            except (DriveApiError, aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # Ограничения скорости уже повторены в _request: запрос до выполнения не дошел
+                if isinstance(error, DriveApiError) and (error.throttled or not error.retryable):
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, getattr(error, 'retry_after', None))
+                logger.warning(f"Создание не подтверждено: {error!r}, проверка и повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                attempt += 1
+            created = await find()
+            if created:
+                return created
+
+    async def _find_created(self, parent_id, name, mime_type=None, md5=None):
+        query = (f"name='{escape_query_value(name)}' and '{escape_query_value(parent_id)}' in parents"
+                 f" and trashed=false")
+        if mime_type:
+            query += f" and mimeType='{mime_type}'"
+        files = await self._list_files(query, fields=f'files({UPLOADED_FILE_FIELDS})')
+        return next((file for file in files if md5 is None or file.get('md5Checksum') == md5), None)
+
+    async def _list_files(self, query, fields='files(id, name)'):
+        files = []
+        page_token = None
+        while True:
+            params = {'q': query, 'fields': f'nextPageToken, {fields}', 'pageSize': '1000'}
+            if page_token:
+                params['pageToken'] = page_token
+            result = (await self._request('GET', f'{self.drive_api_url}/files', params=params)).json()
+            files.extend(result.get('files', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return files
+
+    @track_drive_call
+    async def get_child_folders(self, parent_ids):
+        # Один запрос на группу родителей вместо отдельного списка для каждой папки
+        folders = []
+        parent_ids = list(parent_ids)
+        for start in range(0, len(parent_ids), 20):
+            parents_query = ' or '.join(f"'{escape_query_value(parent_id)}' in parents"
+                                        for parent_id in parent_ids[start:start + 20])
+            folders.extend(await self._list_files(
+                f"({parents_query}) and mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
+                fields='files(id, name, parents)'
+            ))
+        return folders
+
+    @track_drive_call
+    async def list_children(self, parent_ids, fields='files(id, name, mimeType, size, parents)'):
+        # Все дочерние элементы группы папок с полной пагинацией, по 20 родителей в запросе
+        children = []
+        parent_ids = list(parent_ids)
+        for start in range(0, len(parent_ids), 20):
+            parents_query = ' or '.join(f"'{escape_query_value(parent_id)}' in parents"
+                                        for parent_id in parent_ids[start:start + 20])
+            children.extend(await self._list_files(f"({parents_query}) and trashed=false", fields=fields))
+        return children
+
+    @track_drive_call
+    async def get_start_page_token(self):
+        response = await self._request('GET', f'{self.drive_api_url}/changes/startPageToken')
+        return response.json().get('startPageToken')
+
+    @track_drive_call
+    async def list_changes(self, page_token):
+        changes = []
+        while True:
+            response = await self._request('GET', f'{self.drive_api_url}/changes', params={
+                'pageToken': page_token,
+                'pageSize': '1000',
+                'includeRemoved': 'true',
+                'spaces': 'drive',
+                'fields': 'nextPageToken, newStartPageToken, '
+                          'changes(fileId, removed, file(id, name, mimeType, parents, trashed))'
+            })
+            result = response.json()
+            changes.extend(result.get('changes', []))
+            if 'newStartPageToken' in result:
+                return changes, result['newStartPageToken']
+            page_token = result['nextPageToken']
+
+    @track_drive_call
+    async def create_folder(self, parent_id, folder_name):
+        file_metadata = {
+            'name': folder_name,
+            'mimeType': FOLDER_MIME_TYPE,
+            'parents': [parent_id]
+        }
+
+        async def create():
+            response = await self._request('POST', f'{self.drive_api_url}/files', params={'fields': 'id'},
+                                           json_body=file_metadata, idempotent=False)
+            return response.json()
+
+        folder = await self._create(create, lambda: self._find_created(parent_id, folder_name, FOLDER_MIME_TYPE))
+        return folder.get('id')
+
+    @track_drive_call
+    async def list_folder_entries(self, parent_id):
+        return await self._list_files(
+            f"'{escape_query_value(parent_id)}' in parents and mimeType!='{FOLDER_MIME_TYPE}' and trashed=false",
+            fields='files(id, name, md5Checksum, size)'
+        )
+
+    @track_drive_call
+    async def get_file(self, file_id, fields='id, name, md5Checksum, size, trashed'):
+        response = await self._request('GET', f'{self.drive_api_url}/files/{file_id}', params={'fields': fields},
+                                       ok_statuses=(404,))
+        if response.status == 404:
+            return None
+        return response.json()
+
+    @track_drive_call
+    async def copy_file(self, file_id, parent_id, file_name, md5=None):
+        # Копия создается на стороне Drive, содержимое повторно не передается
+        async def create():
+            response = await self._request('POST', f'{self.drive_api_url}/files/{file_id}/copy',
+                                           params={'fields': UPLOADED_FILE_FIELDS},
+                                           json_body={'name': file_name, 'parents': [parent_id]}, idempotent=False)
+            return response.json()
+
+        return await self._create(create, lambda: self._find_created(parent_id, file_name, md5=md5))
+
+    async def upload_file(self, file_path, parent_id, file_name=None, existing_files=None, session_uri=None,
+                          start_offset=0, on_session=None, on_offset=None, on_bytes=None):
+        file_name = file_name or os.path.basename(file_path)
+        with open(file_path, 'rb') as f:
+            f.seek(start_offset)
+
+            async def read(size):
+                data = await asyncio.to_thread(f.read, size)
+                if on_bytes and data:
+                    on_bytes(len(data))
+                return data
+
+            return await self.upload_stream(read, parent_id, file_name, os.path.getsize(file_path), existing_files,
+                                            session_uri=session_uri, start_offset=start_offset,
+                                            on_session=on_session, on_offset=on_offset)
+
+    async def upload_bytes(self, data, parent_id, file_name, existing_files=None):
+        buffer = io.BytesIO(data)
+
+        async def read(size):
+            return buffer.read(size)
+
+        return await self.upload_stream(read, parent_id, file_name, len(data), existing_files)
+
+    @track_drive_call
+    async def upload_stream(self, read, parent_id, file_name, total_size=None, existing_files=None,
+                            session_uri=None, start_offset=0, on_session=None, on_offset=None):
+        # read(size) должен возвращать ровно size байт, меньше - только в конце данных.
+        # existing_files - {имя: id} файлов папки из list_folder_entries: для пакета файлов
+        # выбор между созданием и обновлением делается локально, без запроса на каждый файл.
+        # session_uri/start_offset продолжают прерванную resumable-загрузку, read тогда
+        # отдает данные начиная со start_offset; on_session/on_offset сообщают о сессии и подтвержденных байтах.
+        # Возвращает файл Drive: {'id': ..., 'md5Checksum': ...}.
+        started = time.monotonic()
+        uploaded = 0
+
+        async def counting_read(size):
+            nonlocal uploaded
+            data = await read(size)
+            uploaded += len(data)
+            return data
+
+        if session_uri:
+            uploaded_file = await self._upload_chunks(session_uri, counting_read, total_size, start_offset, on_offset)
+            self.upload_stats['resumable'].record(uploaded, time.monotonic() - started)
+            return uploaded_file
+
+        if existing_files is None:
+            existing_file_id = await self.find_file_id_by_name(file_name, parent_id)
+        else:
+            existing_file_id = existing_files.get(file_name)
+        mime_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+
+        if existing_file_id:
+            method, url, metadata = 'PATCH', f'{self.drive_upload_url}/files/{existing_file_id}', {}
+        else:
+            method, url, metadata = 'POST', f'{self.drive_upload_url}/files', {'name': file_name, 'parents': [parent_id]}
+
+        uploaded_file = None
+        if total_size is None or total_size <= self.multipart_threshold:
+            # Маленький файл уходит одним multipart-запросом из памяти, без сессии resumable
+            head = await read(self.multipart_threshold + 1)
+            if len(head) <= self.multipart_threshold:
+                uploaded_file = await self._upload_multipart(method, url, metadata, head, mime_type)
+                self.upload_stats['multipart'].record(len(head), time.monotonic() - started)
+            else:
+                read = _prepend_reader(head, read)
+
+        if uploaded_file is None:
+            session_uri = await self._create_upload_session(method, url, metadata, total_size, mime_type)
+            if on_session:
+                on_session(session_uri)
+            uploaded_file = await self._upload_chunks(session_uri, counting_read, total_size, 0, on_offset)
+            self.upload_stats['resumable'].record(uploaded, time.monotonic() - started)
+
+        if existing_files is not None:
+            existing_files[file_name] = uploaded_file['id']
+        return uploaded_file
+
+    async def _upload_multipart(self, method, url, metadata, data, mime_type):
+        boundary = f'upload_{os.urandom(8).hex()}'
+        body = b''.join([
+            f'--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n'.encode('utf-8'),
+            json.dumps(metadata).encode('utf-8'),
+            f'\r\n--{boundary}\r\nContent-Type: {mime_type}\r\n\r\n'.encode('utf-8'),
+            data,
+            f'\r\n--{boundary}--'.encode('utf-8')
+        ])
+
+        async def upload():
+            response = await self._request(method, url,
+                                           params={'uploadType': 'multipart', 'fields': UPLOADED_FILE_FIELDS},
+                                           data=body, headers={'Content-Type': f'multipart/related; boundary={boundary}'},
+                                           idempotent=method != 'POST')
+            # В суточный лимит аккаунта идет только содержимое файла, без метаданных и разметки multipart
+            response.account.record_upload(len(data))
+            return response.json()
+
+        if method != 'POST':
+            return await upload()
+        # Новый файл ищется по имени и md5 содержимого: файл с тем же именем мог появиться в папке и раньше
+        md5 = hashlib.md5(data).hexdigest()
+        return await self._create(upload, lambda: self._find_created(metadata['parents'][0], metadata['name'], md5=md5))
+
+    def get_upload_stats(self):
+        return {strategy: stats.summary() for strategy, stats in self.upload_stats.items()}
+
+    async def _create_upload_session(self, method, url, metadata, total_size, mime_type):
+        headers = {'X-Upload-Content-Type': mime_type}
+        if total_size is not None:
+            headers['X-Upload-Content-Length'] = str(total_size)
+        response = await self._request(
+            method, url,
+            params={'uploadType': 'resumable', 'fields': UPLOADED_FILE_FIELDS},
+            json_body=metadata,
+            headers=headers
+        )
+        return f"{response.headers['Location']}#account={response.account.name}"
+
+    @staticmethod
+    def _parse_received_offset(response):
+        received = response.headers.get('Range')
+        return int(received.rsplit('-', 1)[1]) + 1 if received else 0
+
+    @track_drive_call
+    async def get_upload_status(self, session_uri, total_size=None):
+        # Возвращает {'offset': n} для незавершенной сессии, {'file': {'id', 'md5Checksum'}} для завершенной
+        # и None, если сессия истекла и загрузку нужно начинать заново
+        total = str(total_size) if total_size is not None else '*'
+        response = await self._request('PUT', session_uri, data=b'', headers={'Content-Range': f'bytes */{total}'},
+                                       ok_statuses=(308, 404, 410), account=self._session_account(session_uri))
+        if response.status in (404, 410):
+            return None
+        if response.status == 308:
+            return {'offset': self._parse_received_offset(response)}
+        return {'file': response.json()}
+
+    async def _upload_chunks(self, session_uri, read, total_size, offset, on_offset=None):
+        # В суточный лимит аккаунта идут только байты, которые Drive подтвердил; пустые запросы статуса не считаются
+        account = self._session_account(session_uri)
+        pending = b''
+        eof = False
+        attempt = 0
+        while True:
+            chunk = pending
+            if not eof:
+                requested = self.chunk_size - len(pending)
+                data = await read(requested)
+                eof = len(data) < requested
+                chunk += data
+
+            # Если размер заранее неизвестен, он указывается только в последнем куске
+            if total_size is not None:
+                total = str(total_size)
+            elif eof:
+                total = str(offset + len(chunk))
+            else:
+                total = '*'
+            if chunk:
+                content_range = f'bytes {offset}-{offset + len(chunk) - 1}/{total}'
+            else:
+                content_range = f'bytes */{total}'
+
+            try:
+                response = await self._request('PUT', session_uri, data=chunk, headers={'Content-Range': content_range},
+                                               ok_statuses=(308,), retry=False,
+                                               account=self._session_account(session_uri))
+                attempt = 0
+            except (DriveApiError, aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # Кусок нельзя просто отправить повторно: сервер мог принять его часть.
+                # После паузы сессия запрашивается заново и загрузка продолжается с подтвержденного байта.
+                retryable = not isinstance(error, DriveApiError) or error.retryable
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff_delay(attempt, getattr(error, 'retry_after', None)))
+                attempt += 1
+                status = await self.get_upload_status(session_uri, total_size)
+                if status is None:
+                    raise
+                if 'file' in status:
+                    if account:
+                        account.record_upload(len(chunk))
+                    return status['file']
+                new_offset = status['offset']
+                if not offset <= new_offset <= offset + len(chunk):
+                    raise
+                if account:
+                    account.record_upload(new_offset - offset)
+                pending = chunk[new_offset - offset:]
+                offset = new_offset
+                continue
+            if response.status != 308:
+                response.account.record_upload(len(chunk))
+                return response.json()
+            # Сервер мог принять только часть куска: остаток отправляется повторно
+            new_offset = self._parse_received_offset(response)
+            if new_offset < offset:
+                raise DriveApiError(308, f'Сервер подтвердил {new_offset} байт вместо {offset}')
+            response.account.record_upload(new_offset - offset)
+            pending = chunk[new_offset - offset:]
+            offset = new_offset
+            if on_offset:
+                on_offset(offset)
+
+    @track_drive_call
+    async def find_folder_id_by_name(self, folder_name, parent_id=None):
+        # Ошибка Drive не превращается в None: иначе вызывающий код сочтет папку отсутствующей и создаст дубликат
+        # Папка в корзине не считается найденной: иначе загрузка снова попадет в нее
+        query = f"name='{escape_query_value(folder_name)}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+        if parent_id:
+            query += f" and '{escape_query_value(parent_id)}' in parents"
+
+        response = await self._request('GET', f'{self.drive_api_url}/files',
+                                       params={'q': query, 'fields': 'files(id, name)'})
+        folders = response.json().get('files', [])
+
+        if folders:
+            return folders[0]['id']
+        else:
+            return None
+
+    @track_drive_call
+    async def create_or_get_statistics_sheet(self, folder_id, file_name):
+        file_id = await self.find_file_id_by_name(file_name, folder_id)
+
+        if not file_id:
+            file_metadata = {
+                'name': file_name,
+                'parents': [folder_id],
+                'mimeType': SPREADSHEET_MIME_TYPE
+            }
+
+            async def create():
+                response = await self._request('POST', f'{self.drive_api_url}/files', params={'fields': 'id'},
+                                               json_body=file_metadata, idempotent=False)
+                return response.json()
+
+            sheet = await self._create(create, lambda: self._find_created(folder_id, file_name, SPREADSHEET_MIME_TYPE))
+            file_id = sheet.get('id')
+
+            await self._request(
+                'PUT', f'{self.sheets_api_url}/spreadsheets/{file_id}/values/A1:E1',
+                params={'valueInputOption': 'RAW'},
+                json_body={
+                    'values': [['Дата', 'ID пользователя', 'Папка загрузки', 'Имена файлов', 'Количество файлов']]
+                }
+            )
+
+        return file_id
+
+    @track_drive_call
+    async def append_statistics_rows(self, sheet_id, rows):
+        body = {
+            'values': rows
+        }
+
+        logger.info(f"Полученные данные: {body}")
+
+        try:
+            await self._request(
+                'POST', f'{self.sheets_api_url}/spreadsheets/{sheet_id}/values/A1:append',
+                params={'valueInputOption': 'RAW', 'insertDataOption': 'INSERT_ROWS'},
+                json_body=body, idempotent=False
+            )
+            logger.info(f"Статистика успешно добавлена: {len(rows)} строк")
+        except DriveApiError as error:
+            logger.error(f"Ошибка при добавлении статистики: {error}")
+            raise
+
+    @track_drive_call
+    async def find_file_id_by_name(self, file_name, parent_id=None):
+        query = f"name='{escape_query_value(file_name)}'"
+        if parent_id:
+            query += f" and '{escape_query_value(parent_id)}' in parents"
+
+        response = await self._request('GET', f'{self.drive_api_url}/files', params={'q': query, 'fields': 'files(id)'})
+        files = response.json().get('files', [])
+
+        if files:
+            return files[0]['id']
+        else:
+            return None
+
+    @track_drive_call
+    async def batch(self, requests):
+        # requests: список (method, path, params, body) относительно drive_api_url.
+        # Возвращает результаты в том же порядке: dict ответа или DriveApiError.
+        results = []
+        for start in range(0, len(requests), BATCH_MAX_REQUESTS):
+            chunk = requests[start:start + BATCH_MAX_REQUESTS]
+            chunk_results = await self._send_batch(chunk)
+            # Ограничения скорости приходят и по отдельным запросам внутри пакета: повторяются только они
+            for attempt in range(self.max_retries):
+                failed = [index for index, result in enumerate(chunk_results)
+                          if isinstance(result, DriveApiError) and result.retryable]
+                if not failed:
+                    break
+                if self.congestion_control and any(chunk_results[index].throttled for index in failed):
+                    self.congestion_control.on_throttle()
+                await asyncio.sleep(self._backoff_delay(attempt))
+                retried = await self._send_batch([chunk[index] for index in failed])
+                for index, result in zip(failed, retried):
+                    chunk_results[index] = result
+            results.extend(chunk_results)
+        return results
+
+    async def _send_batch(self, requests):
+        api_path = urlsplit(self.drive_api_url).path
+        boundary = f'batch_{os.urandom(8).hex()}'
+        parts = []
+        for index, (method, path, params, body) in enumerate(requests):
+            params = self._drive_params(method, f'{self.drive_api_url}{path}', params)
+            url = f'{api_path}{path}'
+            if params:
+                url += f'?{urlencode(params)}'
+            part = (
+                f'--{boundary}\r\n'
+                f'Content-Type: application/http\r\n'
+                f'Content-ID: <item{index}>\r\n\r\n'
+                f'{method} {url} HTTP/1.1\r\n'
+            )
+            if body is not None:
+                part += f'Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(body)}\r\n'
+            else:
+                part += '\r\n'
+            parts.append(part)
+        payload = ''.join(parts) + f'--{boundary}--\r\n'
+
+        response = await self._request('POST', self.drive_batch_url, data=payload.encode('utf-8'),
+                                       headers={'Content-Type': f'multipart/mixed; boundary={boundary}'})
+        return self._parse_batch_response(response, len(requests))
+
+    def _parse_batch_response(self, response, count):
+        results = [DriveApiError(0, 'Нет ответа в пакетном запросе')] * count
+        match = re.search(r'boundary=("?)([^";]+)\1', response.headers.get('Content-Type', ''))
+        if not match:
+            raise DriveApiError(response.status, 'Некорректный ответ пакетного запроса')
+        delimiter = b'--' + match.group(2).encode()
+        for part in response.body.split(delimiter)[1:]:
+            if part.startswith(b'--'):
+                break
+            part_headers, _, http_response = part.strip(b'\r\n').partition(b'\r\n\r\n')
+            content_id = re.search(rb'Content-ID:\s*<?[^>\r\n]*?item(\d+)>?', part_headers, re.IGNORECASE)
+            if not content_id:
+                continue
+            status_line, _, rest = http_response.partition(b'\r\n')
+            status = int(status_line.split()[1])
+            _, _, body = rest.partition(b'\r\n\r\n')
+            body = body.strip()
+            if status >= 400:
+                result = self._make_error(status, body)
+            else:
+                result = json.loads(body) if body else {}
+            results[int(content_id.group(1))] = result
+        return results
+
+    async def trash_files(self, file_ids):
+        # Перемещение в корзину: содержимое папки уходит вместе с ней и восстанавливается 30 дней
+        results = await self.batch([('PATCH', f'/files/{file_id}', {'fields': 'id'}, {'trashed': True})
+                                    for file_id in file_ids])
+        failed = [result for result in results if isinstance(result, DriveApiError) and result.status != 404]
+        for error in failed:
+            logger.error(f"Ошибка при перемещении в корзину: {error}")
+        return not failed
+
+    async def delete_files(self, file_ids):
+        results = await self.batch([('DELETE', f'/files/{file_id}', None, None) for file_id in file_ids])
+        failed = [result for result in results if isinstance(result, DriveApiError) and result.status != 404]
+        for error in failed:
+            logger.error(f"Ошибка при удалении: {error}")
+        return not failed
@@ -0,0 +1,559 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import rsa
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Сквозной бенчмарк загрузки без сети: бот работает как обычно, но Bot API и Google
+# Drive/Sheets заменены локальными серверами. Фейковый Bot API отдает синтетические
+# файлы заданных размеров, фейковый Drive добавляет задержку и отвечает 429/5xx с
+# заданной вероятностью. N пользователей одновременно присылают альбом из M файлов и
+# выбирают папку; измеряется время от выбора папки до итогового сообщения. С --urls
+# вместо альбома приходит сообщение с прямыми ссылками на тот же сервер (HEAD и Range).
+#
+#   python benchmarks/upload_benchmark.py --users 8 --files 10 --sizes 256K,4M --drive-latency 20 \
+#       --rate-429 0.02 --rate-5xx 0.01 --json results/base.json
+#   python benchmarks/upload_benchmark.py ... --baseline results/base.json
+#
+# Настройки бота (UPLOAD_WORKERS, DRIVE_MAX_IN_FLIGHT и т.д.) берутся из окружения, как при обычном запуске.
+
+TOKEN = '123456:BENCHMARK'
+ADMIN_ID = 1
+FIRST_USER_ID = 1000
+TARGET_FOLDER = 'Bench'
+FINAL_PREFIXES = ('Успешно загружено', 'Ошибка', 'Произошла ошибка')
+PATTERN = bytes(range(256)) * 4096  # 1 МБ
+
+
+def parse_size(value):
+    value = value.strip().upper()
+    multiplier = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}.get(value[-1:], 1)
+    return int(float(value.rstrip('KMG')) * multiplier)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def write_credentials(path, token_uri):
+    _, private_key = rsa.newkeys(1024)
+    with open(path, 'w') as f:
+        json.dump({
+            'type': 'service_account', 'project_id': 'benchmark', 'private_key_id': 'benchmark',
+            'private_key': private_key.save_pkcs1().decode(), 'client_email': 'benchmark@example.com',
+            'client_id': '1', 'token_uri': token_uri
+        }, f)
+
+
+def synthetic_chunks(size, start=0):
+    position = start
+    while position < size:
+        offset = position % len(PATTERN)
+        chunk = PATTERN[offset:offset + size - position]
+        position += len(chunk)
+        yield chunk
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.calls = Counter()
+        self.bytes_served = 0
+        self.prompts = {}
+        self.results = {}
+        self._message_ids = itertools.count(1)
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/file/bot{token}/files/{size}/{file_id}', self.handle_file)
+        app.router.add_get('/links/{size}/{name}', self.handle_link)
+        app.router.add_post('/bot{token}/{method}', self.handle_method)
+        return app
+
+    def expect(self, chat_id):
+        loop = asyncio.get_running_loop()
+        self.prompts[chat_id] = loop.create_future()
+        self.results[chat_id] = loop.create_future()
+
+    def make_message(self, chat_id, text, message_id=None):
+        return {'message_id': message_id or next(self._message_ids), 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': text}
+
+    async def handle_method(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if method == 'getMe':
+            result = {'id': 42, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        elif method == 'getFile':
+            file_id = params['file_id']
+            size = int(file_id.rsplit('-', 1)[1])
+            result = {'file_id': file_id, 'file_unique_id': file_id, 'file_size': size,
+                      'file_path': f'files/{size}/{file_id}'}
+        elif method == 'sendMessage':
+            chat_id = int(params['chat_id'])
+            result = self.make_message(chat_id, params['text'])
+            markup = params.get('reply_markup')
+            prompt = self.prompts.get(chat_id)
+            if markup and prompt and not prompt.done():
+                markup = json.loads(markup) if isinstance(markup, str) else markup
+                prompt.set_result((result, markup))
+        elif method == 'editMessageText':
+            chat_id = int(params['chat_id'])
+            result = self.make_message(chat_id, params['text'], int(params['message_id']))
+            done = self.results.get(chat_id)
+            if params['text'].startswith(FINAL_PREFIXES) and done and not done.done():
+                done.set_result((time.perf_counter(), params['text']))
+        elif method == 'editMessageReplyMarkup':
+            result = self.make_message(int(params['chat_id']), '', int(params['message_id']))
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle_file(self, request):
+        self.calls['download'] += 1
+        size = int(request.match_info['size'])
+        start = 0
+        status = 200
+        if request.headers.get('Range'):
+            start = int(request.headers['Range'].split('=')[1].split('-')[0])
+            status = 206
+        response = web.StreamResponse(status=status, headers={'Content-Length': str(size - start)})
+        await response.prepare(request)
+        for chunk in synthetic_chunks(size, start):
+            await response.write(chunk)
+            self.bytes_served += len(chunk)
+        await response.write_eof()
+        return response
+
+    async def handle_link(self, request):
+        # Прямая ссылка: HEAD с размером и Accept-Ranges, GET с поддержкой Range bytes=a-b
+        self.calls['link_' + request.method.lower()] += 1
+        size = int(request.match_info['size'])
+        start, end = 0, size - 1
+        status = 200
+        headers = {'Accept-Ranges': 'bytes', 'ETag': f'"{size}"', 'Content-Type': 'video/mp4'}
+        if request.headers.get('Range'):
+            first, _, last = request.headers['Range'].split('=', 1)[1].partition('-')
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        headers['Content-Length'] = str(end - start + 1)
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        if request.method != 'HEAD':
+            for chunk in synthetic_chunks(end + 1, start):
+                await response.write(chunk)
+                self.bytes_served += len(chunk)
+        await response.write_eof()
+        return response
+
+
+class FakeDrive:
+    def __init__(self, latency=0.0, rate_429=0.0, rate_5xx=0.0, seed=None):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.injected = Counter()
+        self.bytes_received = 0
+        self.files = {}
+        self.sessions = {}
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.inject], client_max_size=1024 ** 3)
+        app.router.add_post('/token', self.handle_token)
+        app.router.add_get('/drive/v3/changes/startPageToken', self.handle_start_page_token)
+        app.router.add_get('/drive/v3/changes', self.handle_changes)
+        app.router.add_get('/drive/v3/files', self.handle_list)
+        app.router.add_post('/drive/v3/files', self.handle_create)
+        app.router.add_get('/drive/v3/files/{file_id}', self.handle_get)
+        app.router.add_post('/drive/v3/files/{file_id}/copy', self.handle_copy)
+        app.router.add_post('/upload/drive/v3/files', self.handle_upload)
+        app.router.add_patch('/upload/drive/v3/files/{file_id}', self.handle_upload)
+        app.router.add_put('/upload/sessions/{session_id}', self.handle_chunk)
+        app.router.add_route('*', '/v4/spreadsheets/{tail:.*}', self.handle_sheets)
+        return app
+
+    def add_file(self, name, parent_id=None, mime_type='application/octet-stream', size=0, file_id=None):
+        file_id = file_id or uuid.uuid4().hex
+        self.files[file_id] = {'id': file_id, 'name': name, 'mimeType': mime_type,
+                               'parents': [parent_id] if parent_id else [], 'size': str(size)}
+        return file_id
+
+    @web.middleware
+    async def inject(self, request, handler):
+        if request.path == '/token':
+            return await handler(request)
+        # Тело читается до ошибки: клиент отправил чанк целиком, но сервер его не принял
+        await request.read()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        roll = self.random.random()
+        if roll < self.rate_429:
+            self.injected[429] += 1
+            return web.json_response({'error': {'code': 429, 'message': 'Rate Limit Exceeded',
+                                                'errors': [{'reason': 'rateLimitExceeded'}]}}, status=429)
+        if roll < self.rate_429 + self.rate_5xx:
+            self.injected[503] += 1
+            return web.json_response({'error': {'code': 503, 'message': 'Backend Error'}}, status=503)
+        return await handler(request)
+
+    async def handle_token(self, request):
+        return web.json_response({'access_token': 'benchmark', 'expires_in': 3600, 'token_type': 'Bearer'})
+
+    async def handle_start_page_token(self, request):
+        self.calls['changes.getStartPageToken'] += 1
+        return web.json_response({'startPageToken': '1'})
+
+    async def handle_changes(self, request):
+        self.calls['changes.list'] += 1
+        return web.json_response({'changes': [], 'newStartPageToken': '1'})
+
+    def match(self, file, query):
+        name = re.search(r"name='((?:[^'\\]|\\.)*)'", query)
+        if name and file['name'] != re.sub(r'\\(.)', r'\1', name.group(1)):
+            return False
+        mime_type = re.search(r"mimeType(!?)='([^']*)'", query)
+        if mime_type and (file['mimeType'] == mime_type.group(2)) == bool(mime_type.group(1)):
+            return False
+        parents = re.findall(r"'([^']*)' in parents", query)
+        return not parents or any(parent in file['parents'] for parent in parents)
+
+    async def handle_list(self, request):
+        self.calls['files.list'] += 1
+        query = request.query.get('q', '')
+        return web.json_response({'files': [file for file in self.files.values() if self.match(file, query)]})
+
+    async def handle_create(self, request):
+        self.calls['files.create'] += 1
+        metadata = await request.json()
+        file_id = self.add_file(metadata['name'], (metadata.get('parents') or [None])[0],
+                                metadata.get('mimeType', 'application/octet-stream'))
+        return web.json_response({'id': file_id})
+
+    async def handle_get(self, request):
+        self.calls['files.get'] += 1
+        file = self.files.get(request.match_info['file_id'])
+        if not file:
+            return web.json_response({'error': {'code': 404, 'message': 'File not found'}}, status=404)
+        return web.json_response(dict(file, trashed=False))
+
+    async def handle_copy(self, request):
+        self.calls['files.copy'] += 1
+        source = self.files[request.match_info['file_id']]
+        metadata = await request.json()
+        file_id = self.add_file(metadata.get('name', source['name']), (metadata.get('parents') or [None])[0],
+                                source['mimeType'], int(source['size']))
+        return web.json_response({'id': file_id})
+
+    def store_upload(self, file_id, metadata, size):
+        if file_id in self.files:
+            self.files[file_id]['size'] = str(size)
+            return file_id
+        return self.add_file(metadata['name'], (metadata.get('parents') or [None])[0], size=size, file_id=file_id)
+
+    async def handle_upload(self, request):
+        file_id = request.match_info.get('file_id') or uuid.uuid4().hex
+        body = await request.read()
+        if request.query.get('uploadType') == 'resumable':
+            self.calls['upload.resumable'] += 1
+            session_id = uuid.uuid4().hex
+            self.sessions[session_id] = {'file_id': file_id, 'metadata': json.loads(body or b'{}'), 'received': 0}
+            return web.Response(headers={'Location': f'http://{request.host}/upload/sessions/{session_id}'})
+
+        self.calls['upload.multipart'] += 1
+        boundary = request.headers['Content-Type'].split('boundary=')[1].encode()
+        parts = body.split(b'--' + boundary)
+        metadata = json.loads(parts[1].split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n', 1)[0])
+        data = parts[2].split(b'\r\n\r\n', 1)[1][:-2]
+        self.bytes_received += len(data)
+        return web.json_response({'id': self.store_upload(file_id, metadata, len(data))})
+
+    async def handle_chunk(self, request):
+        self.calls['upload.chunk'] += 1
+        session = self.sessions[request.match_info['session_id']]
+        body = await request.read()
+        match = re.match(r'bytes (?:(\d+)-\d+|\*)/(\S+)', request.headers['Content-Range'])
+        if match.group(1) is not None and int(match.group(1)) == session['received']:
+            session['received'] += len(body)
+            self.bytes_received += len(body)
+        total = match.group(2)
+        if total != '*' and session['received'] == int(total):
+            return web.json_response({'id': self.store_upload(session['file_id'], session['metadata'], int(total))})
+        headers = {'Range': f"bytes=0-{session['received'] - 1}"} if session['received'] else {}
+        return web.Response(status=308, headers=headers)
+
+    async def handle_sheets(self, request):
+        self.calls['sheets.append' if request.path.endswith(':append') else 'sheets.update'] += 1
+        return web.json_response({})
+
+
+def make_document_update(update_id, user_id, message_id, file_id, file_name, size, media_group_id):
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': message_id, 'date': int(time.time()), 'from': user,
+            'chat': {'id': user_id, 'type': 'private'}, 'media_group_id': media_group_id,
+            'document': {'file_id': file_id, 'file_unique_id': file_id, 'file_name': file_name,
+                         'mime_type': 'video/mp4', 'file_size': size}
+        }
+    }
+
+
+def make_links_update(update_id, user_id, message_id, urls):
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+    entities = []
+    offset = 0
+    for url in urls:
+        entities.append({'type': 'url', 'offset': offset, 'length': len(url)})
+        offset += len(url) + 1
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': message_id, 'date': int(time.time()), 'from': user,
+            'chat': {'id': user_id, 'type': 'private'}, 'text': '\n'.join(urls), 'entities': entities
+        }
+    }
+
+
+def make_callback_update(update_id, user_id, message, data):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': uuid.uuid4().hex, 'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'chat_instance': str(user_id), 'data': data, 'message': message
+        }
+    }
+
+
+async def run_user(application, telegram, user_id, files, sizes, run_id, update_ids, links_url=None):
+    from telegram import Update
+
+    telegram.expect(user_id)
+    if links_url:
+        urls = [f'{links_url}/{sizes[number % len(sizes)]}/bench_{run_id}_{user_id}_{number}.mp4'
+                for number in range(files)]
+        update = make_links_update(next(update_ids), user_id, 1, urls)
+        await application.update_queue.put(Update.de_json(update, application.bot))
+    media_group_id = f'{run_id}-{user_id}'
+    for number in range(0 if links_url else files):
+        size = sizes[number % len(sizes)]
+        file_id = f'{run_id}-{user_id}-{number}-{size}'
+        update = make_document_update(next(update_ids), user_id, number + 1, file_id,
+                                      f'bench_{user_id}_{number}.mp4', size, media_group_id)
+        await application.update_queue.put(Update.de_json(update, application.bot))
+
+    message, markup = await telegram.prompts[user_id]
+    buttons = [button for row in markup['inline_keyboard'] for button in row]
+    button = next(button for button in buttons if button['text'] == TARGET_FOLDER)
+    started = time.perf_counter()
+    update = make_callback_update(next(update_ids), user_id, message, button['callback_data'])
+    await application.update_queue.put(Update.de_json(update, application.bot))
+    finished, text = await telegram.results[user_id]
+    return finished - started, text.startswith(FINAL_PREFIXES[0])
+
+
+async def start_site(app, port):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def run_benchmark(args):
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    telegram = FakeTelegram()
+    drive = FakeDrive(args.drive_latency / 1000, args.rate_429, args.rate_5xx, args.seed)
+    upload_id = drive.add_file('Upload', mime_type='application/vnd.google-apps.folder')
+    for name in (TARGET_FOLDER, 'Statistic'):
+        drive.add_file(name, upload_id, 'application/vnd.google-apps.folder')
+    telegram_runner = await start_site(telegram.make_app(), args.telegram_port)
+    drive_runner = await start_site(drive.make_app(), args.drive_port)
+
+    import bot  # Конфигурация читается при импорте, окружение уже подготовлено
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    application = bot.build_application()
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    update_ids = itertools.count(1)
+    run_id = uuid.uuid4().hex[:8]  # Новые file_unique_id: индекс дедупликации не срабатывает между запусками
+    started = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*(
+            run_user(application, telegram, FIRST_USER_ID + user, args.files, sizes, run_id, update_ids,
+                     links_url=f'http://127.0.0.1:{args.telegram_port}/links' if args.urls else None)
+            for user in range(args.users)
+        )), timeout=args.timeout)
+        elapsed = time.perf_counter() - started
+        # Уведомления админам отправляются в фоне и должны успеть до закрытия клиента Bot API
+        await asyncio.gather(*bot.background_tasks, return_exceptions=True)
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+        await telegram_runner.cleanup()
+        await drive_runner.cleanup()
+
+    latencies = [latency for latency, _ in results]
+    total_files = args.users * args.files
+    total_bytes = sum(sizes[number % len(sizes)] for number in range(args.files)) * args.users
+    return {
+        'params': {'users': args.users, 'files': args.files, 'sizes': args.sizes,
+                   'drive_latency_ms': args.drive_latency, 'rate_429': args.rate_429, 'rate_5xx': args.rate_5xx,
+                   'upload_workers': bot.UPLOAD_WORKERS, 'drive_max_in_flight': bot.DRIVE_MAX_IN_FLIGHT,
+                   'accounts': args.accounts, 'urls': args.urls},
+        'elapsed_seconds': elapsed,
+        'batches_ok': sum(1 for _, ok in results if ok),
+        'batches': len(results),
+        'files_per_second': total_files / elapsed,
+        'megabytes_per_second': total_bytes / elapsed / (1024 * 1024),
+        'batch_latency_seconds': {'mean': statistics.mean(latencies), 'p50': percentile(latencies, 0.5),
+                                  'p99': percentile(latencies, 0.99), 'max': max(latencies)},
+        'drive_bytes_received': drive.bytes_received,
+        'telegram_bytes_served': telegram.bytes_served,
+        'drive_calls': dict(sorted(drive.calls.items())),
+        'drive_calls_total': sum(drive.calls.values()),
+        'drive_injected_errors': {str(status): count for status, count in sorted(drive.injected.items())},
+        'telegram_calls': dict(sorted(telegram.calls.items())),
+        'drive_accounts': {account['name']: {'requests': account['requests'], 'throttled': account['throttled']}
+                           for account in bot.drive_service.accounts.stats()}
+    }
+
+
+def report(result, baseline=None):
+    params = result['params']
+    latency = result['batch_latency_seconds']
+    print(f"Пользователей: {params['users']}, файлов на пользователя: {params['files']}, размеры: {params['sizes']}")
+    print(f"Drive: задержка {params['drive_latency_ms']} мс, 429: {params['rate_429']:.1%}, "
+          f"5xx: {params['rate_5xx']:.1%}; воркеров {params['upload_workers']}, "
+          f"загрузок в полете {params['drive_max_in_flight']}")
+    print(f"Пакетов загружено: {result['batches_ok']}/{result['batches']} за {result['elapsed_seconds']:.2f} с")
+    print(f"Пропускная способность: {result['files_per_second']:.2f} файлов/с, "
+          f"{result['megabytes_per_second']:.2f} МБ/с")
+    print(f"Задержка пакета: mean={latency['mean']:.3f} с p50={latency['p50']:.3f} с "
+          f"p99={latency['p99']:.3f} с max={latency['max']:.3f} с")
+    print(f"Запросы к Drive: {result['drive_calls_total']}, ошибок внесено: {result['drive_injected_errors'] or 0}")
+    for name, count in result['drive_calls'].items():
+        print(f"  {name:<28} {count}")
+    for name, account in result['drive_accounts'].items():
+        print(f"  аккаунт {name:<20} запросов {account['requests']}, ограничений {account['throttled']}")
+    print(f"Запросы к Bot API: {sum(result['telegram_calls'].values())}")
+    for name, count in result['telegram_calls'].items():
+        print(f"  {name:<28} {count}")
+
+    if baseline:
+        print("Сравнение с базовым запуском:")
+        rows = [('files_per_second', result['files_per_second'], baseline['files_per_second']),
+                ('batch p50', latency['p50'], baseline['batch_latency_seconds']['p50']),
+                ('batch p99', latency['p99'], baseline['batch_latency_seconds']['p99']),
+                ('drive_calls_total', result['drive_calls_total'], baseline['drive_calls_total'])]
+        for name, value, base in rows:
+            change = (value - base) / base * 100 if base else 0.0
+            print(f"  {name:<28} {base:.3f} -> {value:.3f} ({change:+.1f}%)")
+
+
+def prepare_environment(args, work_dir):
+    credentials_files = []
+    for number in range(args.accounts):
+        credentials_files.append(os.path.join(work_dir, f'account-{number + 1}.json'))
+        write_credentials(credentials_files[-1], f'http://127.0.0.1:{args.drive_port}/token')
+    defaults = {
+        'API_TOKEN': TOKEN,
+        'GOOGLE_DRIVE_CREDENTIALS_FILE': credentials_files[0],
+        'GOOGLE_DRIVE_CREDENTIALS_FILES': ','.join(credentials_files),
+        'GOOGLE_API_ROOT': f'http://127.0.0.1:{args.drive_port}',
+        'SHEETS_API_ROOT': f'http://127.0.0.1:{args.drive_port}',
+        'TELEGRAM_BASE_URL': f'http://127.0.0.1:{args.telegram_port}/bot',
+        'TELEGRAM_BASE_FILE_URL': f'http://127.0.0.1:{args.telegram_port}/file/bot',
+        'EXCLUDED_FOLDERS': 'Statistic',
+        'ALLOWED_USERS': str(FIRST_USER_ID),
+        'ADMIN_USERS': str(ADMIN_ID),
+        'USE_ALLOWED_USERS': 'False',
+        'MAX_FILE_SIZE_MB': '50',
+        'STATISTICS_FOLDER': 'Statistic',
+        'STATISTICS_FILE': 'statistic',
+        'UPLOAD_JOURNAL_FILE': os.path.join(work_dir, 'upload_journal.json'),
+        'UPLOAD_QUEUE_FILE': os.path.join(work_dir, 'upload_queue.sqlite3'),
+        'DEDUP_INDEX_FILE': os.path.join(work_dir, 'dedup_index.sqlite3'),
+        'PENDING_BATCHES_FILE': os.path.join(work_dir, 'pending_batches.sqlite3'),
+        'STATISTICS_SPOOL_FILE': os.path.join(work_dir, 'statistics_spool.jsonl'),
+        'INGEST_DEBOUNCE_SECONDS': '0.2',
+        'METRICS_PORT': '0',
+        'BUNDLE_FOLDERS': '',
+        'VIDEO_MAX_SIZE_MB': '4096',
+        'URL_ALLOW_PRIVATE_ADDRESSES': 'True',
+        'MEDIA_TRANSFORM_CATEGORIES': ''
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+    # Адреса фейковых серверов и временные файлы не должны браться из .env рабочего бота
+    for name in ('API_TOKEN', 'GOOGLE_DRIVE_CREDENTIALS_FILE', 'GOOGLE_DRIVE_CREDENTIALS_FILES', 'GOOGLE_API_ROOT', 'SHEETS_API_ROOT',
+                 'TELEGRAM_BASE_URL', 'TELEGRAM_BASE_FILE_URL', 'UPLOAD_JOURNAL_FILE', 'UPLOAD_QUEUE_FILE',
+                 'DEDUP_INDEX_FILE', 'PENDING_BATCHES_FILE', 'STATISTICS_SPOOL_FILE', 'METRICS_PORT',
+                 'URL_ALLOW_PRIVATE_ADDRESSES'):
+        os.environ[name] = defaults[name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сквозной бенчмарк загрузки с фейковыми Bot API и Drive')
+    parser.add_argument('--users', type=int, default=4, help='одновременных пользователей')
+    parser.add_argument('--files', type=int, default=10, help='файлов в альбоме каждого пользователя')
+    parser.add_argument('--sizes', default='512K,2M,8M', help='размеры файлов по кругу, суффиксы K/M/G')
+    parser.add_argument('--drive-latency', type=float, default=20, help='задержка ответа Drive, мс')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='доля ответов 503')
+    parser.add_argument('--accounts', type=int, default=1, help='сервисных аккаунтов в пуле')
+    parser.add_argument('--urls', action='store_true', help='присылать прямые ссылки вместо файлов')
+    parser.add_argument('--seed', type=int, default=1, help='зерно генератора ошибок')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--telegram-port', type=int, default=18091)
+    parser.add_argument('--drive-port', type=int, default=18092)
+    parser.add_argument('--json', help='сохранить результат в JSON-файл')
+    parser.add_argument('--baseline', help='JSON предыдущего запуска для сравнения')
+    parser.add_argument('--verbose', action='store_true', help='показывать логи бота')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='upload-benchmark-') as work_dir:
+        prepare_environment(args, work_dir)
+        result = asyncio.run(run_benchmark(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    if args.json:
+        json_dir = os.path.dirname(args.json)
+        if json_dir:
+            os.makedirs(json_dir, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
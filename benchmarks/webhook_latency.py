@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from aiohttp import ClientSession, web
+from telegram.ext import Application, MessageHandler, filters
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_server import SECRET_TOKEN_HEADER, WebhookServer  # noqa: E402
+
+# Сравнение задержки доставки обновлений в режимах polling и webhook.
+# Локальный фейковый Bot API отдает обновления через getUpdates или POST на вебхук бота
+# и измеряет время от отправки обновления до ответа бота через sendMessage.
+#
+#   python benchmarks/webhook_latency.py --mode both --updates 200 --interval 0.01
+
+TOKEN = '123456:BENCHMARK'
+SECRET = 'benchmark-secret'
+CHAT = {'id': 1, 'type': 'private', 'first_name': 'bench'}
+USER = {'id': 1, 'is_bot': False, 'first_name': 'bench'}
+
+
+class FakeBotApi:
+    def __init__(self):
+        self.updates = []
+        self.sent_at = {}
+        self.latencies = []
+        self.done = asyncio.Event()
+        self.expected = 0
+        self._new_update = asyncio.Event()
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle_method)
+        return app
+
+    def make_update(self, update_id):
+        return {
+            'update_id': update_id,
+            'message': {'message_id': update_id, 'date': int(time.time()), 'chat': CHAT, 'from': USER,
+                        'text': f'ping {update_id}'}
+        }
+
+    async def handle_method(self, request):
+        method = request.match_info['method']
+        params = await request.post()
+        if method == 'getMe':
+            result = {'id': 42, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        elif method == 'getUpdates':
+            result = await self.get_updates(int(params.get('offset') or 0), float(params.get('timeout') or 0))
+        elif method == 'sendMessage':
+            update_id = int(params['text'].split()[1])
+            self.latencies.append(time.perf_counter() - self.sent_at[update_id])
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+            result = {'message_id': update_id, 'date': int(time.time()), 'chat': CHAT, 'text': params['text']}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def get_updates(self, offset, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = [update for update in self.updates if update['update_id'] >= offset]
+            if pending or time.monotonic() >= deadline:
+                return pending
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout=deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+
+    def push_update(self, update):
+        self.sent_at[update['update_id']] = time.perf_counter()
+        self.updates.append(update)
+        self._new_update.set()
+
+
+async def reply(update, context):
+    await update.message.reply_text(update.message.text)
+
+
+def build_application(api_port, concurrency):
+    application = Application.builder().token(TOKEN).base_url(f'http://127.0.0.1:{api_port}/bot') \
+        .concurrent_updates(concurrency).build()
+    application.add_handler(MessageHandler(filters.TEXT, reply))
+    return application
+
+
+async def run_mode(mode, count, interval, concurrency, api_port, webhook_port):
+    fake = FakeBotApi()
+    fake.expected = count
+    runner = web.AppRunner(fake.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', api_port).start()
+
+    application = build_application(api_port, concurrency)
+    server = WebhookServer(application, '/telegram', SECRET, '127.0.0.1', webhook_port)
+    await application.initialize()
+    if mode == 'polling':
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+    else:
+        await server.start()
+    await application.start()
+
+    async with ClientSession() as session:
+        for update_id in range(1, count + 1):
+            update = fake.make_update(update_id)
+            if mode == 'polling':
+                fake.push_update(update)
+            else:
+                fake.sent_at[update_id] = time.perf_counter()
+                async with session.post(f'http://127.0.0.1:{webhook_port}/telegram', json=update,
+                                        headers={SECRET_TOKEN_HEADER: SECRET}) as response:
+                    response.raise_for_status()
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.wait_for(fake.done.wait(), timeout=60)
+
+    if application.updater.running:
+        await application.updater.stop()
+    await application.stop()
+    await server.stop()
+    await application.shutdown()
+    await runner.cleanup()
+    return fake.latencies
+
+
+def report(mode, latencies):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{mode:>8}: n={len(latencies)} mean={statistics.mean(latencies):.2f} мс "
+          f"p50={p50:.2f} мс p99={p99:.2f} мс max={latencies[-1]:.2f} мс")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Задержка обработки обновлений: polling против webhook')
+    parser.add_argument('--mode', choices=['polling', 'webhook', 'both'], default='both')
+    parser.add_argument('--updates', type=int, default=100)
+    parser.add_argument('--interval', type=float, default=0.01, help='пауза между обновлениями, с')
+    parser.add_argument('--concurrency', type=int, default=1, help='UPDATE_CONCURRENCY бота')
+    parser.add_argument('--api-port', type=int, default=18081)
+    parser.add_argument('--webhook-port', type=int, default=18082)
+    args = parser.parse_args()
+
+    modes = ['polling', 'webhook'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        latencies = await run_mode(mode, args.updates, args.interval, args.concurrency,
+                                   args.api_port, args.webhook_port)
+        report(mode, latencies)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,15 +1,53 @@
+import asyncio
 import datetime
+import hashlib
 import os
 import logging
 import mimetypes
+import time
+import uuid
 from datetime import timedelta
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+process_started = time.monotonic()  # Время запуска считается до импорта telegram, aiohttp и клиентов
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, File, MessageEntity
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackContext, CallbackQueryHandler, filters
 from telegram.error import BadRequest
-from gdrive_service import GoogleDriveService
-from config import API_TOKEN, GOOGLE_DRIVE_CREDENTIALS_FILE, ALLOWED_USERS, MAX_FILE_SIZE_MB, EXCLUDED_FOLDERS, \
-    USE_ALLOWED_USERS, STATISTICS_FOLDER, STATISTICS_FILE, ALLOWED_FILE_TYPES, ADMIN_USERS
+from async_gdrive_service import AsyncGoogleDriveService, DriveApiError
+from folder_index import FolderIndex
+from statistics_writer import StatisticsWriter
+from streaming import BoundedStream, TelegramFileStreamer
+from progress_reporter import ProgressReporter
+from upload_journal import UploadJournal
+from upload_pipeline import UploadPipeline
+from upload_queue import UploadQueue, UploadWorkerPool
+from upload_scheduler import FairScheduler, TokenBucket
+from webhook_server import run_webhook
+from ingest_batcher import IngestBatcher
+from dedup_index import DedupIndex, KnownFile
+from media_transform import MediaTransformer
+from bundle_writer import ZipBundleWriter
+from session_store import PendingBatchStore
+from retention import RetentionSweeper, format_retention_report
+from url_downloader import RemoteFile, UrlDownloader, UrlDownloadError
+import metrics
+from config import API_TOKEN, ALLOWED_USERS, MAX_FILE_SIZE_MB, EXCLUDED_FOLDERS, \
+    USE_ALLOWED_USERS, STATISTICS_FOLDER, STATISTICS_FILE, ALLOWED_FILE_TYPES, ADMIN_USERS, DOWNLOAD_CONCURRENCY, \
+    UPLOAD_CONCURRENCY, DRIVE_POOL_SIZE, TOKEN_REFRESH_MARGIN_SECONDS, FOLDER_INDEX_POLL_SECONDS, \
+    STREAM_CHUNK_SIZE_KB, STREAM_BUFFER_CHUNKS, STATISTICS_FLUSH_SECONDS, STATISTICS_FLUSH_ROWS, \
+    STATISTICS_SPOOL_FILE, MULTIPART_THRESHOLD_KB, RESUMABLE_CHUNK_SIZE_MB, UPLOAD_JOURNAL_FILE, \
+    PROGRESS_UPDATE_SECONDS, UPLOAD_QUEUE_FILE, UPLOAD_WORKERS, DRIVE_MAX_IN_FLIGHT, DRIVE_REQUESTS_PER_SECOND, \
+    UPLOAD_USER_WEIGHTS, DRIVE_MAX_RETRIES, DRIVE_BACKOFF_MAX_SECONDS, TELEGRAM_BASE_URL, UPDATE_CONCURRENCY, \
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_MAX_CONNECTIONS, \
+    INGEST_DEBOUNCE_SECONDS, INGEST_MAX_WAIT_SECONDS, DEDUP_INDEX_FILE, TELEGRAM_BASE_FILE_URL, TELEGRAM_LOCAL_MODE, \
+    TELEGRAM_DOWNLOAD_LIMIT_MB, MEDIA_TRANSFORM_CATEGORIES, MEDIA_TRANSFORM_WORKERS, MEDIA_TRANSFORM_TEMP_DIR, \
+    IMAGE_MAX_SIDE, IMAGE_JPEG_QUALITY, VIDEO_TRANSFORM_MODE, VIDEO_CRF, FFMPEG_PATH, BUNDLE_FOLDERS, BUNDLE_MIN_FILES, \
+    METRICS_HOST, METRICS_PORT, GOOGLE_API_ROOT, SHEETS_API_ROOT, PENDING_BATCHES_FILE, PENDING_BATCH_TTL_SECONDS, \
+    PENDING_BATCHES_MAX, PENDING_BATCHES_PER_USER, RETENTION_DAYS, RETENTION_DEFAULT_DAYS, RETENTION_MODE, \
+    RETENTION_INTERVAL_HOURS, RETENTION_DRY_RUN, RETENTION_CONCURRENCY, GOOGLE_DRIVE_CREDENTIALS_FILES, \
+    GOOGLE_SHARED_DRIVE_ID, DRIVE_ACCOUNT_STRATEGY, DRIVE_ACCOUNT_COOLDOWN_SECONDS, URL_DOWNLOAD_CONNECTIONS, \
+    URL_DOWNLOAD_PART_SIZE_MB, URL_RANGED_MIN_SIZE_MB, URL_DOWNLOAD_RETRIES, URL_PROBE_TIMEOUT_SECONDS, \
+    URL_MAX_PER_MESSAGE, URL_ALLOW_PRIVATE_ADDRESSES
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,7 +55,101 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 mimetypes.add_type('application/jwpub', '.jwpub')
 
-drive_service = GoogleDriveService(GOOGLE_DRIVE_CREDENTIALS_FILE)
+startup_stages = []
+
+
+def record_startup_stage(stage):
+    # Длительность этапа с конца предыдущего; итог выводится в лог, когда бот готов принимать обновления
+    elapsed = time.monotonic() - process_started - sum(seconds for _, seconds in startup_stages)
+    startup_stages.append((stage, elapsed))
+
+
+record_startup_stage('импорт модулей')
+
+drive_service = AsyncGoogleDriveService(
+    GOOGLE_DRIVE_CREDENTIALS_FILES,
+    pool_size=DRIVE_POOL_SIZE,
+    refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS,
+    multipart_threshold=MULTIPART_THRESHOLD_KB * 1024,
+    chunk_size=RESUMABLE_CHUNK_SIZE_MB * 1024 * 1024,
+    max_retries=DRIVE_MAX_RETRIES,
+    backoff_max=DRIVE_BACKOFF_MAX_SECONDS,
+    api_root=GOOGLE_API_ROOT,
+    sheets_root=SHEETS_API_ROOT,
+    account_strategy=DRIVE_ACCOUNT_STRATEGY,
+    account_cooldown=DRIVE_ACCOUNT_COOLDOWN_SECONDS,
+    shared_drive_id=GOOGLE_SHARED_DRIVE_ID or None
+)
+if DRIVE_REQUESTS_PER_SECOND > 0:
+    # Квота запросов считается Drive для каждого аккаунта отдельно
+    for account in drive_service.accounts.accounts:
+        account.rate_limiter = TokenBucket(DRIVE_REQUESTS_PER_SECOND)
+upload_scheduler = FairScheduler(max_in_flight=DRIVE_MAX_IN_FLIGHT, weights=UPLOAD_USER_WEIGHTS)
+drive_service.congestion_control = upload_scheduler
+folder_index = FolderIndex(drive_service, poll_interval=FOLDER_INDEX_POLL_SECONDS)
+statistics_writer = StatisticsWriter(
+    drive_service,
+    folder_index,
+    STATISTICS_FOLDER,
+    STATISTICS_FILE,
+    flush_interval=STATISTICS_FLUSH_SECONDS,
+    flush_rows=STATISTICS_FLUSH_ROWS,
+    spool_file=STATISTICS_SPOOL_FILE
+)
+retention_sweeper = RetentionSweeper(
+    drive_service,
+    folder_index,
+    RETENTION_DAYS,
+    default_days=RETENTION_DEFAULT_DAYS,
+    mode=RETENTION_MODE,
+    concurrency=RETENTION_CONCURRENCY,
+    excluded=EXCLUDED_FOLDERS
+)
+RETENTION_FIRST_RUN_SECONDS = 300
+upload_journal = UploadJournal(UPLOAD_JOURNAL_FILE)
+upload_queue = UploadQueue(UPLOAD_QUEUE_FILE)
+dedup_index = DedupIndex(DEDUP_INDEX_FILE)
+media_transformer = MediaTransformer(
+    MEDIA_TRANSFORM_CATEGORIES,
+    workers=MEDIA_TRANSFORM_WORKERS,
+    temp_dir=MEDIA_TRANSFORM_TEMP_DIR,
+    image_max_side=IMAGE_MAX_SIDE,
+    image_quality=IMAGE_JPEG_QUALITY,
+    video_mode=VIDEO_TRANSFORM_MODE,
+    video_crf=VIDEO_CRF,
+    ffmpeg=FFMPEG_PATH
+)
+upload_workers = UploadWorkerPool(upload_queue, None, workers=UPLOAD_WORKERS)
+background_tasks = set()
+ingest_batcher = IngestBatcher(
+    lambda messages, context: handle_file_group(messages, context),
+    delay=INGEST_DEBOUNCE_SECONDS,
+    max_wait=INGEST_MAX_WAIT_SECONDS
+)
+pending_batches = PendingBatchStore(
+    PENDING_BATCHES_FILE or None,
+    ttl=PENDING_BATCH_TTL_SECONDS,
+    max_batches=PENDING_BATCHES_MAX,
+    max_per_user=PENDING_BATCHES_PER_USER
+)
+metrics_server = metrics.MetricsServer(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+metrics.uploads_in_flight.set_function(lambda: upload_scheduler.in_flight)
+metrics.upload_queue_pending.set_function(lambda: upload_queue.depth()['pending'])
+metrics.upload_workers_busy.set_function(lambda: upload_workers.busy)
+metrics.pending_batches.set_function(lambda: len(pending_batches.batches))
+metrics.pending_batch_bytes.set_function(lambda: pending_batches.total_size)
+telegram_streamer = TelegramFileStreamer(chunk_size=STREAM_CHUNK_SIZE_KB * 1024, buffer_chunks=STREAM_BUFFER_CHUNKS)
+url_downloader = UrlDownloader(
+    chunk_size=STREAM_CHUNK_SIZE_KB * 1024,
+    buffer_chunks=STREAM_BUFFER_CHUNKS,
+    connections=URL_DOWNLOAD_CONNECTIONS,
+    part_size=URL_DOWNLOAD_PART_SIZE_MB * 1024 * 1024,
+    min_ranged_size=URL_RANGED_MIN_SIZE_MB * 1024 * 1024,
+    probe_timeout=URL_PROBE_TIMEOUT_SECONDS,
+    max_retries=URL_DOWNLOAD_RETRIES,
+    allow_private=URL_ALLOW_PRIVATE_ADDRESSES
+)
+record_startup_stage('создание сервисов')
 
 
 def get_files_word(count):
@@ -49,6 +181,16 @@ def format_size(size_mb):
     return f"{size_mb:.1f} МБ"
 
 
+def make_unique_name(name, taken):
+    if name not in taken:
+        return name
+    base, extension = os.path.splitext(name)
+    number = 2
+    while f"{base} ({number}){extension}" in taken:
+        number += 1
+    return f"{base} ({number}){extension}"
+
+
 def get_allowed_files_description():
     descriptions = []
     for category, settings in ALLOWED_FILE_TYPES.items():
@@ -57,6 +199,22 @@ def get_allowed_files_description():
         descriptions.append(f"• {settings['description']} ({extensions}) - до {max_size}")
     return '\n'.join(descriptions)
 
+def get_item_name(item):
+    return item.get('file_name') or item['filename']
+
+
+def set_item_name(item, name):
+    item['file_name' if 'file_name' in item else 'filename'] = name
+
+
+def get_item_size(item):
+    if 'content' in item:
+        return len(item['content'].encode('utf-8'))
+    if 'file_path' in item and os.path.exists(item['file_path']):
+        return os.path.getsize(item['file_path'])
+    return item.get('file_size') or 0
+
+
 def get_comments_word(count):
     if count % 100 in [11, 12, 13, 14]:
         return "комментариев"
@@ -73,7 +231,8 @@ welcome_message = (
     "Привет!\nЯ бот для работы с Google Drive.\n"
     "Умею загружать следующие типы файлов:\n\n"
     f"{get_allowed_files_description()}\n\n"
-    "Пришлите мне файлы, и я помогу загрузить их в нужную папку."
+    "Пришлите мне файлы, и я помогу загрузить их в нужную папку. "
+    "Большие файлы можно прислать прямой ссылкой."
 )
 
 
@@ -81,20 +240,112 @@ async def start(update: Update, context) -> None:
     await update.message.reply_text(welcome_message)
 
 
-async def send_folder_buttons(update: Update, context) -> None:
-    upload_folder_id = drive_service.find_folder_id_by_name('Upload')
+async def upload_stats(update: Update, context) -> None:
+    if update.message.from_user.id not in ADMIN_USERS:
+        return
+
+    message = 'Статистика загрузок по способам:\n'
+    for strategy, stats in drive_service.get_upload_stats().items():
+        message += (
+            f"• {strategy}: {stats['count']} {get_files_word(stats['count'])}, "
+            f"{format_size(stats['bytes'] / (1024 * 1024))}, "
+            f"в среднем {stats['avg_latency']:.2f} с, {stats['throughput_mb_s']:.2f} МБ/с\n"
+        )
+    await update.message.reply_text(message)
+
+
+async def queue_status(update: Update, context) -> None:
+    if update.message.from_user.id not in ADMIN_USERS:
+        return
+
+    depth = upload_queue.depth()
+    pending = pending_batches.stats()
+    await update.message.reply_text(
+        f"Очередь загрузок:\n"
+        f"• ожидают: {depth['pending']}\n"
+        f"• выполняются: {depth['running']}\n"
+        f"• с ошибкой: {depth['failed']}\n"
+        f"Воркеры: {upload_workers.busy}/{upload_workers.workers} заняты\n"
+        f"Загрузки в Drive: {upload_scheduler.in_flight}/{upload_scheduler.max_in_flight} "
+        f"(максимум {upload_scheduler.limit}), "
+        f"ожидают слота: {upload_scheduler.waiting()}\n"
+        f"Пакеты без выбранной папки: {pending['batches']} ({pending['files']} файлов, "
+        f"{pending['users']} пользователей, {pending['bytes'] / 1024:.1f} КБ), "
+        f"вытеснено: по простою {pending['evicted']['ttl']}, по лимитам "
+        f"{pending['evicted']['size'] + pending['evicted']['user_limit']}\n"
+        f"Сервисные аккаунты ({DRIVE_ACCOUNT_STRATEGY}):"
+        + ''.join(
+            f"\n• {account['name']}: запросов {account['requests']}, в работе {account['in_flight']}, "
+            f"ограничений {account['throttled']}, загружено сегодня {account['uploaded_today'] / 1024 ** 3:.1f} ГБ"
+            + (f", перерыв {account['cooldown_left']:.0f} с" if account['cooldown_left'] else '')
+            for account in drive_service.accounts.stats()
+        )
+    )
+
+
+async def bundle_mode(update: Update, context) -> None:
+    if USE_ALLOWED_USERS and update.message.from_user.id not in ALLOWED_USERS:
+        await update.message.reply_text('У вас нет прав для загрузки файлов.')
+        return
+
+    context.user_data['bundle_next'] = not context.user_data.get('bundle_next', False)
+    if context.user_data['bundle_next']:
+        await update.message.reply_text('Следующий пакет файлов будет загружен одним ZIP-архивом.')
+    else:
+        await update.message.reply_text('Режим архива выключен, файлы будут загружены по отдельности.')
+
+
+async def retention_command(update: Update, context) -> None:
+    if update.message.from_user.id not in ADMIN_USERS:
+        return
+    if not retention_sweeper.enabled:
+        await update.message.reply_text('Сроки хранения не заданы (RETENTION_DAYS, RETENTION_DEFAULT_DAYS).')
+        return
+
+    # /retention - отчет без удаления, /retention run - очистка сейчас
+    dry_run = not (context.args and context.args[0] == 'run')
+    try:
+        result = await retention_sweeper.sweep(retention_today(), dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"Ошибка при очистке по сроку хранения: {e}")
+        await update.message.reply_text('Не удалось выполнить очистку, подробности в логе.')
+        return
+    await update.message.reply_text(format_retention_report(result))
+
+
+def retention_today():
+    # Та же дата, что и в именах папок по датам
+    return (datetime.datetime.now() + timedelta(hours=3)).date()
+
+
+async def run_retention(bot) -> None:
+    result = await retention_sweeper.sweep(retention_today(), dry_run=RETENTION_DRY_RUN)
+    if result['folders'] and ADMIN_USERS:
+        await notify_admins(bot, format_retention_report(result))
+
+
+async def retention_job(context) -> None:
+    try:
+        await run_retention(context.bot)
+    except Exception as e:
+        logger.error(f"Ошибка при очистке по сроку хранения: {e}")
+
+
+async def send_folder_buttons(message, batch_token) -> None:
+    upload_folder_id = await folder_index.ensure_seeded()
     if not upload_folder_id:
-        await update.message.reply_text('Ошибка: папка "Upload" не найдена в Google Drive.')
+        await message.reply_text('Ошибка: папка "Upload" не найдена в Google Drive.')
         return
 
-    folders = drive_service.get_folders(upload_folder_id)
+    folders = folder_index.get_folders(upload_folder_id)
     folders = {name: folder_id for name, folder_id in folders.items() if name not in EXCLUDED_FOLDERS}
 
     keyboard = []
     row = []
 
     for name, folder_id in folders.items():
-        row.append(InlineKeyboardButton(name, callback_data=folder_id))
+        # Кнопка ссылается на конкретный пакет: у пользователя может быть несколько пакетов без выбранной папки
+        row.append(InlineKeyboardButton(name, callback_data=f'{batch_token}:{folder_id}'))
         if len(row) == 2:
             keyboard.append(row)
             row = []
@@ -103,247 +354,668 @@ async def send_folder_buttons(update: Update, context) -> None:
         keyboard.append(row)
 
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text('Выберите папку для загрузки:', reply_markup=reply_markup)
+    await message.reply_text('Выберите папку для загрузки:', reply_markup=reply_markup)
+
+
+def classify_message(message, number):
+    # Возвращает (файл, None) для поддерживаемого файла или (None, причина отказа)
+    file = None
+    file_type_category = None
+    original_file_name = None
+
+    if message.photo:
+        file = message.photo[-1]
+        file_type_category = 'image'
+        file_name = f"image_{number}.jpg"
+    elif message.video:
+        file = message.video
+        file_type_category = 'video'
+        original_file_name = file.file_name
+        file_extension = os.path.splitext(original_file_name)[1] if original_file_name else '.mp4'
+        file_name = original_file_name or f"video_{number}{file_extension}"
+        logger.info(f"Видео: {file_name}, размер: {file.file_size / (1024 * 1024):.2f} МБ")
+    elif message.audio:
+        file = message.audio
+        file_type_category = 'audio'
+        original_file_name = file.file_name
+        file_extension = os.path.splitext(original_file_name)[1] if original_file_name else '.mp3'
+        file_name = original_file_name or f"audio_{number}{file_extension}"
+    elif message.document:
+        file = message.document
+        original_file_name = file.file_name
+        file_extension = os.path.splitext(original_file_name)[1].lower() if original_file_name else ''
+        mime_type = file.mime_type or 'application/octet-stream'
+        logger.info(f"Документ: {original_file_name}, размер: {file.file_size / (1024 * 1024):.2f} МБ, MIME: {mime_type}")
+        if file_extension in ['.mp4', '.mov', '.avi', '.mkv'] or mime_type in ALLOWED_FILE_TYPES['video']['mime_types']:
+            file_type_category = 'video'
+            file_name = original_file_name or f"video_{number}{file_extension}"
+        else:
+            file_type_category = get_file_type_category(mime_type, file_extension)
+            file_name = original_file_name
+
+    if not file:
+        return None, None
+    if not file_type_category:
+        return None, {'name': original_file_name or 'Неизвестный файл', 'reason': 'Неподдерживаемый формат'}
+
+    file_size_mb = file.file_size / (1024 * 1024)
+    if file_size_mb > TELEGRAM_DOWNLOAD_LIMIT_MB:  # Лимит скачивания через Bot API
+        return None, {
+            'name': file_name,
+            'reason': f'больше {format_size(TELEGRAM_DOWNLOAD_LIMIT_MB)}, бот не может скачать такой файл, '
+                      f'отправьте ссылку на него'
+        }
+    max_size = ALLOWED_FILE_TYPES[file_type_category]['max_size_mb']
+    if file_size_mb > max_size:
+        return None, {'name': file_name, 'reason': f'превышен размер {format_size(max_size)}'}
+
+    return {
+        'file_id': file.file_id,
+        'file_unique_id': file.file_unique_id,
+        'file_name': file_name,
+        'generated_name': not original_file_name,
+        'type': file_type_category,
+        'size_mb': file_size_mb,
+        'file_size': file.file_size
+    }, None
+
+
+def classify_remote_file(remote, number):
+    # Файл по ссылке проверяется по тем же правилам ALLOWED_FILE_TYPES, что и файлы из Telegram
+    file_name = remote.file_name or f"file_{number}{mimetypes.guess_extension(remote.mime_type) or ''}"
+    file_type_category = get_file_type_category(remote.mime_type, os.path.splitext(file_name)[1])
+    if not file_type_category:
+        return None, {'name': file_name, 'reason': 'Неподдерживаемый формат'}
+
+    max_size = ALLOWED_FILE_TYPES[file_type_category]['max_size_mb']
+    file_size_mb = remote.size / (1024 * 1024) if remote.size is not None else 0
+    if file_size_mb > max_size:
+        return None, {'name': file_name, 'reason': f'превышен размер {format_size(max_size)}'}
+
+    # Размер, неизвестный заранее, ограничивается при скачивании
+    return {
+        'url': remote.url,
+        'file_unique_id': 'url:' + hashlib.sha1(remote.url.encode('utf-8')).hexdigest()[:16],
+        'file_name': file_name,
+        'generated_name': not remote.file_name,
+        'type': file_type_category,
+        'size_mb': file_size_mb,
+        'file_size': remote.size
+    }, None
+
+
+def get_max_size_bytes(item):
+    return ALLOWED_FILE_TYPES[item['type']]['max_size_mb'] * 1024 * 1024
 
 
 async def handle_file(update: Update, context) -> None:
+    logger.info(f"Получен файл от пользователя {update.message.from_user.id}.")
+
+    if USE_ALLOWED_USERS and update.message.from_user.id not in ALLOWED_USERS:
+        logger.warning(f"Пользователь {update.message.from_user.id} не имеет прав для загрузки файлов.")
+        await update.message.reply_text('У вас нет прав для загрузки файлов.')
+        return
+
+    # Части альбома приходят отдельными обновлениями; пакет разбирается целиком в handle_file_group
+    ingest_batcher.add(update.message, context)
+
+
+async def handle_file_group(messages, context) -> None:
+    first_message = messages[0]
     try:
-        logger.info(f"Получен файл от пользователя {update.message.from_user.id}.")
+        batch = pending_batches.new_batch(first_message.from_user.id, first_message.chat_id)
 
-        if USE_ALLOWED_USERS and update.message.from_user.id not in ALLOWED_USERS:
-            logger.warning(f"Пользователь {update.message.from_user.id} не имеет прав для загрузки файлов.")
-            await update.message.reply_text('У вас нет прав для загрузки файлов.')
-            return
+        for message in messages:
+            if message.caption:
+                batch.add_comment(message.caption, message.date.strftime('%Y-%m-%d %H:%M:%S'))
 
-        file = None
-        file_type_category = None
-        file_extension = ''
-        original_file_name = None
-
-        caption = update.message.caption
-        if caption and 'comments' not in context.user_data:
-            context.user_data['comments'] = []
-        if caption:
-            comment_count = len(context.user_data['comments']) + 1
-            comment = {
-                'filename': f'comment_{comment_count}.txt',
-                'content': caption,
-                'telegram_timestamp': update.message.date.strftime('%Y-%m-%d %H:%M:%S')
-            }
-            context.user_data['comments'].append(comment)
-
-        if 'files' not in context.user_data:
-            context.user_data['files'] = []
-        if 'unsupported_files' not in context.user_data:
-            context.user_data['unsupported_files'] = []
-
-        if update.message.photo:
-            file = update.message.photo[-1]
-            file_type_category = 'image'
-            file_extension = '.jpg'
-            file_name = f"image_{len(context.user_data.get('files', [])) + 1}{file_extension}"
-        elif update.message.video:
-            file = update.message.video
-            file_type_category = 'video'
-            original_file_name = file.file_name
-            file_extension = os.path.splitext(original_file_name)[1] if original_file_name else '.mp4'
-            file_name = original_file_name or f"video_{len(context.user_data.get('files', [])) + 1}{file_extension}"
-            file_size_mb = file.file_size / (1024 * 1024)
-            logger.info(f"Видео: {file_name}, размер: {file_size_mb:.2f} МБ")
-            if file_size_mb > 50:  # Лимит Telegram API
-                await update.message.reply_text(
-                    "Видео превышает 50 МБ и не может быть загружено через Telegram. "
-                    "Пожалуйста, отправьте прямую ссылку на видео (например, из Google Drive или другого сервиса)."
-                )
-                return
-        elif update.message.audio:
-            file = update.message.audio
-            file_type_category = 'audio'
-            original_file_name = file.file_name
-            file_extension = os.path.splitext(original_file_name)[1] if original_file_name else '.mp3'
-            file_name = original_file_name or f"audio_{len(context.user_data.get('files', [])) + 1}{file_extension}"
-        elif update.message.document:
-            file = update.message.document
-            original_file_name = file.file_name
-            file_extension = os.path.splitext(original_file_name)[1].lower() if original_file_name else ''
-            mime_type = file.mime_type or 'application/octet-stream'
-            logger.info(f"Документ: {original_file_name}, размер: {file.file_size / (1024 * 1024):.2f} МБ, MIME: {mime_type}")
-            if file_extension in ['.mp4', '.mov', '.avi', '.mkv'] or mime_type in ALLOWED_FILE_TYPES['video']['mime_types']:
-                file_type_category = 'video'
-                file_name = original_file_name or f"video_{len(context.user_data.get('files', [])) + 1}{file_extension}"
-                file_size_mb = file.file_size / (1024 * 1024)
-                if file_size_mb > 50:  # Лимит Telegram API
-                    await update.message.reply_text(
-                        "Видео превышает 50 МБ и не может быть загружено через Telegram. "
-                        "Пожалуйста, отправьте прямую ссылку на видео (например, из Google Drive или другого сервиса)."
-                    )
-                    return
-            else:
-                file_type_category = get_file_type_category(mime_type, file_extension)
-                file_name = original_file_name
-
-        if not file:
-            await update.message.reply_text('Ошибка: файл не найден.')
-            return
+            current_file, unsupported = classify_message(message, len(batch.files) + 1)
+            if unsupported:
+                batch.add_unsupported(unsupported)
+            elif current_file and current_file['file_unique_id'] not in batch.file_ids:
+                # Одинаковое содержимое загружается один раз, разные файлы с одним именем получают суффикс
+                current_file['file_name'] = make_unique_name(current_file['file_name'], batch.file_names)
+                batch.add_file(current_file)
 
-        if not file_type_category:
-            current_file = {
-                'name': original_file_name or 'Неизвестный файл',
-                'reason': 'Неподдерживаемый формат'
-            }
-            if current_file not in context.user_data['unsupported_files']:
-                context.user_data['unsupported_files'].append(current_file)
-        else:
-            max_size = ALLOWED_FILE_TYPES[file_type_category]['max_size_mb']
-            file_size_mb = file.file_size / (1024 * 1024)
-
-            if file_size_mb > max_size:
-                current_file = {
-                    'name': file_name,
-                    'reason': f'превышен размер {format_size(max_size)}'
-                }
-                if current_file not in context.user_data['unsupported_files']:
-                    context.user_data['unsupported_files'].append(current_file)
-            else:
-                current_file = {
-                    'file_id': file.file_id,
-                    'file_name': file_name,
-                    'type': file_type_category,
-                    'size_mb': file_size_mb
-                }
-                if not any(f['file_name'] == file_name for f in context.user_data['files']):
-                    context.user_data['files'].append(current_file)
-
-        if not context.user_data['files'] and context.user_data['unsupported_files']:
+        await submit_pending_batch(first_message, batch)
+
+    except Exception as e:
+        logger.error(f"Ошибка в handle_file_group: {e}")
+        await first_message.reply_text('Произошла ошибка при обработке файла. Пожалуйста, попробуйте еще раз.')
+
+
+async def handle_url(update: Update, context) -> None:
+    message = update.message
+    logger.info(f"Получены ссылки от пользователя {message.from_user.id}.")
+
+    if USE_ALLOWED_USERS and message.from_user.id not in ALLOWED_USERS:
+        logger.warning(f"Пользователь {message.from_user.id} не имеет прав для загрузки файлов.")
+        await message.reply_text('У вас нет прав для загрузки файлов.')
+        return
+
+    urls = []
+    for entity, text in message.parse_entities([MessageEntity.URL, MessageEntity.TEXT_LINK]).items():
+        url = entity.url if entity.type == MessageEntity.TEXT_LINK else text
+        if '://' not in url:
+            url = f'https://{url}'
+        if url not in urls:
+            urls.append(url)
+    urls = urls[:URL_MAX_PER_MESSAGE]
+
+    try:
+        batch = pending_batches.new_batch(message.from_user.id, message.chat_id)
+        # Ссылки проверяются HEAD-запросами параллельно: размер, тип и поддержка Range
+        probes = await asyncio.gather(*(url_downloader.probe(url) for url in urls), return_exceptions=True)
+        for url, remote in zip(urls, probes):
+            if isinstance(remote, UrlDownloadError):
+                batch.add_unsupported({'name': url, 'reason': str(remote)})
+                continue
+            if isinstance(remote, Exception):
+                raise remote
+            current_file, unsupported = classify_remote_file(remote, len(batch.files) + 1)
+            if unsupported:
+                batch.add_unsupported(unsupported)
+            elif current_file['file_unique_id'] not in batch.file_ids:
+                current_file['file_name'] = make_unique_name(current_file['file_name'], batch.file_names)
+                batch.add_file(current_file)
+                logger.info(f"Ссылка: {current_file['file_name']}, размер: {current_file['size_mb']:.2f} МБ, "
+                            f"Range: {'да' if remote.ranged else 'нет'}")
+
+        await submit_pending_batch(message, batch)
+
+    except Exception as e:
+        logger.error(f"Ошибка в handle_url: {e}")
+        await message.reply_text('Произошла ошибка при обработке ссылки. Пожалуйста, попробуйте еще раз.')
+
+
+async def submit_pending_batch(message, batch) -> None:
+    if not batch.files:
+        if batch.unsupported_files:
             unsupported_message = "Следующие файлы не поддерживаются:\n"
-            for file in context.user_data['unsupported_files']:
+            for file in batch.unsupported_files:
                 unsupported_message += f"• {file['name']} - {file['reason']}\n"
-            context.user_data['files'] = []
-            context.user_data['unsupported_files'] = []
-            context.user_data['comments'] = []
-            await update.message.reply_text(unsupported_message)
-            return
+            await message.reply_text(unsupported_message)
+        else:
+            await message.reply_text('Ошибка: файл не найден.')
+        return
 
-        if context.user_data['files']:
-            current_time = datetime.datetime.now()
-            if 'last_message_time' not in context.user_data or \
-                    (current_time - context.user_data['last_message_time']).total_seconds() > 5:
-                context.user_data['last_message_time'] = current_time
-                await send_folder_buttons(update, context)
+    pending_batches.add(batch)
+    logger.info(f"Пакет {batch.token}: {len(batch.files)} файлов, {len(batch.unsupported_files)} отклонено, "
+                f"{len(batch.comments)} комментариев")
 
-    except Exception as e:
-        logger.error(f"Ошибка в handle_file: {e}")
-        await update.message.reply_text('Произошла ошибка при обработке файла. Пожалуйста, попробуйте еще раз.')
+    await send_folder_buttons(message, batch.token)
 
-async def handle_folder_selection(update: Update, context) -> None:
-    query = update.callback_query
-    await query.answer()
 
-    await query.edit_message_reply_markup(reply_markup=None)
-    await query.edit_message_text(text='Загружаю файлы...')
+def observe_upload(file_type, size, seconds):
+    metrics.drive_upload_seconds.observe(seconds, file_type=file_type)
+    metrics.drive_upload_bytes.inc(size, file_type=file_type)
+    if seconds > 0:
+        metrics.drive_upload_throughput.observe(size / seconds, file_type=file_type)
+
+
+def run_in_background(coroutine):
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def notify_admins(bot, message):
+    for admin_id in ADMIN_USERS:
+        try:
+            await bot.send_message(chat_id=admin_id, text=message)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке статистики админу {admin_id}: {e}")
 
-    files = context.user_data.get('files', [])
-    unsupported_files = context.user_data.get('unsupported_files', [])
-    comments = context.user_data.get('comments', [])
 
-    def create_progress_bar(current, total, width=20):
-        progress = int(width * current / total)
-        return f"[{'■' * progress}{'□' * (width - progress)}]"
+async def handle_folder_selection(update: Update, context) -> None:
+    query = update.callback_query
+    # Пакет забирается из хранилища до первого await: повторное нажатие кнопки при
+    # UPDATE_CONCURRENCY > 1 не должно поставить тот же пакет в очередь дважды
+    batch_token, _, folder_id = query.data.partition(':')
+    pending = pending_batches.pop(batch_token, query.from_user.id)
 
-    if not files and not unsupported_files:
+    await query.answer()
+    if not pending:
         await query.edit_message_text(text='Ошибка: Файлы не найдены. Пожалуйста, загрузите файлы перед выбором папки.')
         return
 
-    folder_id = query.data
-
+    # При ошибке пакет возвращается в хранилище, а кнопки остаются: папку можно выбрать снова
     try:
-        upload_folder_id = drive_service.find_folder_id_by_name('Upload')
-        folders = drive_service.get_folders(upload_folder_id)
-        folder_name = next(name for name, id in folders.items() if id == folder_id)
-    except StopIteration:
-        await query.edit_message_text(text='Ошибка: Выбранная папка не найдена.')
-        return
+        upload_folder_id = await folder_index.ensure_seeded()
+        folder_name = folder_index.get_folder_name(folder_id, upload_folder_id)
     except Exception as e:
         logger.error(f"Ошибка при получении имени папки: {e}")
-        await query.edit_message_text(text='Произошла ошибка при выборе папки.')
+        pending_batches.add(pending)
+        await query.edit_message_text(text='Произошла ошибка при выборе папки.',
+                                      reply_markup=query.message.reply_markup)
+        return
+    if folder_name is None:
+        pending_batches.add(pending)
+        await query.edit_message_text(text='Ошибка: Выбранная папка не найдена.',
+                                      reply_markup=query.message.reply_markup)
         return
 
     date_folder_name = datetime.datetime.now() + timedelta(hours=3)
-    date_folder_name_str = date_folder_name.strftime("%d-%m-%Y")
-    date_folder_id = drive_service.find_folder_id_by_name(date_folder_name_str, folder_id)
-    if date_folder_id is None:
-        date_folder_id = drive_service.create_folder(folder_id, date_folder_name_str)
-
-    uploaded_files = []
-    total_files = len(files) + len(comments)
-    current_file = 0
-
-    for file_info in files:
-        current_file += 1
-        progress_bar = create_progress_bar(current_file - 0.5, total_files)
-        percentage = ((current_file - 0.5) / total_files) * 100
-
-        progress_message = (
-            f'Загружаю файлы...\n'
-            f'Загрузка файла {file_info["file_name"]}\n'
-            f'{progress_bar} {percentage:.1f}%\n'
-            f'Прогресс: {current_file}/{total_files}'
+    batch = {
+        'id': uuid.uuid4().hex,
+        'chat_id': query.message.chat_id,
+        'message_id': query.message.message_id,
+        'user_id': query.from_user.id,
+        'folder_id': folder_id,
+        'folder_name': folder_name,
+        'date_folder_name': date_folder_name.strftime("%d-%m-%Y"),
+        'files': pending.files,
+        'comments': pending.comments,
+        'unsupported_files': pending.unsupported_files,
+        'bundle': context.user_data.pop('bundle_next', False) or (
+            folder_name in BUNDLE_FOLDERS and len(pending.files) + len(pending.comments) >= BUNDLE_MIN_FILES
         )
-        await query.edit_message_text(text=progress_message)
+    }
+    try:
+        position = upload_queue.enqueue(batch)
+    except Exception:
+        # Кнопки еще не убраны: пакет возвращается в хранилище, и папку можно выбрать снова
+        pending_batches.add(pending)
+        raise
 
-        if 'file_id' in file_info:
+    # Воркер будится после правки сообщения, чтобы она не перезаписала его прогресс
+    try:
+        await query.edit_message_reply_markup(reply_markup=None)
+        if position > 1:
+            await query.edit_message_text(text=f'Файлы поставлены в очередь на загрузку, позиция: {position}')
+        else:
+            await query.edit_message_text(text='Загружаю файлы...')
+    finally:
+        upload_workers.notify()
+
+
+async def upload_bundle(bot, batch, items, date_folder_id, existing_files, edit_message):
+    # Все файлы пакета и комментарии упаковываются в один ZIP по ходу скачивания и загружаются одним объектом
+    archive_name = make_unique_name(f"bundle_{(datetime.datetime.now() + timedelta(hours=3)).strftime('%H-%M-%S')}.zip",
+                                    set(existing_files or {}))
+    progress = ProgressReporter(bot, batch['chat_id'], batch['message_id'],
+                                {'archive': sum(get_item_size(item) for item in items)},
+                                interval=PROGRESS_UPDATE_SECONDS)
+    failed_files = []
+    stream = BoundedStream(STREAM_BUFFER_CHUNKS)
+    writer = ZipBundleWriter(stream)
+
+    def count_downloaded(size):
+        progress.add_downloaded('archive', size)
+
+    async def add_member(item):
+        name = get_item_name(item)
+        if 'content' in item:
+            await writer.add_bytes(name, item['content'].encode('utf-8'))
+            return
+        if 'url' in item:
             try:
-                photo_file = await context.bot.get_file(file_info['file_id'])
-                photo_file_path = os.path.join(os.getcwd(), file_info['file_name'])
-                await photo_file.download_to_drive(photo_file_path)
-            except telegram.error.BadRequest as e:
-                logger.error(f"Ошибка при скачивании файла {file_info['file_name']}: {e}")
-                await query.edit_message_text(
-                    text=f"Файл {file_info['file_name']} слишком большой (>50 МБ). "
-                         f"Пожалуйста, отправьте прямую ссылку на файл."
-                )
+                remote = await url_downloader.probe(item['url'])
+            except UrlDownloadError as e:
+                failed_files.append({'name': name, 'reason': f'ошибка скачивания по ссылке: {e}'})
                 return
-        else:  # Файлы из URL
-            photo_file_path = file_info['file_path']
-
+            member_stream = url_downloader.open(remote, on_bytes=count_downloaded, limit=get_max_size_bytes(item))
+            try:
+                await writer.add(name, member_stream.read, remote.size, item.get('type'))
+            finally:
+                await member_stream.close()
+            return
         try:
-            drive_service.upload_file(photo_file_path, date_folder_id, file_info['file_name'])
-            uploaded_files.append(file_info['file_name'])
-            os.remove(photo_file_path)
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке файла {file_info['file_name']}: {e}")
-            await query.edit_message_text(text=f'Ошибка при загрузке файла {file_info["file_name"]}.')
+            telegram_file = await bot.get_file(item['file_id'])
+        except BadRequest:
+            failed_files.append({'name': name, 'reason': f'слишком большой (>{format_size(TELEGRAM_DOWNLOAD_LIMIT_MB)}), '
+                                                         f'отправьте прямую ссылку'})
+            return
+        if TELEGRAM_LOCAL_MODE and os.path.isabs(telegram_file.file_path):
+            with open(telegram_file.file_path, 'rb') as f:
+                async def read(size):
+                    data = await asyncio.to_thread(f.read, size)
+                    count_downloaded(len(data))
+                    return data
+
+                await writer.add(name, read, item.get('file_size'), item.get('type'))
             return
+        member_stream = telegram_streamer.open(telegram_file, on_bytes=count_downloaded)
+        try:
+            await writer.add(name, member_stream.read, item.get('file_size'), item.get('type'))
+        finally:
+            await member_stream.close()
 
-    # Загрузка комментариев (без изменений)
-    for comment in comments:
-        current_file += 1
-        progress_bar = create_progress_bar(current_file - 0.5, total_files)
-        percentage = ((current_file - 0.5) / total_files) * 100
-
-        progress_message = (
-            f'Загружаю файлы...\n'
-            f'Загрузка комментария {comment["filename"]}\n'
-            f'{progress_bar} {percentage:.1f}%\n'
-            f'Прогресс: {current_file}/{total_files}'
-        )
-        await query.edit_message_text(text=progress_message)
+    async def produce(target):
+        for item in items:
+            await add_member(item)
+        await writer.finish()
 
-        comment_path = os.path.join(os.getcwd(), comment['filename'])
-        with open(comment_path, 'w', encoding='utf-8') as f:
-            f.write(comment['content'])
+    def on_offset(value):
+        progress.set_uploaded('archive', value, archive_name)
 
+    stream.attach(produce)
+    progress.start()
+    started = time.monotonic()
+    try:
+        await upload_scheduler.run(batch['user_id'], lambda: drive_service.upload_stream(
+            stream.read, date_folder_id, archive_name, existing_files=existing_files, on_offset=on_offset
+        ))
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке архива {archive_name}: {e}")
+        await edit_message('Не удалось загрузить архив с файлами, попробуйте позже.')
+        upload_journal.finish_batch(batch['id'])
+        return
+    finally:
+        await stream.close()
+        await progress.close()
+
+    observe_upload('bundle', stream.bytes_read, time.monotonic() - started)
+    logger.info(f"Архив {archive_name}: {len(writer.members)} файлов, {stream.bytes_read} байт")
+    await report_batch(bot, batch, writer.members, failed_files, [], edit_message, archive=archive_name)
+
+
+async def process_upload_batch(bot, batch):
+    batch_id = batch['id']
+    files = batch['files']
+    comments = batch['comments']
+    date_folder_name_str = batch['date_folder_name']
+    upload_journal.start_batch(batch)
+
+    async def edit_message(text):
         try:
-            drive_service.upload_file(comment_path, date_folder_id, comment['filename'])
-            uploaded_files.append(comment['filename'])
-            os.remove(comment_path)
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке комментария {comment['filename']}: {e}")
+            await bot.edit_message_text(text=text, chat_id=batch['chat_id'], message_id=batch['message_id'])
+        except BadRequest as e:
+            logger.warning(f"Не удалось обновить сообщение: {e}")
 
-    # Формирование итогового сообщения (без изменений)
+    try:
+        date_folder_id = await folder_index.get_or_create_folder(batch['folder_id'], date_folder_name_str)
+    except Exception as e:
+        logger.error(f"Ошибка при создании папки {date_folder_name_str}: {e}")
+        await edit_message('Произошла ошибка при выборе папки.')
+        upload_journal.finish_batch(batch_id)
+        return
+
+    try:
+        folder_entries = await drive_service.list_folder_entries(date_folder_id)
+        existing_files = {entry['name']: entry['id'] for entry in folder_entries}
+        folder_checksums = {entry['md5Checksum']: entry['id'] for entry in folder_entries if entry.get('md5Checksum')}
+    except Exception as e:
+        logger.warning(f"Не удалось получить содержимое папки {date_folder_name_str}: {e}")
+        existing_files = None
+        folder_checksums = {}
+
+    items = files + comments
+    metrics.batch_files.observe(len(items))
+    if batch.get('bundle'):
+        await upload_bundle(bot, batch, items, date_folder_id, existing_files, edit_message)
+        return
+
+    item_keys = {id(item): str(index) for index, item in enumerate(items)}
+    progress = ProgressReporter(
+        bot, batch['chat_id'], batch['message_id'],
+        {item_keys[id(item)]: get_item_size(item) for item in items},
+        interval=PROGRESS_UPDATE_SECONDS
+    )
+
+    deduplicated = []
+
+    def skip_as_existing(item, file_id):
+        # В итоге пакета файл показывается под тем именем, под которым он уже лежит в папке
+        for name, existing_id in (existing_files or {}).items():
+            if existing_id == file_id:
+                set_item_name(item, name)
+        return KnownFile(file_id, item.get('file_size') or 0, copied=False)
+
+    async def find_known_file(item):
+        unique_id = item.get('file_unique_id')
+        entry = dedup_index.lookup(unique_id) if unique_id else None
+        if not entry:
+            return None
+        md5 = entry['md5']
+        if not md5:
+            # Без md5 загруженного содержимого нельзя убедиться, что файл в Drive с тех пор не перезаписан
+            dedup_index.forget(unique_id)
+            return None
+        if md5 in folder_checksums:
+            return skip_as_existing(item, folder_checksums[md5])
+        try:
+            source = await drive_service.get_file(entry['file_id'])
+            if not source or source.get('trashed') or source.get('md5Checksum') != md5:
+                # Файл удален или перезаписан другим содержимым: медиа загружается заново
+                dedup_index.forget(unique_id)
+                return None
+            if existing_files and get_item_name(item) in existing_files:
+                # Файл с этим именем и другим содержимым обновляется обычной загрузкой
+                return None
+            copy = await drive_service.copy_file(entry['file_id'], date_folder_id, get_item_name(item), md5)
+        except DriveApiError as e:
+            logger.warning(f"Не удалось использовать уже загруженную копию {get_item_name(item)}: {e}")
+            return None
+        if existing_files is not None:
+            existing_files[get_item_name(item)] = copy['id']
+        folder_checksums[md5] = copy['id']
+        return KnownFile(copy['id'], item.get('file_size') or 0, copied=True)
+
+    async def transform_telegram_file(item, telegram_file):
+        # Для перекомпрессии нужен файл на диске; результат загружается как обычный файл, без журнала сессии
+        local = TELEGRAM_LOCAL_MODE and os.path.isabs(telegram_file.file_path)
+        if local:
+            source_path = telegram_file.file_path
+        else:
+            source_path = media_transformer.make_temp_path(get_item_name(item))
+            started = time.monotonic()
+            try:
+                await telegram_file.download_to_drive(source_path)
+            except Exception:
+                os.remove(source_path)
+                raise
+            metrics.telegram_download_seconds.observe(time.monotonic() - started, file_type=item['type'])
+        progress.add_downloaded(item_keys[id(item)], item.get('file_size') or 0)
+
+        target_path = await media_transformer.transform(source_path, item)
+        if local:
+            return target_path or telegram_file
+        if target_path:
+            os.remove(source_path)
+            return target_path
+        return source_path
+
+    async def download_item(item):
+        if 'file_id' in item:
+            # Уже загруженное содержимое не скачивается из Telegram повторно
+            known_file = await find_known_file(item)
+            if known_file:
+                return known_file
+            telegram_file = await bot.get_file(item['file_id'])
+            if media_transformer.enabled_for(item):
+                return await transform_telegram_file(item, telegram_file)
+            return telegram_file
+        if 'content' in item:
+            return item['content'].encode('utf-8')
+        if 'url' in item:
+            # Ссылка проверяется повторно: пакет мог долго ждать в очереди
+            remote = await url_downloader.probe(item['url'])
+            if item.get('file_size') is not None and remote.size != item['file_size']:
+                raise UrlDownloadError('файл по ссылке изменился после проверки')
+            return remote
+        return item['file_path']  # Файлы, уже сохраненные на диск
+
+    async def resume_session(key, item):
+        # Сессия из журнала: (session_uri, offset, None) или (None, 0, файл Drive), если файл уже загружен
+        session_uri = upload_journal.get_item(batch_id, key).get('session_uri')
+        if not session_uri:
+            return None, 0, None
+        status = await drive_service.get_upload_status(session_uri, item.get('file_size'))
+        if status is None:
+            upload_journal.reset_item(batch_id, key)
+            return None, 0, None
+        if 'file' in status:
+            return None, 0, status['file']
+        offset = status['offset']
+        logger.info(f"Продолжаю загрузку {get_item_name(item)} с {offset} байт")
+        progress.add_downloaded(key, offset)
+        progress.set_uploaded(key, offset)
+        return session_uri, offset, None
+
+    def make_offset_handler(key, item):
+        def on_offset(value):
+            upload_journal.commit_offset(batch_id, key, value)
+            progress.set_uploaded(key, value, get_item_name(item))
+        return on_offset
+
+    async def upload_telegram_file(key, item, telegram_file):
+        session_uri, offset, uploaded_file = await resume_session(key, item)
+        if uploaded_file:
+            return uploaded_file
+        on_offset = make_offset_handler(key, item)
+
+        if TELEGRAM_LOCAL_MODE and os.path.isabs(telegram_file.file_path):
+            # Локальный Bot API уже сохранил файл на диск: он читается оттуда без скачивания по HTTP и копирования
+            return await drive_service.upload_file(
+                telegram_file.file_path, date_folder_id, get_item_name(item), existing_files,
+                session_uri=session_uri,
+                start_offset=offset,
+                on_session=lambda uri: upload_journal.set_session(batch_id, key, uri),
+                on_offset=on_offset,
+                on_bytes=lambda size: progress.add_downloaded(key, size)
+            )
+
+        stream = telegram_streamer.open(telegram_file, offset, on_bytes=lambda size: progress.add_downloaded(key, size))
+        try:
+            uploaded_file = await drive_service.upload_stream(
+                stream.read, date_folder_id, get_item_name(item), item.get('file_size'), existing_files,
+                session_uri=session_uri,
+                start_offset=offset,
+                on_session=lambda uri: upload_journal.set_session(batch_id, key, uri),
+                on_offset=on_offset
+            )
+        finally:
+            await stream.close()
+        if stream.producer_seconds is not None:
+            metrics.telegram_download_seconds.observe(stream.producer_seconds, file_type=item.get('type', 'file'))
+        return uploaded_file
+
+    async def upload_url_file(key, item, remote):
+        # Части файла скачиваются параллельно и сразу уходят в resumable-сессию, без временного файла
+        session_uri, offset, uploaded_file = await resume_session(key, item)
+        if uploaded_file:
+            return uploaded_file
+        stream = url_downloader.open(remote, offset, on_bytes=lambda size: progress.add_downloaded(key, size),
+                                     limit=get_max_size_bytes(item))
+        try:
+            uploaded_file = await drive_service.upload_stream(
+                stream.read, date_folder_id, get_item_name(item), remote.size, existing_files,
+                session_uri=session_uri,
+                start_offset=offset,
+                on_session=lambda uri: upload_journal.set_session(batch_id, key, uri),
+                on_offset=make_offset_handler(key, item)
+            )
+        finally:
+            await stream.close()
+        if stream.producer_seconds is not None:
+            metrics.url_download_seconds.observe(stream.producer_seconds, file_type=item['type'])
+        return uploaded_file
+
+    async def transfer_item(key, item, source):
+        if isinstance(source, File):
+            return await upload_telegram_file(key, item, source)
+        if isinstance(source, RemoteFile):
+            return await upload_url_file(key, item, source)
+        if isinstance(source, bytes):
+            return await drive_service.upload_bytes(source, date_folder_id, get_item_name(item), existing_files)
+        return await drive_service.upload_file(source, date_folder_id, get_item_name(item), existing_files)
+
+    async def timed_transfer(key, item, source):
+        started = time.monotonic()
+        uploaded_file = await transfer_item(key, item, source)
+        observe_upload(item.get('type', 'comment' if 'content' in item else 'file'), get_item_size(item),
+                       time.monotonic() - started)
+        return uploaded_file
+
+    async def upload_item(item, source):
+        key = item_keys[id(item)]
+        if isinstance(source, KnownFile):
+            file_id = source.file_id
+            deduplicated.append(source)
+            logger.info(f"{get_item_name(item)} уже есть в Drive, {'скопирован' if source.copied else 'пропущен'}")
+        else:
+            # Слот на загрузку выдается планировщиком по очереди между пользователями
+            uploaded_file = await upload_scheduler.run(batch['user_id'], lambda: timed_transfer(key, item, source))
+            file_id = uploaded_file['id']
+            if 'file_id' in item:
+                # md5 сохраняется вместе с файлом: по нему поиск проверяет, что файл в Drive не перезаписан
+                dedup_index.remember(item['file_unique_id'], file_id, size=item.get('file_size'),
+                                     md5=uploaded_file.get('md5Checksum'))
+        upload_journal.complete_item(batch_id, key, file_id)
+        return file_id
+
+    async def cleanup_item(item, source):
+        if isinstance(source, str) and os.path.exists(source):
+            os.remove(source)
+
+    async def report_result(result):
+        progress.file_done(item_keys[id(result.item)], get_item_name(result.item), result.ok)
+
+    # Файлы, загруженные до перезапуска, повторно не отправляются
+    pending_items = []
+    for index, item in enumerate(items):
+        if upload_journal.get_item(batch_id, str(index)).get('file_id'):
+            progress.file_done(str(index), get_item_name(item), True)
+        else:
+            pending_items.append(item)
+
+    # Сгенерированные имена (image_1.jpg, comment_1.txt) не должны заменять файлы прошлых пакетов в этой папке
+    if existing_files:
+        taken = set(existing_files) | {get_item_name(item) for item in items}
+        for item in pending_items:
+            key = item_keys[id(item)]
+            generated = item.get('generated_name') or 'content' in item
+            if not generated or get_item_name(item) not in existing_files \
+                    or upload_journal.get_item(batch_id, key).get('session_uri'):
+                continue
+            unique_name = make_unique_name(get_item_name(item), taken)
+            taken.add(unique_name)
+            set_item_name(item, unique_name)
+
+    pipeline = UploadPipeline(
+        download_item,
+        upload_item,
+        download_concurrency=DOWNLOAD_CONCURRENCY,
+        upload_concurrency=UPLOAD_CONCURRENCY,
+        on_result=report_result,
+        cleanup=cleanup_item
+    )
+    progress.start()
+    try:
+        results = await pipeline.run(pending_items)
+    finally:
+        await progress.close()
+
+    failed_files = []
+    failed_names = set()
+    for result in results:
+        if result.ok:
+            continue
+        if isinstance(result.error, BadRequest):
+            reason = f'слишком большой (>{format_size(TELEGRAM_DOWNLOAD_LIMIT_MB)}), отправьте прямую ссылку'
+        elif isinstance(result.error, UrlDownloadError):
+            reason = f'ошибка скачивания по ссылке: {result.error}'
+        else:
+            reason = 'ошибка загрузки'
+        failed_files.append({'name': get_item_name(result.item), 'reason': reason})
+        failed_names.add(get_item_name(result.item))
+    uploaded_files = [get_item_name(item) for item in items if get_item_name(item) not in failed_names]
+
+    await report_batch(bot, batch, uploaded_files, failed_files, deduplicated, edit_message)
+
+
+async def report_batch(bot, batch, uploaded_files, failed_files, deduplicated, edit_message, archive=None):
+    comments = batch['comments']
+    unsupported_files = batch['unsupported_files']
+    folder_name = batch['folder_name']
+    date_folder_name_str = batch['date_folder_name']
+
+    # Формирование итогового сообщения
     total_uploaded = len(uploaded_files)
-    total_files = len(files) + len(context.user_data.get('unsupported_files', []))
-    total_comments = len(context.user_data.get('comments', []))
+    total_files = len(batch['files']) + len(unsupported_files)
+    total_comments = len(comments)
 
     success_message = f'Успешно загружено {total_uploaded} {get_files_word(total_uploaded)}!\n'
     success_message += f'Папка: {folder_name}/{date_folder_name_str}\n'
@@ -352,63 +1024,129 @@ async def handle_folder_selection(update: Update, context) -> None:
         success_message += f' и {total_comments} {get_comments_word(total_comments)}'
     success_message += '\n'
 
-    if uploaded_files:
+    if archive:
+        success_message += f'\nФайлы загружены одним архивом {archive}:\n'
+        for file in uploaded_files:
+            success_message += f"• {file}\n"
+    elif uploaded_files:
         success_message += f'\nЗагруженные файлы:\n'
         for file in uploaded_files:
             if file.startswith('comment_'):
                 continue
             success_message += f"• {file}\n"
 
-    if context.user_data.get('comments'):
+    if comments and not archive:
         success_message += f'\nКомментарии:\n'
-        for comment in context.user_data['comments']:
+        for comment in comments:
             success_message += f"• {comment['filename']}\n"
 
-    if context.user_data.get('unsupported_files'):
+    if deduplicated:
+        skipped_bytes = sum(known_file.size for known_file in deduplicated)
+        success_message += (f'\nУже были в Drive и не передавались повторно: {len(deduplicated)} '
+                            f'{get_files_word(len(deduplicated))} ({format_size(skipped_bytes / (1024 * 1024))})\n')
+
+    if failed_files:
+        success_message += f'\nНе удалось загрузить:\n'
+        for failed in failed_files:
+            success_message += f"• {failed['name']} - {failed['reason']}\n"
+
+    if unsupported_files:
         success_message += f'\nНеподдерживаемые файлы:\n'
-        for unsupported in context.user_data['unsupported_files']:
+        for unsupported in unsupported_files:
             success_message += f"• {unsupported['name']}\n"
 
-    await query.edit_message_text(text=success_message)
+    await edit_message(success_message)
 
-    # Отправка статистики админам и запись в Google Sheets (без изменений)
+    # Отправка статистики админам и запись в Google Sheets идут в фоне, не задерживая ответ пользователю
     if ADMIN_USERS:
-        for admin_id in ADMIN_USERS:
-            try:
-                await context.bot.send_message(chat_id=admin_id, text=success_message)
-            except Exception as e:
-                logger.error(f"Ошибка при отправке статистики админу {admin_id}: {e}")
+        run_in_background(notify_admins(bot, success_message))
 
-    stats_folder_id = drive_service.find_folder_id_by_name(STATISTICS_FOLDER, upload_folder_id)
-    if not stats_folder_id:
-        stats_folder_id = drive_service.create_folder(upload_folder_id, STATISTICS_FOLDER)
-
-    stats_file_id = drive_service.create_or_get_statistics_sheet(stats_folder_id, STATISTICS_FILE)
-    drive_service.add_statistics_entry(
-        stats_file_id,
+    statistics_writer.add_entry(
         datetime.datetime.now() + datetime.timedelta(hours=0),
-        query.from_user.id,
+        batch['user_id'],
         f"{folder_name}/{date_folder_name_str}",
-        uploaded_files
+        [f'{archive}/{file}' for file in uploaded_files] if archive else uploaded_files
     )
 
-    # Очистка данных
-    context.user_data['files'] = []
-    context.user_data['unsupported_files'] = []
-    context.user_data['comments'] = []
-
-
-
-def main() -> None:
-    application = Application.builder().token(API_TOKEN).build()
+    upload_journal.finish_batch(batch['id'])
+
+
+async def post_init(application: Application) -> None:
+    record_startup_stage('инициализация Bot API')
+    # Токен Drive и индекс папок загружаются в фоне, здесь только создаются сессии и задачи
+    await drive_service.start()
+    await telegram_streamer.start()
+    await url_downloader.start()
+    await folder_index.start()
+    await statistics_writer.start()
+    record_startup_stage('запуск клиентов')
+    if metrics_server:
+        await metrics_server.start()
+        record_startup_stage('сервер метрик')
+    upload_workers.handler = lambda job: process_upload_batch(application.bot, job)
+    upload_workers.start()
+    record_startup_stage('воркеры очереди')
+    if retention_sweeper.enabled and RETENTION_INTERVAL_HOURS > 0:
+        interval = RETENTION_INTERVAL_HOURS * 3600
+        if application.job_queue:
+            application.job_queue.run_repeating(retention_job, interval=interval, first=RETENTION_FIRST_RUN_SECONDS,
+                                                name='retention')
+        else:
+            retention_sweeper.start(lambda: run_retention(application.bot), interval, RETENTION_FIRST_RUN_SECONDS)
+    logger.info(f"Бот запущен за {time.monotonic() - process_started:.3f} с: "
+                + ', '.join(f'{stage} {seconds:.3f} с' for stage, seconds in startup_stages))
+
+
+async def post_shutdown(application: Application) -> None:
+    await ingest_batcher.close()
+    await retention_sweeper.close()
+    await upload_workers.close()
+    dedup_index.close()
+    pending_batches.close()
+    media_transformer.close()
+    await statistics_writer.close()
+    await folder_index.close()
+    await telegram_streamer.close()
+    await url_downloader.close()
+    await drive_service.close()
+    if metrics_server:
+        await metrics_server.close()
+
+
+def build_application() -> Application:
+    application = Application.builder().token(API_TOKEN).base_url(TELEGRAM_BASE_URL) \
+        .base_file_url(TELEGRAM_BASE_FILE_URL).local_mode(TELEGRAM_LOCAL_MODE) \
+        .concurrent_updates(UPDATE_CONCURRENCY).post_init(post_init).post_shutdown(post_shutdown).build()
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("uploadstats", upload_stats))
+    application.add_handler(CommandHandler("queue", queue_status))
+    application.add_handler(CommandHandler("bundle", bundle_mode))
+    application.add_handler(CommandHandler("retention", retention_command))
 
     application.add_handler(MessageHandler(
         filters.PHOTO | filters.VIDEO | filters.AUDIO | filters.Document.ALL, handle_file
     ))
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND & (filters.Entity(MessageEntity.URL) | filters.Entity(MessageEntity.TEXT_LINK)),
+        handle_url
+    ))
     application.add_handler(CallbackQueryHandler(handle_folder_selection))
+    record_startup_stage('сборка приложения')
+    return application
+
 
-    application.run_polling()
+def main() -> None:
+    application = build_application()
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(
+            application, WEBHOOK_URL, WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET_TOKEN or None,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        ))
+    else:
+        application.run_polling()
 
 
 if __name__ == '__main__':
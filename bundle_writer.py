@@ -0,0 +1,58 @@
+import time
+import zipfile
+
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+STORED_TYPES = {'image', 'video', 'audio'}  # Уже сжатые форматы не пережимаются
+
+
+class _StreamSink:
+    # Файловый объект без seek/tell для zipfile: записанные байты забирает корутина
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class ZipBundleWriter:
+    # ZIP-архив собирается по мере скачивания файлов и сразу отдается в BoundedStream,
+    # откуда его читает загрузка в Drive: в памяти только текущие куски, не весь архив.
+    def __init__(self, stream, compresslevel=6):
+        self.stream = stream
+        self.sink = _StreamSink()
+        self.zip = zipfile.ZipFile(self.sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+        self.members = []
+
+    async def _drain(self):
+        if self.sink.buffer:
+            data = bytes(self.sink.buffer)
+            self.sink.buffer.clear()
+            await self.stream.put(data)
+
+    async def add(self, name, read, size=None, file_type=None):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED if file_type in STORED_TYPES else zipfile.ZIP_DEFLATED
+        force_zip64 = size is None or size > zipfile.ZIP64_LIMIT
+        with self.zip.open(info, 'w', force_zip64=force_zip64) as member:
+            while True:
+                chunk = await read(ARCHIVE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                member.write(chunk)
+                await self._drain()
+        await self._drain()
+        self.members.append(name)
+
+    async def add_bytes(self, name, data):
+        with self.zip.open(zipfile.ZipInfo(name, date_time=time.localtime()[:6]), 'w') as member:
+            member.write(data)
+        await self._drain()
+        self.members.append(name)
+
+    async def finish(self):
+        self.zip.close()
+        await self._drain()
@@ -5,6 +5,13 @@ load_dotenv()
 
 API_TOKEN = os.getenv('API_TOKEN')
 GOOGLE_DRIVE_CREDENTIALS_FILE = os.getenv('GOOGLE_DRIVE_CREDENTIALS_FILE')
+# Пул сервисных аккаунтов одного общего диска: ключи через запятую, иначе один GOOGLE_DRIVE_CREDENTIALS_FILE
+GOOGLE_DRIVE_CREDENTIALS_FILES = [
+    path.strip() for path in os.getenv('GOOGLE_DRIVE_CREDENTIALS_FILES', '').split(',') if path.strip()
+] or [GOOGLE_DRIVE_CREDENTIALS_FILE]
+GOOGLE_SHARED_DRIVE_ID = os.getenv('GOOGLE_SHARED_DRIVE_ID', '')
+DRIVE_ACCOUNT_STRATEGY = os.getenv('DRIVE_ACCOUNT_STRATEGY', 'least_loaded')  # least_loaded или round_robin
+DRIVE_ACCOUNT_COOLDOWN_SECONDS = float(os.getenv('DRIVE_ACCOUNT_COOLDOWN_SECONDS', '30'))
 EXCLUDED_FOLDERS = os.getenv('EXCLUDED_FOLDERS').split(',')
 ALLOWED_USERS = list(map(int, os.getenv('ALLOWED_USERS').split(',')))
 ADMIN_USERS = list(map(int, os.getenv('ADMIN_USERS', '').split(',')))
@@ -12,6 +19,88 @@ MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB'))
 USE_ALLOWED_USERS = os.getenv('USE_ALLOWED_USERS', 'False').lower() == 'true'
 STATISTICS_FOLDER = os.getenv('STATISTICS_FOLDER')
 STATISTICS_FILE = os.getenv('STATISTICS_FILE')
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', '4'))
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '3'))
+DRIVE_POOL_SIZE = int(os.getenv('DRIVE_POOL_SIZE', '20'))
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv('TOKEN_REFRESH_MARGIN_SECONDS', '300'))
+FOLDER_INDEX_POLL_SECONDS = int(os.getenv('FOLDER_INDEX_POLL_SECONDS', '30'))
+STREAM_CHUNK_SIZE_KB = int(os.getenv('STREAM_CHUNK_SIZE_KB', '1024'))
+STREAM_BUFFER_CHUNKS = int(os.getenv('STREAM_BUFFER_CHUNKS', '4'))
+MULTIPART_THRESHOLD_KB = int(os.getenv('MULTIPART_THRESHOLD_KB', '5120'))
+RESUMABLE_CHUNK_SIZE_MB = int(os.getenv('RESUMABLE_CHUNK_SIZE_MB', '8'))
+PROGRESS_UPDATE_SECONDS = float(os.getenv('PROGRESS_UPDATE_SECONDS', '2'))
+UPLOAD_JOURNAL_FILE = os.getenv('UPLOAD_JOURNAL_FILE', 'logs/upload_journal.json')
+UPLOAD_QUEUE_FILE = os.getenv('UPLOAD_QUEUE_FILE', 'logs/upload_queue.sqlite3')
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '4'))
+DRIVE_MAX_IN_FLIGHT = int(os.getenv('DRIVE_MAX_IN_FLIGHT', '4'))
+DRIVE_REQUESTS_PER_SECOND = float(os.getenv('DRIVE_REQUESTS_PER_SECOND', '10'))
+DRIVE_MAX_RETRIES = int(os.getenv('DRIVE_MAX_RETRIES', '5'))
+DRIVE_BACKOFF_MAX_SECONDS = float(os.getenv('DRIVE_BACKOFF_MAX_SECONDS', '64'))
+DEDUP_INDEX_FILE = os.getenv('DEDUP_INDEX_FILE', 'logs/dedup_index.sqlite3')
+# Пакеты без выбранной папки; пустой PENDING_BATCHES_FILE - хранить только в памяти
+PENDING_BATCHES_FILE = os.getenv('PENDING_BATCHES_FILE', 'logs/pending_batches.sqlite3')
+PENDING_BATCH_TTL_SECONDS = int(os.getenv('PENDING_BATCH_TTL_SECONDS', '21600'))
+PENDING_BATCHES_MAX = int(os.getenv('PENDING_BATCHES_MAX', '1000'))
+PENDING_BATCHES_PER_USER = int(os.getenv('PENDING_BATCHES_PER_USER', '10'))
+INGEST_DEBOUNCE_SECONDS = float(os.getenv('INGEST_DEBOUNCE_SECONDS', '1.5'))
+INGEST_MAX_WAIT_SECONDS = float(os.getenv('INGEST_MAX_WAIT_SECONDS', '10'))
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', 'https://api.telegram.org/bot')
+TELEGRAM_BASE_FILE_URL = os.getenv('TELEGRAM_BASE_FILE_URL', TELEGRAM_BASE_URL.rsplit('/bot', 1)[0] + '/file/bot')
+# Локальный сервер telegram-bot-api в режиме --local: файлы до 2000 МБ и пути к ним на диске вместо ссылок
+TELEGRAM_LOCAL_MODE = os.getenv('TELEGRAM_LOCAL_MODE', 'False').lower() == 'true'
+TELEGRAM_DOWNLOAD_LIMIT_MB = int(os.getenv('TELEGRAM_DOWNLOAD_LIMIT_MB', '2000' if TELEGRAM_LOCAL_MODE else '50'))
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '1'))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+UPLOAD_USER_WEIGHTS = {
+    int(user_id): int(weight)
+    for user_id, weight in (item.split(':') for item in os.getenv('UPLOAD_USER_WEIGHTS', '').split(',') if item)
+}
+STATISTICS_FLUSH_SECONDS = int(os.getenv('STATISTICS_FLUSH_SECONDS', '30'))
+STATISTICS_FLUSH_ROWS = int(os.getenv('STATISTICS_FLUSH_ROWS', '50'))
+STATISTICS_SPOOL_FILE = os.getenv('STATISTICS_SPOOL_FILE', 'logs/statistics_spool.jsonl')
+# Перекомпрессия перед загрузкой включается по категориям: 'image', 'video'
+MEDIA_TRANSFORM_CATEGORIES = [category.strip() for category in os.getenv('MEDIA_TRANSFORM_CATEGORIES', '').split(',')
+                              if category.strip()]
+MEDIA_TRANSFORM_WORKERS = int(os.getenv('MEDIA_TRANSFORM_WORKERS', '2'))
+MEDIA_TRANSFORM_TEMP_DIR = os.getenv('MEDIA_TRANSFORM_TEMP_DIR', 'logs/transform')
+IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', '2560'))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+VIDEO_TRANSFORM_MODE = os.getenv('VIDEO_TRANSFORM_MODE', 'remux')  # remux или transcode
+VIDEO_CRF = int(os.getenv('VIDEO_CRF', '28'))
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+# Папки, в которые пакеты от BUNDLE_MIN_FILES файлов загружаются одним ZIP-архивом
+BUNDLE_FOLDERS = [folder.strip() for folder in os.getenv('BUNDLE_FOLDERS', '').split(',') if folder.strip()]
+BUNDLE_MIN_FILES = int(os.getenv('BUNDLE_MIN_FILES', '10'))
+# Срок хранения папок по датам в днях для папок назначения: 'Папка:30,Другая:90'; 0 - хранить всегда
+RETENTION_DAYS = {
+    folder.strip(): int(days)
+    for folder, _, days in (item.rpartition(':') for item in os.getenv('RETENTION_DAYS', '').split(',') if item)
+}
+RETENTION_DEFAULT_DAYS = int(os.getenv('RETENTION_DEFAULT_DAYS', '0'))
+RETENTION_MODE = os.getenv('RETENTION_MODE', 'trash')  # trash или delete
+RETENTION_INTERVAL_HOURS = float(os.getenv('RETENTION_INTERVAL_HOURS', '24'))  # 0 - только по команде /retention
+RETENTION_DRY_RUN = os.getenv('RETENTION_DRY_RUN', 'False').lower() == 'true'
+RETENTION_CONCURRENCY = int(os.getenv('RETENTION_CONCURRENCY', '4'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))  # 0 - без эндпоинта /metrics
+# Корни Google API; переопределяются для локальных стендов и бенчмарков
+GOOGLE_API_ROOT = os.getenv('GOOGLE_API_ROOT', 'https://www.googleapis.com')
+SHEETS_API_ROOT = os.getenv('SHEETS_API_ROOT', 'https://sheets.googleapis.com')
+# Загрузка по прямым ссылкам: файл от URL_RANGED_MIN_SIZE_MB скачивается частями по URL_DOWNLOAD_PART_SIZE_MB
+# в URL_DOWNLOAD_CONNECTIONS параллельных Range-запросов
+URL_DOWNLOAD_CONNECTIONS = int(os.getenv('URL_DOWNLOAD_CONNECTIONS', '4'))
+URL_DOWNLOAD_PART_SIZE_MB = int(os.getenv('URL_DOWNLOAD_PART_SIZE_MB', '8'))
+URL_RANGED_MIN_SIZE_MB = int(os.getenv('URL_RANGED_MIN_SIZE_MB', '16'))
+URL_DOWNLOAD_RETRIES = int(os.getenv('URL_DOWNLOAD_RETRIES', '3'))
+URL_PROBE_TIMEOUT_SECONDS = float(os.getenv('URL_PROBE_TIMEOUT_SECONDS', '15'))
+URL_MAX_PER_MESSAGE = int(os.getenv('URL_MAX_PER_MESSAGE', '10'))
+# Ссылки на localhost, частные и link-local адреса запрещены; True - только для локальных стендов
+URL_ALLOW_PRIVATE_ADDRESSES = os.getenv('URL_ALLOW_PRIVATE_ADDRESSES', 'False').lower() == 'true'
 
 ALLOWED_FILE_TYPES = {
     'image': {
@@ -41,15 +130,22 @@ ALLOWED_FILE_TYPES = {
     'video': {
         'mime_types': ['video/mp4', 'video/quicktime', 'video/x-msvideo', 'video/x-matroska'],
         'extensions': ['.mp4', '.mov', '.avi', '.mkv'],
-        'max_size_mb': 50,
+        'max_size_mb': int(os.getenv('VIDEO_MAX_SIZE_MB', '2000' if TELEGRAM_LOCAL_MODE else '50')),
         'description': 'Видео'
     },
     'audio': {
         'mime_types': ['audio/mpeg', 'audio/ogg', 'audio/wav'],
         'extensions': ['.mp3', '.ogg', '.wav'],
-        'max_size_mb': 50,
+        'max_size_mb': int(os.getenv('AUDIO_MAX_SIZE_MB', '2000' if TELEGRAM_LOCAL_MODE else '50')),
         'description': 'Аудио'
     },
+    'archive': {
+        'mime_types': ['application/zip', 'application/x-zip-compressed', 'application/x-7z-compressed',
+                       'application/vnd.rar', 'application/x-rar-compressed'],
+        'extensions': ['.zip', '.7z', '.rar'],
+        'max_size_mb': int(os.getenv('ARCHIVE_MAX_SIZE_MB', '2000' if TELEGRAM_LOCAL_MODE else '50')),
+        'description': 'Архивы'
+    },
     'jwpub': {
         'mime_types': ['application/jwpub', 'application/octet-stream'],
         'extensions': ['.jwpub'],
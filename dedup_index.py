@@ -0,0 +1,54 @@
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class KnownFile:
+    # Источник для файла, содержимое которого уже есть в Drive: передавать байты не нужно
+    def __init__(self, file_id, size, copied):
+        self.file_id = file_id
+        self.size = size
+        self.copied = copied
+
+
+class DedupIndex:
+    # Локальный индекс уже загруженного содержимого: Telegram file_unique_id -> файл в Drive
+    # и его md5Checksum. Одинаковые файлы, пересланные повторно, копируются на стороне Drive
+    # или пропускаются, если такое содержимое уже лежит в папке назначения.
+    def __init__(self, path):
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'file_unique_id TEXT PRIMARY KEY, drive_file_id TEXT NOT NULL, md5 TEXT, size INTEGER, '
+            'updated_at REAL NOT NULL)'
+        )
+
+    def lookup(self, file_unique_id):
+        row = self.db.execute(
+            'SELECT drive_file_id, md5, size FROM files WHERE file_unique_id=?', (file_unique_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {'file_id': row[0], 'md5': row[1], 'size': row[2]}
+
+    def remember(self, file_unique_id, drive_file_id, size=None, md5=None):
+        self.db.execute(
+            'INSERT INTO files (file_unique_id, drive_file_id, md5, size, updated_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(file_unique_id) DO UPDATE SET drive_file_id=excluded.drive_file_id, '
+            'md5=COALESCE(excluded.md5, files.md5), size=COALESCE(excluded.size, files.size), '
+            'updated_at=excluded.updated_at',
+            (file_unique_id, drive_file_id, md5, size, time.time())
+        )
+
+    def forget(self, file_unique_id):
+        self.db.execute('DELETE FROM files WHERE file_unique_id=?', (file_unique_id,))
+
+    def close(self):
+        self.db.close()
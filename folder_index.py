@@ -0,0 +1,169 @@
+import asyncio
+import logging
+
+from async_gdrive_service import FOLDER_MIME_TYPE
+
+logger = logging.getLogger(__name__)
+
+
+class FolderIndex:
+    # Дерево папок Upload в памяти: Upload -> папки назначения -> папки по датам.
+    # Заполняется один раз и дальше обновляется по ленте изменений Drive.
+    def __init__(self, drive_service, root_name='Upload', poll_interval=30, max_depth=2):
+        self.drive_service = drive_service
+        self.root_name = root_name
+        self.poll_interval = poll_interval
+        self.max_depth = max_depth
+        self.root_id = None
+        self.folders = {}  # id -> {'name', 'parent', 'depth'}
+        self.children = {}  # parent_id -> {name: id}
+        self._page_token = None
+        self._poll_task = None
+        self._seed_lock = asyncio.Lock()
+        self._create_locks = {}
+
+    async def start(self):
+        # Индекс заполняется в фоне, бот начинает принимать обновления сразу;
+        # выбор папки до окончания заполнения ждет его в ensure_seeded
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def close(self):
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    async def ensure_seeded(self):
+        if self.root_id:
+            return self.root_id
+        async with self._seed_lock:
+            if not self.root_id:
+                await self.seed()
+        return self.root_id
+
+    async def seed(self):
+        # Токен берется до обхода дерева, чтобы не пропустить изменения во время заполнения
+        page_token = await self.drive_service.get_start_page_token()
+        root_id = await self.drive_service.find_folder_id_by_name(self.root_name)
+        self.folders = {}
+        self.children = {}
+        if not root_id:
+            logger.error(f'Папка "{self.root_name}" не найдена в Google Drive')
+            self.root_id = None
+            return
+
+        self.folders[root_id] = {'name': self.root_name, 'parent': None, 'depth': 0}
+        level = [root_id]
+        for _ in range(self.max_depth):
+            if not level:
+                break
+            level_ids = set(level)
+            level = []
+            for folder in await self.drive_service.get_child_folders(level_ids):
+                parent_id = next((parent for parent in folder.get('parents', []) if parent in level_ids), None)
+                if parent_id:
+                    self._add(folder['id'], folder['name'], parent_id)
+                    level.append(folder['id'])
+
+        self.root_id = root_id
+        self._page_token = page_token
+        logger.info(f"Индекс папок заполнен: {len(self.folders)} папок")
+
+    def _add(self, folder_id, name, parent_id):
+        self._remove(folder_id, recursive=False)
+        depth = self.folders[parent_id]['depth'] + 1
+        self.folders[folder_id] = {'name': name, 'parent': parent_id, 'depth': depth}
+        self.children.setdefault(parent_id, {})[name] = folder_id
+
+    def _remove(self, folder_id, recursive=True):
+        folder = self.folders.pop(folder_id, None)
+        if not folder:
+            return
+        siblings = self.children.get(folder['parent'], {})
+        if siblings.get(folder['name']) == folder_id:
+            del siblings[folder['name']]
+        if recursive:
+            for child_id in list(self.children.pop(folder_id, {}).values()):
+                self._remove(child_id)
+
+    def get_folders(self, parent_id=None):
+        return dict(self.children.get(parent_id or self.root_id, {}))
+
+    def get_child_id(self, parent_id, name):
+        return self.children.get(parent_id, {}).get(name)
+
+    def get_folder_name(self, folder_id, parent_id=None):
+        folder = self.folders.get(folder_id)
+        if not folder or folder['parent'] != (parent_id or self.root_id):
+            return None
+        return folder['name']
+
+    async def get_or_create_folder(self, parent_id, name):
+        folder_id = self.get_child_id(parent_id, name)
+        if folder_id:
+            return folder_id
+
+        # Single-flight: параллельные загрузки ждут одно создание папки, а не создают дубликаты
+        key = (parent_id, name)
+        lock = self._create_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            try:
+                folder_id = self.get_child_id(parent_id, name)
+                if folder_id:
+                    return folder_id
+                folder_id = await self.drive_service.find_folder_id_by_name(name, parent_id)
+                if folder_id is None:
+                    folder_id = await self.drive_service.create_folder(parent_id, name)
+                    logger.info(f"Создана папка {name}")
+                if parent_id in self.folders and self.folders[parent_id]['depth'] < self.max_depth:
+                    self._add(folder_id, name, parent_id)
+                return folder_id
+            finally:
+                # Ожидающие уже держат ссылку на замок, новые запросы найдут папку в индексе или в Drive
+                if self._create_locks.get(key) is lock:
+                    del self._create_locks[key]
+
+    async def refresh(self):
+        if not self.root_id:
+            await self.ensure_seeded()
+            return
+
+        changes, self._page_token = await self.drive_service.list_changes(self._page_token)
+        for change in changes:
+            self._apply_change(change)
+            if not self.root_id:
+                # Папка Upload удалена или перемещена: индекс строится заново
+                await self.ensure_seeded()
+                return
+
+    def _apply_change(self, change):
+        folder_id = change.get('fileId')
+        file = change.get('file') or {}
+        if change.get('removed') or file.get('trashed') or file.get('mimeType') != FOLDER_MIME_TYPE:
+            if folder_id == self.root_id:
+                self.root_id = None
+            self._remove(folder_id)
+            return
+
+        if folder_id == self.root_id:
+            if file.get('name') != self.root_name:
+                self.root_id = None
+            return
+
+        parent_id = next((parent for parent in file.get('parents', []) if parent in self.folders), None)
+        if parent_id and self.folders[parent_id]['depth'] < self.max_depth:
+            self._add(folder_id, file['name'], parent_id)
+        else:
+            self._remove(folder_id)
+
+    async def _poll_loop(self):
+        try:
+            await self.ensure_seeded()
+        except Exception as e:
+            logger.error(f"Не удалось заполнить индекс папок, повтор при первом запросе: {e}")
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении индекса папок: {e}")
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IngestBatcher:
+    # Собирает сообщения одной отправки в пакет: альбом приходит отдельными обновлениями с общим
+    # media_group_id, пакет отдается в on_flush, когда за delay секунд не пришло новых частей
+    # (но не позже max_wait от первой). Одиночное сообщение - это отдельный пакет без ожидания.
+    def __init__(self, on_flush, delay=1.5, max_wait=10.0):
+        self.on_flush = on_flush
+        self.delay = delay
+        self.max_wait = max_wait
+        self._groups = {}
+        self._tasks = set()
+
+    @staticmethod
+    def group_key(message):
+        group_id = message.media_group_id or f'message-{message.message_id}'
+        return message.chat_id, message.from_user.id, group_id
+
+    def add(self, message, context):
+        key = self.group_key(message)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = {'messages': [], 'context': context, 'started_at': time.monotonic(),
+                                         'timer': None}
+        group['messages'].append(message)
+
+        if group['timer']:
+            group['timer'].cancel()
+        if message.media_group_id:
+            delay = min(self.delay, max(0.0, group['started_at'] + self.max_wait - time.monotonic()))
+        else:
+            delay = 0
+        group['timer'] = self._spawn(self._flush_later(key, delay))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self, key, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        group = self._groups.pop(key, None)
+        if group is not None:
+            await self._flush(group)
+
+    async def _flush(self, group):
+        messages = sorted(group['messages'], key=lambda message: message.message_id)
+        try:
+            await self.on_flush(messages, group['context'])
+        except Exception as e:
+            logger.error(f"Ошибка при обработке пакета из {len(messages)} сообщений: {e}")
+
+    def pending(self):
+        return len(self._groups)
+
+    async def close(self):
+        # При остановке бот уже не может отправить выбор папки: недособранные пакеты отбрасываются
+        if self._groups:
+            logger.warning(f"Отброшено недособранных пакетов: {len(self._groups)}")
+        self._groups.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не обязателен: без него изображения загружаются как есть
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv'}
+
+
+def _child_cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def recompress_image(source_path, target_path, max_side, quality):
+    # Выполняется в отдельном процессе
+    started = time.process_time()
+    image_format = IMAGE_FORMATS[os.path.splitext(target_path)[1].lower()]
+    with Image.open(source_path) as image:
+        exif = image.getexif()
+        image = ImageOps.exif_transpose(image)
+        exif[0x0112] = 1  # Ориентация уже применена к пикселям
+        image.thumbnail((max_side, max_side))
+        if image_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(target_path, 'JPEG', quality=quality, optimize=True, progressive=True, exif=exif.tobytes())
+        else:
+            image.save(target_path, 'PNG', optimize=True)
+    return time.process_time() - started
+
+
+def recompress_video(source_path, target_path, ffmpeg, mode, crf):
+    # Выполняется в отдельном процессе; время CPU считается по завершившемуся ffmpeg
+    started = _child_cpu_time()
+    command = [ffmpeg, '-nostdin', '-loglevel', 'error', '-y', '-i', source_path]
+    if mode == 'transcode':
+        command += ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(crf), '-c:a', 'aac', '-b:a', '128k']
+    else:
+        command += ['-c', 'copy']
+    command += ['-map_metadata', '0', '-movflags', '+faststart', target_path]
+    subprocess.run(command, check=True, capture_output=True)
+    return _child_cpu_time() - started
+
+
+class MediaTransformer:
+    # Необязательная перекомпрессия перед загрузкой в Drive. CPU-тяжелая работа идет
+    # в ProcessPoolExecutor, цикл событий только ждет результат. Если результат
+    # получился не меньше исходника, загружается исходный файл.
+    def __init__(self, categories, workers=2, temp_dir=None, image_max_side=2560, image_quality=85,
+                 video_mode='remux', video_crf=28, ffmpeg='ffmpeg'):
+        self.categories = set(categories)
+        self.workers = max(1, workers)
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+        self.image_max_side = image_max_side
+        self.image_quality = image_quality
+        self.video_mode = video_mode
+        self.video_crf = video_crf
+        self.ffmpeg = shutil.which(ffmpeg) if ffmpeg else None
+        self.bytes_saved = 0
+        self._executor = None
+
+        if 'image' in self.categories and Image is None:
+            logger.warning("Pillow не установлен, перекомпрессия изображений отключена")
+            self.categories.discard('image')
+        if 'video' in self.categories and not self.ffmpeg:
+            logger.warning(f"ffmpeg ({ffmpeg}) не найден, обработка видео отключена")
+            self.categories.discard('video')
+
+    def enabled_for(self, item):
+        if item.get('type') not in self.categories:
+            return False
+        extension = os.path.splitext(item['file_name'])[1].lower()
+        if item['type'] == 'image':
+            return extension in IMAGE_FORMATS
+        return extension in VIDEO_EXTENSIONS
+
+    def make_temp_path(self, file_name):
+        os.makedirs(self.temp_dir, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(suffix=os.path.splitext(file_name)[1].lower(), dir=self.temp_dir)
+        os.close(descriptor)
+        return path
+
+    async def transform(self, source_path, item):
+        # Возвращает путь к новому файлу во временной папке или None, если загружать нужно исходник
+        target_path = self.make_temp_path(item['file_name'])
+        if item['type'] == 'image':
+            function, args = recompress_image, (self.image_max_side, self.image_quality)
+        else:
+            function, args = recompress_video, (self.ffmpeg, self.video_mode, self.video_crf)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        started = time.monotonic()
+        try:
+            cpu_time = await asyncio.get_running_loop().run_in_executor(
+                self._executor, function, source_path, target_path, *args
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось обработать {item['file_name']}, загружаю исходный файл: {e}")
+            os.remove(target_path)
+            return None
+
+        source_size = os.path.getsize(source_path)
+        target_size = os.path.getsize(target_path)
+        if target_size >= source_size:
+            logger.info(f"{item['file_name']}: обработка не уменьшила файл ({source_size} -> {target_size} байт)")
+            os.remove(target_path)
+            return None
+
+        self.bytes_saved += source_size - target_size
+        logger.info(
+            f"{item['file_name']}: {source_size} -> {target_size} байт, сэкономлено {source_size - target_size} байт "
+            f"({(1 - target_size / source_size) * 100:.0f}%), CPU {cpu_time:.2f} с, "
+            f"всего {time.monotonic() - started:.2f} с"
+        )
+        return target_path
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
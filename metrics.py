@@ -0,0 +1,199 @@
+import functools
+import logging
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Метрики в текстовом формате Prometheus без внешних зависимостей
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+THROUGHPUT_BUCKETS = tuple(2 ** power * 1024 for power in range(4, 17))  # 16 КБ/с .. 64 МБ/с
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, function=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        # Значение считывается в момент запроса /metrics
+        self.function = function
+
+    def _samples(self):
+        if self.function:
+            yield f'{self.name} {_format_value(self.function())}'
+        else:
+            yield from super()._samples()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        series['buckets'][bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def _samples(self):
+        for key, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['buckets']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(series["sum"])}'
+            yield f'{self.name}_count{labels} {series["count"]}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+telegram_download_seconds = Histogram(
+    'telegram_download_seconds', 'Время скачивания файла из Telegram', ['file_type'])
+url_download_seconds = Histogram(
+    'url_download_seconds', 'Время скачивания файла по прямой ссылке', ['file_type'])
+drive_upload_seconds = Histogram(
+    'drive_upload_seconds', 'Время загрузки файла в Drive', ['file_type'])
+drive_upload_throughput = Histogram(
+    'drive_upload_bytes_per_second', 'Скорость загрузки файла в Drive', ['file_type'], buckets=THROUGHPUT_BUCKETS)
+drive_upload_bytes = Counter(
+    'drive_upload_bytes_total', 'Байт загружено в Drive', ['file_type'])
+drive_calls = Counter(
+    'drive_api_calls_total', 'Вызовы методов клиента Drive/Sheets', ['method'])
+drive_call_seconds = Histogram(
+    'drive_api_call_seconds', 'Длительность вызовов методов клиента Drive/Sheets', ['method'])
+drive_errors = Counter(
+    'drive_api_errors_total', 'Ошибки HTTP-запросов к Drive/Sheets по статусу', ['status'])
+drive_account_requests = Counter(
+    'drive_account_requests_total', 'Запросы к Drive/Sheets по сервисным аккаунтам', ['account'])
+drive_account_throttles = Counter(
+    'drive_account_throttles_total', 'Ограничения скорости и квот по сервисным аккаунтам', ['account'])
+drive_account_upload_bytes = Counter(
+    'drive_account_upload_bytes_total', 'Байт отправлено в Drive по сервисным аккаунтам', ['account'])
+batch_files = Histogram(
+    'upload_batch_files', 'Число файлов и комментариев в пакете', buckets=BATCH_SIZE_BUCKETS)
+uploads_in_flight = Gauge('drive_uploads_in_flight', 'Загрузки в Drive, выполняющиеся сейчас')
+upload_queue_pending = Gauge('upload_queue_pending', 'Пакеты, ожидающие в очереди загрузок')
+upload_workers_busy = Gauge('upload_workers_busy', 'Занятые воркеры очереди загрузок')
+pending_batches = Gauge('pending_batches', 'Пакеты, ожидающие выбора папки')
+pending_batch_bytes = Gauge('pending_batch_bytes', 'Размер пакетов, ожидающих выбора папки, в сериализованном виде')
+
+
+def track_drive_call(method):
+    # Число и длительность вызовов метода клиента, включая повторы внутри _request
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            drive_calls.inc(method=method.__name__)
+            drive_call_seconds.observe(time.monotonic() - started, method=method.__name__)
+
+    return wrapper
+
+
+class MetricsServer:
+    def __init__(self, host='127.0.0.1', port=9100, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner = None
+
+    async def handle_metrics(self, request):
+        return web.Response(body=self.registry.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+
+def format_bytes(size):
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} МБ"
+    return f"{size / 1024:.0f} КБ"
+
+
+def create_progress_bar(current, total, width=20):
+    progress = int(width * current / total) if total else width
+    return f"[{'■' * progress}{'□' * (width - progress)}]"
+
+
+class ProgressReporter:
+    # Счетчики байтов обновляются синхронно и ничего не ждут; сообщение редактируется
+    # фоновой задачей не чаще одного раза в interval секунд на чат, промежуточные
+    # состояния не накапливаются - отправляется только последнее. Ошибки Telegram только
+    # логируются: прогресс не должен срывать загрузку, которая уже идет или закончилась.
+    _next_edit_at = {}  # chat_id -> время, раньше которого чат не редактируется; прошедшие записи удаляются
+
+    def __init__(self, bot, chat_id, message_id, sizes, interval=2.0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.sizes = dict(sizes)
+        self.total_bytes = sum(self.sizes.values())
+        self.interval = interval
+        self.downloaded = {}
+        self.uploaded = {}
+        self.files_done = 0
+        self.current_name = None
+        self._last_text = None
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.warning(f"Задача обновления прогресса завершилась с ошибкой: {e}")
+            self._task = None
+
+    @classmethod
+    def _hold_chat(cls, chat_id, seconds):
+        now = time.monotonic()
+        for other_chat_id, until in list(cls._next_edit_at.items()):
+            if until <= now:
+                del cls._next_edit_at[other_chat_id]
+        cls._next_edit_at[chat_id] = now + seconds
+
+    def add_downloaded(self, key, size):
+        self.downloaded[key] = self.downloaded.get(key, 0) + size
+        self._changed.set()
+
+    def set_uploaded(self, key, offset, name=None):
+        self.uploaded[key] = offset
+        if name:
+            self.current_name = name
+        self._changed.set()
+
+    def file_done(self, key, name, ok):
+        self.files_done += 1
+        self.current_name = name
+        if ok:
+            self.uploaded[key] = self.sizes.get(key, 0)
+            self.downloaded[key] = max(self.downloaded.get(key, 0), self.sizes.get(key, 0))
+        self._changed.set()
+
+    def render(self):
+        uploaded = min(sum(self.uploaded.values()), self.total_bytes)
+        downloaded = min(sum(self.downloaded.values()), self.total_bytes)
+        percentage = (uploaded / self.total_bytes * 100) if self.total_bytes else 100.0
+        text = 'Загружаю файлы...\n'
+        if self.current_name:
+            text += f'Файл: {self.current_name}\n'
+        text += (
+            f'{create_progress_bar(uploaded, self.total_bytes)} {percentage:.1f}%\n'
+            f'Скачано из Telegram: {format_bytes(downloaded)} из {format_bytes(self.total_bytes)}\n'
+            f'Загружено в Drive: {format_bytes(uploaded)}\n'
+            f'Прогресс: {self.files_done}/{len(self.sizes)}'
+        )
+        return text
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            delay = self._next_edit_at.get(self.chat_id, 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._changed.clear()
+
+            text = self.render()
+            if text == self._last_text:
+                continue
+            self._hold_chat(self.chat_id, self.interval)
+            try:
+                await self.bot.edit_message_text(text=text, chat_id=self.chat_id, message_id=self.message_id)
+                self._last_text = text
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') \
+                    else e.retry_after
+                self._hold_chat(self.chat_id, retry_after)
+                self._changed.set()
+            except TelegramError as e:
+                # BadRequest (сообщение не изменилось или удалено), TimedOut, NetworkError
+                logger.warning(f"Не удалось обновить прогресс: {e}")
@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+import logging
+
+from async_gdrive_service import BATCH_MAX_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+DATE_FOLDER_FORMAT = '%d-%m-%Y'
+
+
+class RetentionSweeper:
+    # Удаляет папки по датам (dd-mm-YYYY) внутри папок назначения Upload, которые старше срока
+    # хранения своей папки назначения. Дерево каждый раз обходится через API с полной пагинацией,
+    # папки удаляются или переносятся в корзину пакетными запросами, несколько пакетов параллельно.
+    def __init__(self, drive_service, folder_index, policies, default_days=0, mode='trash', concurrency=4,
+                 excluded=()):
+        self.drive_service = drive_service
+        self.folder_index = folder_index
+        self.policies = dict(policies)
+        self.default_days = default_days
+        self.mode = mode
+        self.concurrency = max(1, concurrency)
+        self.excluded = set(excluded)
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def enabled(self):
+        return self.default_days > 0 or any(days > 0 for days in self.policies.values())
+
+    def retention_days(self, folder_name):
+        return self.policies.get(folder_name, self.default_days)
+
+    async def plan(self, today):
+        # Папки по датам старше срока хранения, с числом и объемом файлов в них
+        root_id = await self.folder_index.ensure_seeded()
+        if not root_id:
+            return []
+
+        targets = {
+            folder['id']: folder['name'] for folder in await self.drive_service.get_child_folders([root_id])
+            if folder['name'] not in self.excluded and self.retention_days(folder['name']) > 0
+        }
+        expired = {}
+        for folder in await self.drive_service.get_child_folders(targets):
+            parent_id = next((parent for parent in folder.get('parents', []) if parent in targets), None)
+            try:
+                folder_date = datetime.datetime.strptime(folder['name'], DATE_FOLDER_FORMAT).date()
+            except ValueError:
+                continue
+            age_days = (today - folder_date).days
+            if parent_id and age_days > self.retention_days(targets[parent_id]):
+                expired[folder['id']] = {'id': folder['id'], 'name': folder['name'], 'target': targets[parent_id],
+                                         'age_days': age_days, 'files': 0, 'bytes': 0}
+
+        for item in await self.drive_service.list_children(expired, fields='files(id, size, parents)'):
+            folder = next((expired[parent] for parent in item.get('parents', []) if parent in expired), None)
+            if folder:
+                folder['files'] += 1
+                folder['bytes'] += int(item.get('size', 0))
+        return sorted(expired.values(), key=lambda folder: (folder['target'], -folder['age_days']))
+
+    async def sweep(self, today, dry_run=False):
+        async with self._lock:
+            folders = await self.plan(today)
+            result = {'folders': folders, 'dry_run': dry_run, 'mode': self.mode, 'failed_batches': 0}
+            if dry_run or not folders:
+                return result
+
+            remove = self.drive_service.trash_files if self.mode == 'trash' else self.drive_service.delete_files
+            folder_ids = [folder['id'] for folder in folders]
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def remove_chunk(chunk):
+                async with semaphore:
+                    return await remove(chunk)
+
+            outcomes = await asyncio.gather(*(
+                remove_chunk(folder_ids[start:start + BATCH_MAX_REQUESTS])
+                for start in range(0, len(folder_ids), BATCH_MAX_REQUESTS)
+            ), return_exceptions=True)
+            for outcome in outcomes:
+                if outcome is not True:
+                    result['failed_batches'] += 1
+                    if isinstance(outcome, Exception):
+                        logger.error(f"Ошибка при очистке старых папок: {outcome}")
+
+            logger.info(f"Очистка по сроку хранения: {len(folders)} папок, "
+                        f"{sum(folder['files'] for folder in folders)} файлов, режим {self.mode}, "
+                        f"пакетов с ошибками: {result['failed_batches']}")
+            return result
+
+    def start(self, run, interval, first=300):
+        # Запасной планировщик, если JobQueue недоступен (не установлен python-telegram-bot[job-queue])
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_loop(run, interval, first))
+
+    async def _run_loop(self, run, interval, first):
+        await asyncio.sleep(first)
+        while True:
+            try:
+                await run()
+            except Exception as e:
+                logger.error(f"Ошибка при очистке по сроку хранения: {e}")
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+def format_retention_report(result):
+    folders = result['folders']
+    action = 'в корзину' if result['mode'] == 'trash' else 'удаление'
+    if result['dry_run']:
+        header = f'Очистка по сроку хранения (проверка, {action}):'
+    else:
+        header = f'Очистка по сроку хранения выполнена ({action}):'
+    if not folders:
+        return f'{header}\nПапок старше срока хранения нет.'
+
+    lines = [header]
+    targets = {}
+    for folder in folders:
+        targets.setdefault(folder['target'], []).append(folder)
+    for target, target_folders in targets.items():
+        files = sum(folder['files'] for folder in target_folders)
+        size_mb = sum(folder['bytes'] for folder in target_folders) / (1024 * 1024)
+        names = ', '.join(folder['name'] for folder in target_folders[:10])
+        if len(target_folders) > 10:
+            names += f' и еще {len(target_folders) - 10}'
+        lines.append(f'• {target}: {len(target_folders)} папок, {files} файлов, {size_mb:.1f} МБ ({names})')
+    if result['failed_batches']:
+        lines.append(f'Пакетов с ошибками: {result["failed_batches"]}, подробности в логе.')
+    return '\n'.join(lines)
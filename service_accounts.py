@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+import itertools
+import logging
+import os
+import time
+
+from metrics import drive_account_requests, drive_account_throttles, drive_account_upload_bytes
+
+logger = logging.getLogger(__name__)
+
+DAILY_UPLOAD_LIMIT = 750 * 1024 ** 3  # Суточный лимит загрузки одного аккаунта в Drive
+DAILY_LIMIT_REASONS = {'uploadLimitExceeded', 'dailyLimitExceeded', 'quotaExceeded'}
+DAILY_LIMIT_COOLDOWN = 3600
+
+
+class ServiceAccount:
+    # Ключ сервисного аккаунта, его токен и счетчики нагрузки. Ключ загружается и токен
+    # обновляется в отдельном потоке: импорт google-auth не задерживает запуск бота.
+    def __init__(self, credentials_file, scopes):
+        if not os.path.isfile(credentials_file):
+            raise FileNotFoundError(f"Файл ключа сервисного аккаунта не найден: {credentials_file}")
+        self.credentials_file = credentials_file
+        self.name = os.path.splitext(os.path.basename(credentials_file))[0]
+        self.scopes = scopes
+        self.creds = None
+        self.rate_limiter = None
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.uploaded_today = 0
+        self.day = datetime.datetime.utcnow().date()
+        self.cooldown = 0.0
+        self.cooldown_until = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def token(self):
+        return self.creds.token if self.creds else None
+
+    def token_expires_in(self):
+        if not self.creds or not self.creds.token or not self.creds.expiry:
+            return 0
+        # google-auth хранит expiry как naive UTC
+        return (self.creds.expiry - datetime.datetime.utcnow()).total_seconds()
+
+    def _refresh_credentials(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2 import service_account
+
+        if self.creds is None:
+            self.creds = service_account.Credentials.from_service_account_file(self.credentials_file,
+                                                                               scopes=self.scopes)
+        self.creds.refresh(Request())
+
+    async def refresh_token(self, min_ttl):
+        async with self._refresh_lock:
+            if self.token_expires_in() > min_ttl:
+                return
+            await asyncio.to_thread(self._refresh_credentials)
+            logger.info(f"Токен доступа {self.name} обновлен, действует до {self.creds.expiry}")
+
+    async def invalidate_token(self, token):
+        # Несколько запросов с одним и тем же отклоненным токеном вызывают только одно обновление
+        async with self._refresh_lock:
+            if self.token == token:
+                await asyncio.to_thread(self._refresh_credentials)
+                logger.info(f"Токен доступа {self.name} отклонен сервером и обновлен")
+
+    async def ensure_token(self):
+        if self.token_expires_in() <= 60:
+            await self.refresh_token(60)
+
+    def record_upload(self, size):
+        today = datetime.datetime.utcnow().date()
+        if today != self.day:
+            self.day = today
+            self.uploaded_today = 0
+        self.uploaded_today += size
+        drive_account_upload_bytes.inc(size, account=self.name)
+
+
+class ServiceAccountPool:
+    # Несколько сервисных аккаунтов с доступом к одному общему диску: у каждого свои квоты
+    # запросов и суточный лимит загрузки. Запрос уходит через наименее загруженный аккаунт
+    # (least_loaded) или по кругу (round_robin); аккаунт, который Drive ограничивает,
+    # отдыхает cooldown секунд (с удвоением при повторных ограничениях).
+    def __init__(self, credentials_files, scopes, strategy='least_loaded', cooldown=30.0, max_cooldown=900.0,
+                 daily_upload_limit=DAILY_UPLOAD_LIMIT):
+        self.accounts = [ServiceAccount(credentials_file, scopes) for credentials_file in credentials_files]
+        if not self.accounts:
+            raise ValueError("Не задан ни один ключ сервисного аккаунта")
+        self.by_name = {account.name: account for account in self.accounts}
+        self.strategy = strategy
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.daily_upload_limit = daily_upload_limit
+        self._round_robin = itertools.count()
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def available(self):
+        now = time.monotonic()
+        return [account for account in self.accounts
+                if account.cooldown_until <= now and account.uploaded_today < self.daily_upload_limit]
+
+    def select(self):
+        candidates = self.available()
+        if not candidates:
+            # Все аккаунты отдыхают: берется тот, чей перерыв закончится раньше
+            return min(self.accounts, key=lambda account: account.cooldown_until)
+        if self.strategy == 'round_robin':
+            return candidates[next(self._round_robin) % len(candidates)]
+        return min(candidates, key=lambda account: (account.in_flight, account.uploaded_today))
+
+    def on_request(self, account):
+        account.requests += 1
+        drive_account_requests.inc(account=account.name)
+
+    def on_throttle(self, account, error):
+        account.throttled += 1
+        drive_account_throttles.inc(account=account.name)
+        if error.reason in DAILY_LIMIT_REASONS:
+            cooldown = DAILY_LIMIT_COOLDOWN
+        else:
+            account.cooldown = min(self.max_cooldown, account.cooldown * 2 or self.base_cooldown)
+            cooldown = max(account.cooldown, error.retry_after or 0)
+        account.cooldown_until = time.monotonic() + cooldown
+        if len(self.accounts) > 1:
+            logger.warning(f"Аккаунт {account.name} ограничен Drive ({error.reason or error.status}), "
+                           f"перерыв {cooldown:.0f} с, доступно аккаунтов: {len(self.available())}")
+
+    def on_success(self, account):
+        account.cooldown = 0.0
+
+    def stats(self):
+        now = time.monotonic()
+        return [{
+            'name': account.name,
+            'in_flight': account.in_flight,
+            'requests': account.requests,
+            'throttled': account.throttled,
+            'uploaded_today': account.uploaded_today,
+            'cooldown_left': max(0.0, account.cooldown_until - now)
+        } for account in self.accounts]
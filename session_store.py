@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PendingBatch:
+    # Пакет файлов, для которого пользователь еще не выбрал папку. Индексы по file_unique_id,
+    # имени файла и отклоненным файлам дают проверку дубликатов за O(1) вместо перебора списков.
+    __slots__ = ('token', 'user_id', 'chat_id', 'files', 'comments', 'unsupported_files', 'touched_at', 'size',
+                 'file_ids', 'file_names', '_unsupported_keys')
+
+    def __init__(self, token, user_id, chat_id, touched_at=None):
+        self.token = token
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.files = []
+        self.comments = []
+        self.unsupported_files = []
+        self.touched_at = touched_at or time.time()
+        self.size = 0  # Размер сериализованного пакета в байтах, для счетчиков памяти
+        self.file_ids = set()
+        self.file_names = set()
+        self._unsupported_keys = set()
+
+    def add_file(self, item):
+        if item['file_unique_id'] in self.file_ids:
+            return False
+        self.files.append(item)
+        self.file_ids.add(item['file_unique_id'])
+        self.file_names.add(item['file_name'])
+        return True
+
+    def add_unsupported(self, entry):
+        key = (entry['name'], entry['reason'])
+        if key in self._unsupported_keys:
+            return False
+        self.unsupported_files.append(entry)
+        self._unsupported_keys.add(key)
+        return True
+
+    def add_comment(self, content, telegram_timestamp):
+        self.comments.append({
+            'filename': f'comment_{len(self.comments) + 1}.txt',
+            'content': content,
+            'telegram_timestamp': telegram_timestamp
+        })
+
+    def to_dict(self):
+        return {'user_id': self.user_id, 'chat_id': self.chat_id, 'files': self.files, 'comments': self.comments,
+                'unsupported_files': self.unsupported_files}
+
+    @classmethod
+    def from_dict(cls, token, data, touched_at):
+        batch = cls(token, data['user_id'], data['chat_id'], touched_at)
+        for item in data['files']:
+            batch.add_file(item)
+        for entry in data['unsupported_files']:
+            batch.add_unsupported(entry)
+        batch.comments = data['comments']
+        return batch
+
+
+class PendingBatchStore:
+    # Пакеты без выбранной папки: общий LRU по времени последнего обращения, лимит на пользователя,
+    # вытеснение по простою (ttl) и по общему числу пакетов. Если задан path, пакеты хранятся
+    # в SQLite и переживают перезапуск бота: кнопки выбора папки продолжают работать.
+    def __init__(self, path=None, ttl=21600, max_batches=1000, max_per_user=10):
+        self.ttl = ttl
+        self.max_batches = max_batches
+        self.max_per_user = max_per_user
+        self.batches = OrderedDict()  # token -> PendingBatch, от давно не использованных к недавним
+        self.by_user = {}  # user_id -> OrderedDict(token -> None)
+        self._counted = {}  # token -> (файлов, байт), учтенные в счетчиках при добавлении
+        self.total_files = 0
+        self.total_size = 0
+        self.evicted = {'ttl': 0, 'size': 0, 'user_limit': 0}
+        self.db = None
+        if path:
+            store_dir = os.path.dirname(path)
+            if store_dir:
+                os.makedirs(store_dir, exist_ok=True)
+            self.db = sqlite3.connect(path, isolation_level=None)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS pending_batches ('
+                'token TEXT PRIMARY KEY, user_id INTEGER NOT NULL, data TEXT NOT NULL, touched_at REAL NOT NULL)'
+            )
+            self._load()
+
+    def _load(self):
+        self.db.execute('DELETE FROM pending_batches WHERE touched_at < ?', (time.time() - self.ttl,))
+        rows = self.db.execute('SELECT token, data, touched_at FROM pending_batches ORDER BY touched_at').fetchall()
+        for token, data, touched_at in rows:
+            try:
+                batch = PendingBatch.from_dict(token, json.loads(data), touched_at)
+            except (ValueError, KeyError) as e:
+                logger.error(f"Не удалось восстановить пакет {token}: {e}")
+                self.db.execute('DELETE FROM pending_batches WHERE token=?', (token,))
+                continue
+            batch.size = len(data.encode('utf-8'))
+            self._index(batch)
+        if rows:
+            logger.info(f"Восстановлено пакетов без выбранной папки: {len(self.batches)}")
+
+    def _index(self, batch):
+        self.batches[batch.token] = batch
+        self.by_user.setdefault(batch.user_id, OrderedDict())[batch.token] = None
+        self._counted[batch.token] = (len(batch.files), batch.size)
+        self.total_files += len(batch.files)
+        self.total_size += batch.size
+
+    def _unindex(self, token):
+        batch = self.batches.pop(token, None)
+        if batch is None:
+            return None
+        user_batches = self.by_user.get(batch.user_id)
+        if user_batches is not None:
+            user_batches.pop(token, None)
+            if not user_batches:
+                del self.by_user[batch.user_id]
+        files, size = self._counted.pop(token)
+        self.total_files -= files
+        self.total_size -= size
+        if self.db:
+            self.db.execute('DELETE FROM pending_batches WHERE token=?', (token,))
+        return batch
+
+    def _evict(self, token, reason):
+        if self._unindex(token):
+            self.evicted[reason] += 1
+
+    def evict_expired(self):
+        # Пакеты упорядочены по времени обращения, поэтому просроченные всегда в начале
+        deadline = time.time() - self.ttl
+        while self.batches:
+            token, batch = next(iter(self.batches.items()))
+            if batch.touched_at >= deadline:
+                break
+            self._evict(token, 'ttl')
+
+    def new_batch(self, user_id, chat_id):
+        return PendingBatch(uuid.uuid4().hex[:8], user_id, chat_id)
+
+    def add(self, batch):
+        self.evict_expired()
+        # Повторное добавление того же пакета заменяет запись, а не учитывает его файлы второй раз
+        if batch.token in self.batches:
+            self._unindex(batch.token)
+        data = json.dumps(batch.to_dict(), ensure_ascii=False)
+        batch.size = len(data.encode('utf-8'))
+        batch.touched_at = time.time()
+        self._index(batch)
+        if self.db:
+            self.db.execute('INSERT OR REPLACE INTO pending_batches (token, user_id, data, touched_at) '
+                            'VALUES (?, ?, ?, ?)', (batch.token, batch.user_id, data, batch.touched_at))
+
+        user_batches = self.by_user[batch.user_id]
+        while len(user_batches) > self.max_per_user:
+            self._evict(next(iter(user_batches)), 'user_limit')
+        while len(self.batches) > self.max_batches:
+            self._evict(next(iter(self.batches)), 'size')
+
+    def get(self, token, user_id):
+        self.evict_expired()
+        batch = self.batches.get(token)
+        if batch is None or batch.user_id != user_id:
+            return None
+        batch.touched_at = time.time()
+        self.batches.move_to_end(token)
+        if self.db:
+            self.db.execute('UPDATE pending_batches SET touched_at=? WHERE token=?', (batch.touched_at, token))
+        return batch
+
+    def pop(self, token, user_id):
+        self.evict_expired()
+        batch = self.batches.get(token)
+        if batch is None or batch.user_id != user_id:
+            return None
+        return self._unindex(token)
+
+    def stats(self):
+        return {'batches': len(self.batches), 'users': len(self.by_user), 'files': self.total_files,
+                'bytes': self.total_size, 'evicted': dict(self.evicted)}
+
+    def close(self):
+        if self.db:
+            self.db.close()
+            self.db = None
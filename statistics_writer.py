@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+import os
+
+from async_gdrive_service import DriveApiError, make_statistics_row
+
+logger = logging.getLogger(__name__)
+
+
+class StatisticsWriter:
+    # Строки статистики копятся в памяти и записываются в таблицу одним append
+    # по таймеру или по количеству строк. При недоступности Sheets строки
+    # сохраняются в локальный файл и отправляются при следующей записи.
+    def __init__(self, drive_service, folder_index, folder_name, file_name, flush_interval=30, flush_rows=50,
+                 spool_file='statistics_spool.jsonl'):
+        self.drive_service = drive_service
+        self.folder_index = folder_index
+        self.folder_name = folder_name
+        self.file_name = file_name
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.spool_file = spool_file
+        self._rows = []
+        self._sheet_id = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def add_entry(self, date, user_id, folder, file_names):
+        self._rows.append(make_statistics_row(date, user_id, folder, file_names))
+        if len(self._rows) >= self.flush_rows:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task:
+            # Цикл отменяется только между записями: append, который он уже отправил, дожидается ответа
+            async with self._flush_lock:
+                self._task.cancel()
+                self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _get_sheet_id(self):
+        if self._sheet_id is None:
+            upload_folder_id = await self.folder_index.ensure_seeded()
+            stats_folder_id = await self.folder_index.get_or_create_folder(upload_folder_id, self.folder_name)
+            self._sheet_id = await self.drive_service.create_or_get_statistics_sheet(stats_folder_id, self.file_name)
+        return self._sheet_id
+
+    def _read_spool(self):
+        if not os.path.exists(self.spool_file):
+            return []
+        rows = []
+        with open(self.spool_file, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+        return rows
+
+    def _write_spool(self, rows):
+        spool_dir = os.path.dirname(self.spool_file)
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        tmp_file = f'{self.spool_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        os.replace(tmp_file, self.spool_file)
+
+    async def flush(self):
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            spooled_rows = self._read_spool()
+            rows = spooled_rows + rows
+            if not rows:
+                return
+
+            try:
+                sheet_id = await self._get_sheet_id()
+                await self.drive_service.append_statistics_rows(sheet_id, rows)
+                if spooled_rows:
+                    os.remove(self.spool_file)
+            except Exception as e:
+                if isinstance(e, DriveApiError) and e.status == 404:
+                    self._sheet_id = None
+                logger.error(f"Не удалось записать статистику, {len(rows)} строк сохранено локально: {e}")
+                self._write_spool(rows)
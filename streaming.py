@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramDownloadError(Exception):
+    pass
+
+
+class BoundedStream:
+    # Буфер между источником и загрузкой в Drive: не больше max_chunks кусков в памяти,
+    # источник ждет, пока загрузка не освободит место.
+    def __init__(self, max_chunks=4):
+        self._queue = asyncio.Queue(maxsize=max(1, max_chunks))
+        self._pending = b''
+        self._eof = False
+        self._producer = None
+        self._producer_task = None
+        self.bytes_read = 0
+        self.producer_seconds = None
+
+    def attach(self, producer):
+        # Источник запускается при первом чтении, чтобы не держать соединение в очереди на загрузку
+        self._producer = producer
+
+    async def put(self, chunk):
+        if chunk:
+            await self._queue.put(chunk)
+
+    async def finish(self, error=None):
+        await self._queue.put(error)
+
+    async def _run_producer(self):
+        started = time.monotonic()
+        try:
+            await self._producer(self)
+            self.producer_seconds = time.monotonic() - started
+            await self.finish()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.finish(e)
+
+    async def read(self, size):
+        if self._producer and self._producer_task is None:
+            self._producer_task = asyncio.create_task(self._run_producer())
+
+        data = bytearray(self._pending)
+        while len(data) < size and not self._eof:
+            item = await self._queue.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                data.extend(item)
+
+        self._pending = bytes(data[size:])
+        chunk = bytes(data[:size])
+        self.bytes_read += len(chunk)
+        return chunk
+
+    async def close(self):
+        if self._producer_task and not self._producer_task.done():
+            self._producer_task.cancel()
+            try:
+                await self._producer_task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+async def copy_response(response, target, chunk_size, offset=0, on_bytes=None):
+    # Тело ответа на запрос с Range bytes=offset- в поток; возвращает число отданных байт.
+    # Если сервер не поддерживает Range, начало файла пропускается локально.
+    skip = offset if offset and response.status != 206 else 0
+    copied = 0
+    async for chunk in response.content.iter_chunked(chunk_size):
+        if skip:
+            dropped = min(skip, len(chunk))
+            chunk = chunk[dropped:]
+            skip -= dropped
+        if not chunk:
+            continue
+        copied += len(chunk)
+        if on_bytes:
+            on_bytes(len(chunk))
+        await target.put(chunk)
+    return copied
+
+
+class TelegramFileStreamer:
+    def __init__(self, chunk_size=1024 * 1024, buffer_chunks=4, pool_size=20):
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+        self.pool_size = pool_size
+        self.session = None
+
+    async def start(self):
+        if self.session is None:
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size), timeout=timeout)
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def open(self, telegram_file, offset=0, on_bytes=None):
+        stream = BoundedStream(self.buffer_chunks)
+
+        async def produce(target):
+            if self.session is None:
+                await self.start()
+            headers = {'Range': f'bytes={offset}-'} if offset else None
+            async with self.session.get(telegram_file.file_path, headers=headers) as response:
+                # Ссылка на файл содержит токен бота: ошибка с ней (как у raise_for_status) попала бы в лог
+                if response.status >= 400:
+                    raise TelegramDownloadError(
+                        f'Telegram вернул {response.status} при скачивании файла {telegram_file.file_id}')
+                await copy_response(response, target, self.chunk_size, offset, on_bytes)
+
+        stream.attach(produce)
+        return stream
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from async_gdrive_service import AsyncGoogleDriveService, ApiResponse, DriveApiError
+
+
+class FakeRequests:
+    # Заменяет _request: отвечает по очереди заданными ответами или ошибками и запоминает вызовы.
+    # Ответ - тело JSON или (статус, заголовки, тело)
+    def __init__(self, *results, account=None):
+        self.results = list(results)
+        self.account = account
+        self.calls = []
+
+    async def __call__(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        status, headers, body = result if isinstance(result, tuple) else (200, {}, result)
+        return ApiResponse(status, headers, body.encode(), kwargs.get('account') or self.account)
+
+
+class AsyncGoogleDriveServiceTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        credentials_file = os.path.join(self.directory.name, 'account.json')
+        with open(credentials_file, 'w') as f:
+            f.write('{}')
+        self.service = AsyncGoogleDriveService(credentials_file, max_retries=2, backoff_base=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_folder_lookup_error_is_not_reported_as_missing_folder(self):
+        self.service._request = FakeRequests(DriveApiError(503, 'Backend Error'))
+
+        with self.assertRaises(DriveApiError):
+            await self.service.find_folder_id_by_name('01-01-2026', 'parent')
+
+    async def test_folder_lookup_skips_trashed_folders(self):
+        requests = FakeRequests('{"files": []}')
+        self.service._request = requests
+
+        self.assertIsNone(await self.service.find_folder_id_by_name('01-01-2026', 'parent'))
+        self.assertIn('trashed=false', requests.calls[0][2]['params']['q'])
+
+    async def test_create_is_not_repeated_when_first_attempt_succeeded(self):
+        requests = FakeRequests(DriveApiError(503, 'Backend Error'), '{"files": [{"id": "created"}]}')
+        self.service._request = requests
+
+        self.assertEqual(await self.service.create_folder('parent', 'folder'), 'created')
+        self.assertEqual([method for method, _, _ in requests.calls], ['POST', 'GET'])
+        self.assertFalse(requests.calls[0][2]['idempotent'])
+
+    async def test_create_is_repeated_when_nothing_was_created(self):
+        requests = FakeRequests(DriveApiError(503, 'Backend Error'), '{"files": []}', '{"id": "created"}')
+        self.service._request = requests
+
+        self.assertEqual(await self.service.create_folder('parent', 'folder'), 'created')
+        self.assertEqual([method for method, _, _ in requests.calls], ['POST', 'GET', 'POST'])
+
+    async def test_rejected_create_is_not_repeated(self):
+        requests = FakeRequests(DriveApiError(400, 'Bad Request'))
+        self.service._request = requests
+
+        with self.assertRaises(DriveApiError):
+            await self.service.create_folder('parent', 'folder')
+        self.assertEqual(len(requests.calls), 1)
+
+    async def test_multipart_upload_counts_only_file_bytes(self):
+        account = self.service.accounts.accounts[0]
+        self.service._request = FakeRequests('{"id": "file", "md5Checksum": "abc"}', account=account)
+
+        uploaded = await self.service.upload_bytes(b'0123456789', 'parent', 'a.txt', {})
+
+        self.assertEqual(uploaded, {'id': 'file', 'md5Checksum': 'abc'})
+        self.assertEqual(account.uploaded_today, 10)
+
+    async def test_resumable_upload_counts_confirmed_bytes(self):
+        account = self.service.accounts.accounts[0]
+        self.service.multipart_threshold = 0
+        chunk_size = self.service.chunk_size
+        requests = FakeRequests(
+            (200, {'Location': 'https://upload/session'}, ''),
+            # Сервер принял только первые 100 байт куска: остаток отправляется повторно
+            (308, {'Range': 'bytes=0-99'}, ''),
+            (308, {'Range': f'bytes=0-{chunk_size - 1}'}, ''),
+            '{"id": "file"}',
+            account=account
+        )
+        self.service._request = requests
+
+        await self.service.upload_bytes(b'x' * (chunk_size + 10), 'parent', 'a.bin', {})
+
+        self.assertEqual(account.uploaded_today, chunk_size + 10)
+        self.assertEqual(len(requests.calls), 4)
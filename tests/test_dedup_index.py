@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from dedup_index import DedupIndex
+
+
+class DedupIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'dedup.sqlite3')
+        self.index = DedupIndex(self.path)
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_lookup_returns_remembered_file(self):
+        self.assertIsNone(self.index.lookup('unique'))
+
+        self.index.remember('unique', 'drive-1', size=10, md5='abc')
+
+        self.assertEqual(self.index.lookup('unique'), {'file_id': 'drive-1', 'md5': 'abc', 'size': 10})
+
+    def test_remember_keeps_known_md5_and_size(self):
+        self.index.remember('unique', 'drive-1', size=10, md5='abc')
+        self.index.remember('unique', 'drive-2')
+
+        self.assertEqual(self.index.lookup('unique'), {'file_id': 'drive-2', 'md5': 'abc', 'size': 10})
+
+    def test_remember_replaces_md5_of_new_upload(self):
+        self.index.remember('unique', 'drive-1', md5='abc')
+        self.index.remember('unique', 'drive-1', md5='def')
+
+        self.assertEqual(self.index.lookup('unique')['md5'], 'def')
+
+    def test_forget_removes_entry(self):
+        self.index.remember('unique', 'drive-1', md5='abc')
+        self.index.forget('unique')
+
+        self.assertIsNone(self.index.lookup('unique'))
+
+    def test_entries_survive_restart(self):
+        self.index.remember('unique', 'drive-1', size=10, md5='abc')
+        self.index.close()
+
+        self.index = DedupIndex(self.path)
+
+        self.assertEqual(self.index.lookup('unique'), {'file_id': 'drive-1', 'md5': 'abc', 'size': 10})
@@ -0,0 +1,63 @@
+import asyncio
+import unittest
+
+from async_gdrive_service import FOLDER_MIME_TYPE
+from folder_index import FolderIndex
+
+
+class FakeDrive:
+    def __init__(self):
+        self.folders = {'root': ('Upload', None), 'target': ('Photos', 'root')}
+        self.created = []
+
+    async def get_start_page_token(self):
+        return '1'
+
+    async def find_folder_id_by_name(self, name, parent_id=None):
+        await asyncio.sleep(0)
+        return next((folder_id for folder_id, (folder_name, parent) in self.folders.items()
+                     if folder_name == name and (parent_id is None or parent == parent_id)), None)
+
+    async def get_child_folders(self, parent_ids):
+        return [{'id': folder_id, 'name': name, 'parents': [parent]}
+                for folder_id, (name, parent) in self.folders.items() if parent in parent_ids]
+
+    async def create_folder(self, parent_id, name):
+        await asyncio.sleep(0.01)
+        folder_id = f'created-{len(self.created)}'
+        self.created.append(name)
+        self.folders[folder_id] = (name, parent_id)
+        return folder_id
+
+
+class FolderIndexTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.drive = FakeDrive()
+        self.index = FolderIndex(self.drive)
+        await self.index.ensure_seeded()
+
+    async def test_seed_indexes_target_folders(self):
+        self.assertEqual(self.index.root_id, 'root')
+        self.assertEqual(self.index.get_folders(), {'Photos': 'target'})
+        self.assertEqual(self.index.get_folder_name('target'), 'Photos')
+
+    async def test_concurrent_requests_create_folder_once(self):
+        results = await asyncio.gather(*(self.index.get_or_create_folder('target', '01-01-2026') for _ in range(5)))
+
+        self.assertEqual(set(results), {'created-0'})
+        self.assertEqual(self.drive.created, ['01-01-2026'])
+        self.assertEqual(self.index.get_child_id('target', '01-01-2026'), 'created-0')
+
+    async def test_create_locks_are_released(self):
+        await asyncio.gather(*(self.index.get_or_create_folder('target', f'0{day}-01-2026') for day in range(1, 4)))
+
+        self.assertEqual(self.index._create_locks, {})
+
+    async def test_trashed_folder_is_removed_from_index(self):
+        folder_id = await self.index.get_or_create_folder('target', '01-01-2026')
+
+        self.index._apply_change({'fileId': folder_id, 'file': {'id': folder_id, 'name': '01-01-2026',
+                                                                'mimeType': FOLDER_MIME_TYPE,
+                                                                'parents': ['target'], 'trashed': True}})
+
+        self.assertIsNone(self.index.get_child_id('target', '01-01-2026'))
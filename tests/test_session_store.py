@@ -0,0 +1,128 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from session_store import PendingBatchStore
+
+
+def make_item(unique_id, name=None):
+    return {'file_id': f'id-{unique_id}', 'file_unique_id': unique_id, 'file_name': name or f'{unique_id}.jpg',
+            'type': 'photo'}
+
+
+class PendingBatchStoreTest(unittest.TestCase):
+    def add_batch(self, store, user_id, *unique_ids):
+        batch = store.new_batch(user_id, chat_id=user_id)
+        for unique_id in unique_ids:
+            batch.add_file(make_item(unique_id))
+        store.add(batch)
+        return batch
+
+    def test_batch_is_available_only_to_its_owner(self):
+        store = PendingBatchStore()
+        batch = self.add_batch(store, 1, 'a')
+
+        self.assertIsNone(store.get(batch.token, 2))
+        self.assertIs(store.get(batch.token, 1), batch)
+
+    def test_idle_batch_expires_after_ttl(self):
+        store = PendingBatchStore(ttl=60)
+        now = time.time()
+        with mock.patch('session_store.time.time', return_value=now):
+            batch = self.add_batch(store, 1, 'a')
+        with mock.patch('session_store.time.time', return_value=now + 30):
+            self.assertIs(store.get(batch.token, 1), batch)
+        # Обращение продлевает жизнь пакета
+        with mock.patch('session_store.time.time', return_value=now + 89):
+            self.assertIs(store.get(batch.token, 1), batch)
+        with mock.patch('session_store.time.time', return_value=now + 150):
+            self.assertIsNone(store.get(batch.token, 1))
+
+        self.assertEqual(store.evicted['ttl'], 1)
+        self.assertEqual(store.stats()['files'], 0)
+
+    def test_least_recently_used_batch_is_evicted_first(self):
+        store = PendingBatchStore(max_batches=2)
+        first = self.add_batch(store, 1, 'a')
+        second = self.add_batch(store, 2, 'b')
+        store.get(first.token, 1)
+        third = self.add_batch(store, 3, 'c')
+
+        self.assertIs(store.get(first.token, 1), first)
+        self.assertIsNone(store.get(second.token, 2))
+        self.assertIs(store.get(third.token, 3), third)
+        self.assertEqual(store.evicted['size'], 1)
+
+    def test_per_user_limit_evicts_oldest_batch_of_that_user(self):
+        store = PendingBatchStore(max_per_user=2)
+        other = self.add_batch(store, 2, 'x')
+        batches = [self.add_batch(store, 1, f'f{number}') for number in range(3)]
+
+        self.assertIsNone(store.get(batches[0].token, 1))
+        self.assertIs(store.get(batches[2].token, 1), batches[2])
+        self.assertIs(store.get(other.token, 2), other)
+        self.assertEqual(store.evicted['user_limit'], 1)
+        self.assertEqual(store.stats()['batches'], 3)
+
+    def test_pop_takes_batch_once(self):
+        store = PendingBatchStore()
+        batch = self.add_batch(store, 1, 'a', 'b')
+
+        self.assertIsNone(store.pop(batch.token, 2))
+        self.assertIs(store.pop(batch.token, 1), batch)
+        self.assertIsNone(store.pop(batch.token, 1))
+        self.assertEqual(store.stats(), {'batches': 0, 'users': 0, 'files': 0, 'bytes': 0,
+                                         'evicted': {'ttl': 0, 'size': 0, 'user_limit': 0}})
+
+    def test_adding_batch_again_does_not_count_it_twice(self):
+        store = PendingBatchStore()
+        batch = self.add_batch(store, 1, 'a', 'b')
+        size = batch.size
+        store.add(batch)
+
+        self.assertEqual(store.stats()['files'], 2)
+        self.assertEqual(store.stats()['bytes'], size)
+        self.assertEqual(store.stats()['batches'], 1)
+
+        batch.add_file(make_item('c'))
+        store.add(batch)
+        self.assertEqual(store.stats()['files'], 3)
+        self.assertIs(store.pop(batch.token, 1), batch)
+        self.assertEqual((store.stats()['files'], store.stats()['bytes']), (0, 0))
+
+    def test_batch_returned_after_pop_is_counted_once(self):
+        store = PendingBatchStore()
+        batch = self.add_batch(store, 1, 'a')
+        store.add(store.pop(batch.token, 1))
+
+        self.assertEqual((store.stats()['batches'], store.stats()['files']), (1, 1))
+
+    def test_duplicate_files_are_rejected(self):
+        store = PendingBatchStore()
+        batch = store.new_batch(1, 1)
+
+        self.assertTrue(batch.add_file(make_item('a')))
+        self.assertFalse(batch.add_file(make_item('a', 'other.jpg')))
+        self.assertEqual(len(batch.files), 1)
+
+    def test_batches_survive_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pending.sqlite3')
+            store = PendingBatchStore(path)
+            batch = self.add_batch(store, 1, 'a', 'b')
+            batch.add_comment('текст', 0)
+            store.add(batch)
+            size = store.stats()['bytes']
+            store.close()
+
+            restored = PendingBatchStore(path)
+            loaded = restored.get(batch.token, 1)
+            stats = restored.stats()
+            restored.close()
+
+        self.assertEqual((stats['batches'], stats['files'], stats['bytes']), (1, 2, size))
+        self.assertEqual([item['file_unique_id'] for item in loaded.files], ['a', 'b'])
+        self.assertEqual(loaded.comments[0]['content'], 'текст')
+        self.assertFalse(loaded.add_file(make_item('a')))
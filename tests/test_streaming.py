@@ -0,0 +1,162 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from streaming import BoundedStream, TelegramDownloadError, TelegramFileStreamer, copy_response
+
+
+class FakeContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    def __init__(self, status, chunks):
+        self.status = status
+        self.content = FakeContent(chunks)
+
+
+class BoundedStreamTest(unittest.IsolatedAsyncioTestCase):
+    def make_stream(self, chunks, max_chunks=4):
+        stream = BoundedStream(max_chunks)
+
+        async def produce(target):
+            for chunk in chunks:
+                await target.put(chunk)
+
+        stream.attach(produce)
+        return stream
+
+    async def test_read_returns_exact_sizes_across_chunks(self):
+        stream = self.make_stream([b'abc', b'', b'defgh', b'ij'])
+
+        self.assertEqual(await stream.read(4), b'abcd')
+        self.assertEqual(await stream.read(4), b'efgh')
+        self.assertEqual(await stream.read(4), b'ij')
+        self.assertEqual(await stream.read(4), b'')
+        self.assertEqual(stream.bytes_read, 10)
+        self.assertIsNotNone(stream.producer_seconds)
+
+    async def test_producer_starts_on_first_read(self):
+        started = asyncio.Event()
+        stream = BoundedStream()
+
+        async def produce(target):
+            started.set()
+            await target.put(b'data')
+
+        stream.attach(produce)
+        await asyncio.sleep(0)
+        self.assertFalse(started.is_set())
+
+        self.assertEqual(await stream.read(10), b'data')
+        self.assertTrue(started.is_set())
+
+    async def test_producer_waits_for_reader(self):
+        produced = 0
+        stream = BoundedStream(max_chunks=2)
+
+        async def produce(target):
+            nonlocal produced
+            for _ in range(10):
+                await target.put(b'x')
+                produced += 1
+
+        stream.attach(produce)
+        await stream.read(1)
+        await asyncio.sleep(0.01)
+
+        # Один кусок отдан читателю, в буфере не больше max_chunks
+        self.assertLessEqual(produced, 3)
+        await stream.close()
+
+    async def test_producer_error_reaches_reader(self):
+        stream = BoundedStream()
+
+        async def produce(target):
+            await target.put(b'abc')
+            raise ConnectionError('source failed')
+
+        stream.attach(produce)
+
+        with self.assertRaises(ConnectionError):
+            await stream.read(10)
+
+    async def test_close_cancels_producer(self):
+        stream = BoundedStream(max_chunks=1)
+        cancelled = asyncio.Event()
+
+        async def produce(target):
+            try:
+                while True:
+                    await target.put(b'x')
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        stream.attach(produce)
+        await stream.read(1)
+        await stream.close()
+
+        self.assertTrue(cancelled.is_set())
+
+
+class CopyResponseTest(unittest.IsolatedAsyncioTestCase):
+    async def copy(self, status, chunks, offset):
+        target = BoundedStream(max_chunks=len(chunks) + 1)
+        counted = []
+        copied = await copy_response(FakeResponse(status, chunks), target, 4, offset, counted.append)
+        await target.finish()
+        return copied, await target.read(100), sum(counted)
+
+    async def test_partial_response_is_copied_as_is(self):
+        self.assertEqual(await self.copy(206, [b'defg', b'hij'], 3), (7, b'defghij', 7))
+
+    async def test_full_response_skips_bytes_before_offset(self):
+        self.assertEqual(await self.copy(200, [b'ab', b'cdef', b'ghij'], 3), (7, b'defghij', 7))
+
+    async def test_full_response_without_offset_is_copied_whole(self):
+        self.assertEqual(await self.copy(200, [b'abc', b'def'], 0), (6, b'abcdef', 6))
+
+
+class TelegramFileStreamerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async def handle_file(request):
+            if request.match_info['name'] == 'missing':
+                return web.Response(status=404)
+            return web.Response(body=b'0123456789')
+
+        app = web.Application()
+        app.router.add_get('/file/bot123:SECRET/{name}', handle_file)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.streamer = TelegramFileStreamer(chunk_size=4)
+
+    async def asyncTearDown(self):
+        await self.streamer.close()
+        await self.server.close()
+
+    def make_file(self, name):
+        return SimpleNamespace(file_id=f'id-{name}', file_path=str(self.server.make_url(f'/file/bot123:SECRET/{name}')))
+
+    async def test_file_is_streamed_from_offset(self):
+        stream = self.streamer.open(self.make_file('photo'), offset=6)
+
+        self.assertEqual(await stream.read(100), b'6789')
+
+    async def test_error_does_not_leak_bot_token(self):
+        stream = self.streamer.open(self.make_file('missing'))
+
+        with self.assertRaises(TelegramDownloadError) as raised:
+            await stream.read(100)
+
+        self.assertIn('404', str(raised.exception))
+        self.assertIn('id-missing', str(raised.exception))
+        self.assertNotIn('SECRET', str(raised.exception))
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from upload_journal import UploadJournal
+
+
+class UploadJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'journal', 'uploads.json')
+        self.journal = UploadJournal(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_session_and_offset_are_resumed_after_restart(self):
+        self.journal.start_batch({'id': 'batch'})
+        self.journal.set_session('batch', '0', 'https://upload/session#account=a')
+        self.journal.commit_offset('batch', '0', 8 * 1024 * 1024)
+        self.journal.complete_item('batch', '1', 'drive-file')
+
+        restored = UploadJournal(self.path)
+
+        self.assertEqual(restored.get_item('batch', '0'),
+                         {'session_uri': 'https://upload/session#account=a', 'offset': 8 * 1024 * 1024})
+        self.assertEqual(restored.get_item('batch', '1'), {'file_id': 'drive-file', 'session_uri': None})
+
+    def test_restarting_batch_keeps_progress(self):
+        self.journal.start_batch({'id': 'batch'})
+        self.journal.commit_offset('batch', '0', 100)
+        self.journal.start_batch({'id': 'batch'})
+
+        self.assertEqual(self.journal.get_item('batch', '0'), {'offset': 100})
+
+    def test_reset_item_drops_expired_session(self):
+        self.journal.start_batch({'id': 'batch'})
+        self.journal.set_session('batch', '0', 'https://upload/session')
+        self.journal.commit_offset('batch', '0', 100)
+        self.journal.reset_item('batch', '0')
+
+        self.assertEqual(self.journal.get_item('batch', '0'), {'session_uri': None, 'offset': 0})
+
+    def test_finished_batch_is_removed(self):
+        self.journal.start_batch({'id': 'batch'})
+        self.journal.commit_offset('batch', '0', 100)
+        self.journal.finish_batch('batch')
+
+        self.assertEqual(UploadJournal(self.path).batches, {})
+
+    def test_updates_for_unknown_batch_are_ignored(self):
+        self.journal.commit_offset('missing', '0', 100)
+
+        self.assertEqual(self.journal.get_item('missing', '0'), {})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unreadable_journal_starts_empty(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{не json')
+
+        with self.assertLogs('upload_journal', 'ERROR'):
+            self.assertEqual(UploadJournal(self.path).batches, {})
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from upload_queue import UploadQueue
+
+
+class UploadQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'queue.sqlite3')
+        self.queue = UploadQueue(self.path, max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        self.directory.cleanup()
+
+    def enqueue(self, job_id, user_id):
+        return self.queue.enqueue({'id': job_id, 'user_id': user_id})
+
+    def test_claim_returns_jobs_in_order_once(self):
+        self.assertEqual(self.enqueue('a', 1), 1)
+        self.assertEqual(self.enqueue('b', 1), 2)
+
+        self.assertEqual(self.queue.claim()['id'], 'a')
+        self.assertEqual(self.queue.claim()['id'], 'b')
+        self.assertIsNone(self.queue.claim())
+        self.assertEqual(self.queue.depth(), {'pending': 0, 'running': 2, 'failed': 0})
+
+    def test_claim_prefers_users_without_running_jobs(self):
+        self.enqueue('a1', 1)
+        self.enqueue('a2', 1)
+        self.enqueue('b1', 2)
+
+        self.assertEqual(self.queue.claim()['id'], 'a1')
+        self.assertEqual(self.queue.claim()['id'], 'b1')
+        self.assertEqual(self.queue.claim()['id'], 'a2')
+
+    def test_complete_removes_job(self):
+        self.enqueue('a', 1)
+        self.enqueue('b', 1)
+        self.queue.complete(self.queue.claim()['id'])
+
+        self.assertEqual(self.queue.position('b'), 1)
+        self.assertEqual(self.queue.depth(), {'pending': 1, 'running': 0, 'failed': 0})
+
+    def test_release_retries_until_max_attempts(self):
+        self.enqueue('a', 1)
+
+        self.queue.claim()
+        self.assertEqual(self.queue.release('a'), 'pending')
+        self.assertEqual(self.queue.claim()['id'], 'a')
+        self.assertEqual(self.queue.release('a'), 'failed')
+        self.assertIsNone(self.queue.claim())
+        self.assertEqual(self.queue.depth(), {'pending': 0, 'running': 0, 'failed': 1})
+
+    def test_running_jobs_are_restored_after_restart(self):
+        self.enqueue('a', 1)
+        self.enqueue('b', 2)
+        self.queue.claim()
+        self.queue.close()
+
+        self.queue = UploadQueue(self.path, max_attempts=2)
+
+        self.assertEqual(self.queue.depth(), {'pending': 2, 'running': 0, 'failed': 0})
+        self.assertEqual(self.queue.claim()['id'], 'a')
+        self.assertEqual(self.queue.claim()['id'], 'b')
@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+
+from upload_scheduler import FairScheduler, TokenBucket
+
+
+class FairSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_in_flight_uploads_are_capped(self):
+        scheduler = FairScheduler(max_in_flight=2)
+        running = 0
+        peak = 0
+
+        async def upload():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(scheduler.run(user_id % 3, upload) for user_id in range(8)))
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_users_take_turns(self):
+        scheduler = FairScheduler(max_in_flight=1)
+        gate = asyncio.Event()
+        order = []
+
+        def upload(name):
+            async def operation():
+                order.append(name)
+            return operation
+
+        blocker = asyncio.create_task(scheduler.run('x', gate.wait))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(scheduler.run('a', upload(f'a{number}'))) for number in range(3)]
+        tasks.append(asyncio.create_task(scheduler.run('b', upload('b0'))))
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.waiting(), 4)
+
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+        self.assertEqual(order, ['a0', 'b0', 'a1', 'a2'])
+
+    async def test_weight_gives_user_several_slots_per_round(self):
+        scheduler = FairScheduler(max_in_flight=1, weights={'a': 2})
+        gate = asyncio.Event()
+        order = []
+
+        def upload(name):
+            async def operation():
+                order.append(name)
+            return operation
+
+        blocker = asyncio.create_task(scheduler.run('x', gate.wait))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(scheduler.run('a', upload(f'a{number}'))) for number in range(3)]
+        tasks += [asyncio.create_task(scheduler.run('b', upload(f'b{number}'))) for number in range(2)]
+        await asyncio.sleep(0)
+
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+        self.assertEqual(order, ['a0', 'a1', 'b0', 'a2', 'b1'])
+
+    async def test_throttle_halves_limit_and_successes_restore_it(self):
+        scheduler = FairScheduler(max_in_flight=8, decrease_interval=60)
+
+        scheduler.on_throttle()
+        self.assertEqual(scheduler.max_in_flight, 4)
+        # Ответы на запросы, отправленные до снижения, лимит повторно не снижают
+        scheduler.on_throttle()
+        self.assertEqual(scheduler.max_in_flight, 4)
+
+        for _ in range(4):
+            scheduler.on_success()
+        self.assertEqual(scheduler.max_in_flight, 5)
+        for _ in range(5 + 6 + 7 + 8):
+            scheduler.on_success()
+        self.assertEqual(scheduler.max_in_flight, 8)
+
+    async def test_limit_never_drops_below_one(self):
+        scheduler = FairScheduler(max_in_flight=2, decrease_interval=0)
+
+        for _ in range(3):
+            scheduler.on_throttle()
+
+        self.assertEqual(scheduler.max_in_flight, 1)
+
+    async def test_raised_limit_starts_waiting_uploads(self):
+        scheduler = FairScheduler(max_in_flight=2, decrease_interval=0)
+        scheduler.on_throttle()
+        gates = [asyncio.Event() for _ in range(2)]
+        tasks = [asyncio.create_task(scheduler.run(number, gate.wait)) for number, gate in enumerate(gates)]
+        await asyncio.sleep(0)
+        self.assertEqual((scheduler.in_flight, scheduler.waiting()), (1, 1))
+
+        scheduler.on_success()
+        await asyncio.sleep(0)
+
+        self.assertEqual((scheduler.in_flight, scheduler.waiting()), (2, 0))
+        for gate in gates:
+            gate.set()
+        await asyncio.gather(*tasks)
+
+    async def test_cancelled_waiter_does_not_hold_a_slot(self):
+        scheduler = FairScheduler(max_in_flight=1)
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(scheduler.run('a', gate.wait))
+        waiter = asyncio.create_task(scheduler.run('b', gate.wait))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        gate.set()
+        await blocker
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+
+        self.assertEqual(scheduler.in_flight, 0)
+
+        async def upload():
+            return 'done'
+
+        self.assertEqual(await scheduler.run('c', upload), 'done')
+
+    async def test_failed_upload_releases_slot(self):
+        scheduler = FairScheduler(max_in_flight=1)
+
+        async def fail():
+            raise RuntimeError('drive')
+
+        with self.assertRaises(RuntimeError):
+            await scheduler.run('a', fail)
+
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+class TokenBucketTest(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_beyond_capacity_wait_for_refill(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(2):
+            await bucket.acquire()
+        self.assertLess(loop.time() - started, 0.04)
+
+        await bucket.acquire()
+
+        self.assertGreaterEqual(loop.time() - started, 0.04)
@@ -0,0 +1,136 @@
+import socket
+import unittest
+
+from yarl import URL
+
+from url_downloader import (PRIVATE_ADDRESS_MESSAGE, BlockedAddressError, PublicResolver, UrlDownloader,
+                            UrlDownloadError, is_public_address, parse_address)
+
+INTERNAL_ADDRESSES = [
+    '127.0.0.1', '127.1', '0x7f.1', '0177.0.0.1', '2130706433', '0x7f000001', '0.0.0.0',
+    '10.0.0.1', '172.16.5.4', '192.168.1.1', '169.254.169.254', '100.64.0.1',
+    '::1', 'fe80::1', 'fc00::1', '::ffff:127.0.0.1', '::ffff:169.254.169.254', '::ffff:10.0.0.1',
+]
+
+
+class FakeResponse:
+    def __init__(self, url, status=200, location=None):
+        self.url = URL(url)
+        self.status = status
+        self.headers = {'Location': location} if location else {}
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+class FakeSession:
+    # Отвечает на запросы по адресу заранее заданными ответами и запоминает, куда шли запросы
+    def __init__(self, responses):
+        self.responses = responses
+        self.requested = []
+
+    async def request(self, method, url, **kwargs):
+        self.requested.append(url)
+        return self.responses[url]
+
+
+class StubResolver:
+    def __init__(self, addresses):
+        self.addresses = addresses
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{'hostname': host, 'host': address, 'port': port, 'family': family, 'proto': 0, 'flags': 0}
+                for address in self.addresses]
+
+    async def close(self):
+        pass
+
+
+class AddressCheckTest(unittest.TestCase):
+    def test_internal_addresses_are_not_public(self):
+        for address in INTERNAL_ADDRESSES:
+            with self.subTest(address=address):
+                self.assertFalse(is_public_address(address))
+
+    def test_public_addresses_are_allowed(self):
+        for address in ['8.8.8.8', '1.1.1.1', '2606:4700:4700::1111']:
+            with self.subTest(address=address):
+                self.assertTrue(is_public_address(address))
+
+    def test_short_and_numeric_ipv4_forms_are_parsed(self):
+        for address in ['127.1', '0x7f.1', '2130706433', '0x7f000001', '::ffff:127.0.0.1']:
+            with self.subTest(address=address):
+                self.assertEqual(str(parse_address(address)), '127.0.0.1')
+
+    def test_host_names_are_not_addresses(self):
+        self.assertIsNone(parse_address('example.com'))
+        self.assertFalse(is_public_address('example.com'))
+
+
+class PublicResolverTest(unittest.IsolatedAsyncioTestCase):
+    async def resolve(self, addresses):
+        resolver = PublicResolver()
+        await resolver.close()
+        resolver._resolver = StubResolver(addresses)
+        return [entry['host'] for entry in await resolver.resolve('files.example.com', 443)]
+
+    async def test_internal_addresses_are_dropped(self):
+        self.assertEqual(await self.resolve(['10.0.0.1', '93.184.216.34', '::1']), ['93.184.216.34'])
+
+    async def test_host_with_only_internal_addresses_is_blocked(self):
+        with self.assertRaises(BlockedAddressError):
+            await self.resolve(['127.0.0.1', '169.254.169.254'])
+
+
+class UrlDownloaderAddressTest(unittest.IsolatedAsyncioTestCase):
+    async def test_internal_ip_literals_are_refused_before_connecting(self):
+        downloader = UrlDownloader()
+        downloader.session = FakeSession({})
+        for address in ['127.0.0.1', '2130706433', '0x7f.1', '169.254.169.254', '10.0.0.1', '[::ffff:127.0.0.1]']:
+            with self.subTest(address=address):
+                with self.assertRaises(UrlDownloadError) as raised:
+                    await downloader.probe(f'http://{address}/file.bin')
+                self.assertEqual(str(raised.exception), PRIVATE_ADDRESS_MESSAGE)
+        self.assertEqual(downloader.session.requested, [])
+
+    async def test_redirect_to_internal_host_is_refused(self):
+        downloader = UrlDownloader()
+        downloader.session = FakeSession({
+            'https://files.example.com/file.bin': FakeResponse('https://files.example.com/file.bin', 302,
+                                                               'http://169.254.169.254/latest/meta-data/'),
+        })
+
+        with self.assertRaises(UrlDownloadError) as raised:
+            await downloader.probe('https://files.example.com/file.bin')
+
+        self.assertEqual(str(raised.exception), PRIVATE_ADDRESS_MESSAGE)
+        self.assertEqual(downloader.session.requested, ['https://files.example.com/file.bin'])
+        self.assertTrue(downloader.session.responses['https://files.example.com/file.bin'].released)
+
+    async def test_relative_redirect_is_followed(self):
+        downloader = UrlDownloader()
+        final = FakeResponse('https://files.example.com/real.bin')
+        downloader.session = FakeSession({
+            'https://files.example.com/file.bin': FakeResponse('https://files.example.com/file.bin', 301, '/real.bin'),
+            'https://files.example.com/real.bin': final,
+        })
+
+        self.assertIs(await downloader._request('GET', 'https://files.example.com/file.bin'), final)
+
+    async def test_host_resolving_to_internal_address_is_refused(self):
+        downloader = UrlDownloader(probe_timeout=5)
+        try:
+            with self.assertRaises(UrlDownloadError) as raised:
+                await downloader.probe('http://localhost:9/file.bin')
+        finally:
+            await downloader.close()
+
+        self.assertEqual(str(raised.exception), PRIVATE_ADDRESS_MESSAGE)
+
+    async def test_non_http_schemes_are_refused(self):
+        downloader = UrlDownloader()
+        downloader.session = FakeSession({})
+
+        with self.assertRaises(UrlDownloadError):
+            await downloader.probe('file:///etc/passwd')
@@ -0,0 +1,48 @@
+import asyncio
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from webhook_server import SECRET_TOKEN_HEADER, WebhookServer
+
+UPDATE = {'update_id': 1, 'message': {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'},
+                                      'from': {'id': 1, 'is_bot': False, 'first_name': 'user'},
+                                      'text': '/retention run'}}
+
+
+class FakeApplication:
+    def __init__(self):
+        self.bot = None
+        self.running = True
+        self.update_queue = asyncio.Queue()
+
+
+class WebhookServerTest(unittest.IsolatedAsyncioTestCase):
+    async def post(self, server, headers):
+        async with TestClient(TestServer(server.make_app())) as client:
+            response = await client.post('/telegram', json=UPDATE, headers=headers)
+            return response.status
+
+    async def test_update_with_secret_is_queued(self):
+        application = FakeApplication()
+        server = WebhookServer(application, secret_token='secret')
+
+        self.assertEqual(await self.post(server, {SECRET_TOKEN_HEADER: 'secret'}), 200)
+        self.assertEqual((await application.update_queue.get()).update_id, 1)
+
+    async def test_update_with_wrong_secret_is_rejected(self):
+        application = FakeApplication()
+        server = WebhookServer(application, secret_token='secret')
+
+        self.assertEqual(await self.post(server, {SECRET_TOKEN_HEADER: 'guess'}), 403)
+        self.assertTrue(application.update_queue.empty())
+
+    async def test_empty_secret_is_replaced_with_random_one(self):
+        application = FakeApplication()
+        server = WebhookServer(application, secret_token='')
+
+        self.assertTrue(server.secret_token)
+        self.assertNotEqual(server.secret_token, WebhookServer(application).secret_token)
+        self.assertEqual(await self.post(server, {}), 403)
+        self.assertEqual(await self.post(server, {SECRET_TOKEN_HEADER: ''}), 403)
+        self.assertTrue(application.update_queue.empty())
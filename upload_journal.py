@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class UploadJournal:
+    # Журнал загрузок на диске: resumable-сессия каждого файла пакета и подтвержденный Drive offset.
+    # Когда задание из очереди выполняется повторно, файлы продолжаются с последнего подтвержденного байта.
+    def __init__(self, path):
+        self.path = path
+        self.batches = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать журнал загрузок {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        journal_dir = os.path.dirname(self.path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.batches, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def start_batch(self, batch):
+        if batch['id'] not in self.batches:
+            self.batches[batch['id']] = {'items': {}}
+            self._save()
+
+    def get_item(self, batch_id, key):
+        entry = self.batches.get(batch_id)
+        if not entry:
+            return {}
+        return entry['items'].get(key, {})
+
+    def _update_item(self, batch_id, key, **values):
+        entry = self.batches.get(batch_id)
+        if not entry:
+            return
+        entry['items'].setdefault(key, {}).update(values)
+        self._save()
+
+    def set_session(self, batch_id, key, session_uri):
+        self._update_item(batch_id, key, session_uri=session_uri, offset=0)
+
+    def commit_offset(self, batch_id, key, offset):
+        self._update_item(batch_id, key, offset=offset)
+
+    def reset_item(self, batch_id, key):
+        self._update_item(batch_id, key, session_uri=None, offset=0)
+
+    def complete_item(self, batch_id, key, file_id):
+        self._update_item(batch_id, key, file_id=file_id, session_uri=None)
+
+    def finish_batch(self, batch_id):
+        if self.batches.pop(batch_id, None) is not None:
+            self._save()
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UploadResult:
+    def __init__(self, index, item, file_id=None, error=None):
+        self.index = index
+        self.item = item
+        self.file_id = file_id
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class UploadPipeline:
+    # Конвейер: скачивание из Telegram и загрузка в Drive идут параллельно,
+    # у каждой стадии свой лимит одновременных операций.
+    def __init__(self, download, upload, download_concurrency=4, upload_concurrency=3, on_result=None, cleanup=None):
+        self.download = download
+        self.upload = upload
+        self.download_concurrency = max(1, download_concurrency)
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.on_result = on_result
+        self.cleanup = cleanup
+
+    async def run(self, items):
+        download_semaphore = asyncio.Semaphore(self.download_concurrency)
+        upload_semaphore = asyncio.Semaphore(self.upload_concurrency)
+        # Ограничивает число скачанных, но еще не загруженных файлов
+        staged_semaphore = asyncio.Semaphore(self.download_concurrency + self.upload_concurrency)
+
+        async def process(index, item):
+            source = None
+            async with staged_semaphore:
+                try:
+                    async with download_semaphore:
+                        source = await self.download(item)
+                    async with upload_semaphore:
+                        file_id = await self.upload(item, source)
+                    result = UploadResult(index, item, file_id=file_id)
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке элемента {index + 1}: {e}")
+                    result = UploadResult(index, item, error=e)
+                finally:
+                    if self.cleanup and source is not None:
+                        try:
+                            await self.cleanup(item, source)
+                        except Exception as e:
+                            logger.warning(f"Не удалось очистить временные данные: {e}")
+
+            if self.on_result:
+                try:
+                    await self.on_result(result)
+                except Exception as e:
+                    logger.warning(f"Ошибка в обработчике результата: {e}")
+            return result
+
+        return await asyncio.gather(*(process(index, item) for index, item in enumerate(items)))
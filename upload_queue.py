@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class UploadQueue:
+    # Очередь заданий на загрузку в SQLite: задание переживает перезапуск бота,
+    # незавершенные задания после старта снова становятся доступны воркерам.
+    def __init__(self, path, max_attempts=3):
+        queue_dir = os.path.dirname(path)
+        if queue_dir:
+            os.makedirs(queue_dir, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        restored = self.db.execute(
+            "UPDATE jobs SET status='pending', updated_at=? WHERE status='running'", (time.time(),)
+        ).rowcount
+        if restored:
+            logger.info(f"Возвращено в очередь незавершенных заданий: {restored}")
+
+    def enqueue(self, job):
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO jobs (id, payload, status, created_at, updated_at) VALUES (?, ?, 'pending', ?, ?)",
+            (job['id'], json.dumps(job, ensure_ascii=False), now, now)
+        )
+        return self.position(job['id'])
+
+    def claim(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            # Сначала задания пользователей, у которых сейчас меньше всего выполняющихся заданий
+            row = self.db.execute(
+                "SELECT id, payload FROM jobs AS pending WHERE status='pending' ORDER BY ("
+                "SELECT COUNT(*) FROM jobs AS running WHERE running.status='running' "
+                "AND json_extract(running.payload, '$.user_id') = json_extract(pending.payload, '$.user_id')"
+                "), created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                self.db.execute(
+                    "UPDATE jobs SET status='running', attempts=attempts+1, updated_at=? WHERE id=?",
+                    (time.time(), row[0])
+                )
+            self.db.execute('COMMIT')
+        except Exception:
+            self.db.execute('ROLLBACK')
+            raise
+        return json.loads(row[1]) if row else None
+
+    def complete(self, job_id):
+        self.db.execute('DELETE FROM jobs WHERE id=?', (job_id,))
+
+    def release(self, job_id):
+        attempts = self.db.execute('SELECT attempts FROM jobs WHERE id=?', (job_id,)).fetchone()
+        status = 'pending' if attempts and attempts[0] < self.max_attempts else 'failed'
+        self.db.execute('UPDATE jobs SET status=?, updated_at=? WHERE id=?', (status, time.time(), job_id))
+        return status
+
+    def position(self, job_id):
+        row = self.db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running') "
+            "AND created_at <= (SELECT created_at FROM jobs WHERE id=?)",
+            (job_id,)
+        ).fetchone()
+        return row[0]
+
+    def depth(self):
+        counts = {'pending': 0, 'running': 0, 'failed': 0}
+        for status, count in self.db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            counts[status] = count
+        return counts
+
+    def close(self):
+        self.db.close()
+
+
+class UploadWorkerPool:
+    def __init__(self, queue, handler, workers=2, poll_interval=5):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.busy = 0
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(number)) for number in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _worker(self, number):
+        while True:
+            self._wakeup.clear()
+            job = self.queue.claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.busy += 1
+            try:
+                await self.handler(job)
+                self.queue.complete(job['id'])
+            except asyncio.CancelledError:
+                # Задание останется в статусе running и вернется в очередь при следующем запуске
+                raise
+            except Exception as e:
+                status = self.queue.release(job['id'])
+                logger.error(f"Воркер {number}: ошибка в задании {job['id']} ({status}): {e}")
+            finally:
+                self.busy -= 1
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FairScheduler:
+    # Загрузки разных пользователей получают слоты по очереди (взвешенный round-robin),
+    # общее число одновременных загрузок в Drive ограничено max_in_flight.
+    # Лимит подстраивается по AIMD: при ограничении скорости со стороны Drive он делится пополам,
+    # после max_in_flight успешных запросов подряд растет на единицу, но не выше limit.
+    def __init__(self, max_in_flight=4, weights=None, decrease_interval=2.0):
+        self.limit = max(1, max_in_flight)
+        self.max_in_flight = self.limit
+        self.weights = weights or {}
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self._successes = 0
+        self._decreased_at = 0.0
+        self._queues = OrderedDict()  # user_id -> deque ожидающих futures
+        self._credits = {}
+
+    def waiting(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def run(self, user_id, operation):
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+        try:
+            return await operation()
+        finally:
+            self._release()
+
+    def on_throttle(self):
+        # Ответы на запросы, отправленные до снижения, не должны снижать лимит повторно
+        now = time.monotonic()
+        if now - self._decreased_at < self.decrease_interval:
+            return
+        self._decreased_at = now
+        self._successes = 0
+        if self.max_in_flight > 1:
+            self.max_in_flight = max(1, self.max_in_flight // 2)
+            logger.warning(f"Drive ограничивает скорость, одновременных загрузок: {self.max_in_flight}")
+
+    def on_success(self):
+        if self.max_in_flight >= self.limit:
+            return
+        self._successes += 1
+        if self._successes >= self.max_in_flight:
+            self._successes = 0
+            self.max_in_flight += 1
+            logger.info(f"Одновременных загрузок: {self.max_in_flight}")
+            self._dispatch()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            credits = self._credits.get(user_id, self.weights.get(user_id, 1)) - 1
+
+            if not queue:
+                del self._queues[user_id]
+                self._credits.pop(user_id, None)
+            elif credits <= 0:
+                # Пользователь исчерпал свою долю в этом круге и уходит в конец очереди
+                self._queues.move_to_end(user_id)
+                self._credits[user_id] = self.weights.get(user_id, 1)
+            else:
+                self._credits[user_id] = credits
+
+            if future.cancelled():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
@@ -0,0 +1,272 @@
+import asyncio
+import ipaddress
+import logging
+import mimetypes
+import os
+import re
+import socket
+from collections import deque
+from urllib.parse import unquote, urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+from yarl import URL
+
+from streaming import BoundedStream, copy_response
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+GENERIC_MIME_TYPES = {'', 'application/octet-stream', 'binary/octet-stream', 'application/download'}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 10
+PRIVATE_ADDRESS_MESSAGE = 'ссылки на локальные и внутренние адреса не поддерживаются'
+
+
+class UrlDownloadError(Exception):
+    pass
+
+
+class BlockedAddressError(OSError):
+    pass
+
+
+def parse_address(host):
+    # IP-адрес в любой записи, которую примет сокет (в том числе 2130706433 и 0x7f.1), или None для имени
+    try:
+        ip = ipaddress.ip_address(host.split('%', 1)[0])
+    except ValueError:
+        try:
+            ip = ipaddress.IPv4Address(socket.inet_aton(host))
+        except OSError:
+            return None
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip
+
+
+def is_public_address(address):
+    ip = parse_address(address)
+    return ip is not None and ip.is_global
+
+
+class PublicResolver(AbstractResolver):
+    # Оставляет только публичные адреса хоста: по ссылке пользователя бот не обращается к себе
+    # (например, к /metrics), к локальной сети и сервису метаданных облака. Соединение идет
+    # на уже проверенный адрес, поэтому повторное разрешение имени в другой адрес ничего не дает.
+    def __init__(self):
+        self._resolver = DefaultResolver()
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        hosts = [entry for entry in await self._resolver.resolve(host, port, family)
+                 if is_public_address(entry['host'])]
+        if not hosts:
+            raise BlockedAddressError(f'{host} разрешается только во внутренние адреса')
+        return hosts
+
+    async def close(self):
+        await self._resolver.close()
+
+
+class RemoteFile:
+    # Результат проверки ссылки: адрес после редиректов, размер (None - сервер его не сообщил),
+    # тип, имя файла и поддержка Range. validator (ETag или Last-Modified) уходит в If-Range:
+    # если файл на сервере изменится между частями, сервер вернет 200 вместо 206 и скачивание прервется.
+    __slots__ = ('url', 'size', 'mime_type', 'file_name', 'ranged', 'validator')
+
+    def __init__(self, url, size, mime_type, file_name, ranged, validator=None):
+        self.url = url
+        self.size = size
+        self.mime_type = mime_type
+        self.file_name = file_name
+        self.ranged = ranged
+        self.validator = validator
+
+
+class UrlDownloader:
+    # Скачивание файлов по прямым ссылкам в BoundedStream для resumable-загрузки в Drive.
+    # Если сервер поддерживает Range и файл не меньше min_ranged_size, файл делится на части
+    # по part_size, которые скачиваются connections запросами параллельно и отдаются в поток по порядку:
+    # в памяти не больше connections + 1 частей. Иначе файл читается одним запросом.
+    def __init__(self, chunk_size=1024 * 1024, buffer_chunks=4, connections=4, part_size=8 * 1024 * 1024,
+                 min_ranged_size=16 * 1024 * 1024, probe_timeout=15.0, max_retries=3, pool_size=20,
+                 allow_private=False):
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+        self.connections = max(1, connections)
+        self.part_size = max(chunk_size, part_size)
+        self.min_ranged_size = min_ranged_size
+        self.probe_timeout = probe_timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.allow_private = allow_private  # Только для локальных стендов и бенчмарков
+        self.session = None
+
+    async def start(self):
+        if self.session is None:
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
+            # Файл нужен байт в байт, как на сервере: сжатие при передаче не запрашивается
+            connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                             resolver=None if self.allow_private else PublicResolver())
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                 headers={'Accept-Encoding': 'identity'})
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def _check_url(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise UrlDownloadError('поддерживаются только ссылки http и https')
+        if self.allow_private:
+            return
+        # Для имени хоста адреса проверяет PublicResolver при соединении
+        if parse_address(parts.hostname) is not None and not is_public_address(parts.hostname):
+            raise UrlDownloadError(PRIVATE_ADDRESS_MESSAGE)
+
+    async def _request(self, method, url, **kwargs):
+        # Перенаправления проходятся вручную: адрес каждого перехода проверяется заново
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_url(url)
+            response = await self.session.request(method, url, allow_redirects=False, **kwargs)
+            location = response.headers.get('Location')
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            response.release()
+            url = str(response.url.join(URL(location)))
+        raise UrlDownloadError('слишком много перенаправлений')
+
+    def _error(self, error, url, message):
+        # Пользователь видит только общую причину: статус и тип ошибки соединения уходят в лог
+        if isinstance(error, aiohttp.ClientConnectorError) and isinstance(error.os_error, BlockedAddressError):
+            return UrlDownloadError(PRIVATE_ADDRESS_MESSAGE)
+        logger.warning(f"Ошибка запроса {url}: {error!r}")
+        return UrlDownloadError(message)
+
+    async def probe(self, url):
+        if self.session is None:
+            await self.start()
+
+        timeout = aiohttp.ClientTimeout(total=self.probe_timeout)
+        try:
+            async with await self._request('HEAD', url, timeout=timeout) as response:
+                if response.status not in (403, 405, 501):
+                    response.raise_for_status()
+                    size = response.headers.get('Content-Length')
+                    ranged = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                    return self._describe(response, int(size) if size else None, ranged)
+            # Сервер не принимает HEAD: размер и поддержка Range узнаются запросом первого байта
+            async with await self._request('GET', url, headers={'Range': 'bytes=0-0'}, timeout=timeout) as response:
+                response.raise_for_status()
+                if response.status == 206:
+                    match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+                    size = int(match.group(3)) if match and match.group(3) != '*' else None
+                    return self._describe(response, size, size is not None)
+                size = response.headers.get('Content-Length')
+                return self._describe(response, int(size) if size else None, False)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise self._error(e, url, 'ссылка недоступна') from e
+
+    def _describe(self, response, size, ranged):
+        if response.headers.get('Content-Encoding', 'identity') != 'identity':
+            # Content-Length сжатого ответа не совпадает с размером файла
+            size, ranged = None, False
+        file_name = None
+        if response.content_disposition and response.content_disposition.filename:
+            file_name = os.path.basename(response.content_disposition.filename)
+        if not file_name:
+            file_name = unquote(os.path.basename(response.url.path)) or None
+
+        mime_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if mime_type in GENERIC_MIME_TYPES:
+            mime_type = (file_name and mimetypes.guess_type(file_name)[0]) or 'application/octet-stream'
+        if file_name and not os.path.splitext(file_name)[1]:
+            file_name += mimetypes.guess_extension(mime_type) or ''
+
+        validator = response.headers.get('ETag')
+        if not validator or validator.startswith('W/'):
+            validator = response.headers.get('Last-Modified')
+        return RemoteFile(str(response.url), size, mime_type, file_name, ranged and bool(size), validator)
+
+    def open(self, remote, offset=0, on_bytes=None, limit=None):
+        # limit - наибольший допустимый размер, когда сервер не сообщил размер файла
+        stream = BoundedStream(self.buffer_chunks)
+        if remote.ranged and self.connections > 1 and remote.size - offset >= self.min_ranged_size:
+            stream.attach(lambda target: self._produce_parts(target, remote, offset, on_bytes))
+        else:
+            stream.attach(lambda target: self._produce_single(target, remote, offset, on_bytes, limit))
+        return stream
+
+    async def _produce_single(self, target, remote, offset, on_bytes, limit):
+        if self.session is None:
+            await self.start()
+        headers = {'Range': f'bytes={offset}-'} if offset and remote.ranged else None
+        received = 0
+
+        def count(size):
+            nonlocal received
+            received += size
+            if limit and offset + received > limit:
+                raise UrlDownloadError('файл по ссылке больше допустимого размера')
+            if on_bytes:
+                on_bytes(size)
+
+        try:
+            async with await self._request('GET', remote.url, headers=headers) as response:
+                response.raise_for_status()
+                await copy_response(response, target, self.chunk_size, offset, count)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise self._error(e, remote.url, 'не удалось скачать файл по ссылке') from e
+        if remote.size is not None and offset + received != remote.size:
+            raise UrlDownloadError(f'получено {offset + received} байт из {remote.size}')
+
+    async def _produce_parts(self, target, remote, offset, on_bytes):
+        if self.session is None:
+            await self.start()
+        parts = deque((start, min(start + self.part_size, remote.size) - 1)
+                      for start in range(offset, remote.size, self.part_size))
+        window = deque()
+        try:
+            while parts or window:
+                while parts and len(window) < self.connections:
+                    start, end = parts.popleft()
+                    window.append(asyncio.create_task(self._fetch_part(remote, start, end, on_bytes)))
+                data = await window.popleft()
+                for position in range(0, len(data), self.chunk_size):
+                    await target.put(data[position:position + self.chunk_size])
+        finally:
+            for task in window:
+                task.cancel()
+
+    async def _fetch_part(self, remote, start, end, on_bytes):
+        headers = {'Range': f'bytes={start}-{end}'}
+        if remote.validator:
+            headers['If-Range'] = remote.validator
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with await self._request('GET', remote.url, headers=headers) as response:
+                    response.raise_for_status()
+                    if response.status != 206:
+                        raise UrlDownloadError('файл по ссылке изменился во время скачивания')
+                    data = await response.read()
+                if len(data) == end - start + 1:
+                    if on_bytes:
+                        on_bytes(len(data))
+                    return data
+                error = f'получено {len(data)} байт из {end - start + 1}'
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500 and e.status != 429:
+                    raise self._error(e, remote.url, 'не удалось скачать файл по ссылке') from e
+                error = f'сервер вернул {e.status}'
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise self._error(e, remote.url, 'не удалось скачать файл по ссылке') from e
+                error = e.__class__.__name__
+            if attempt == self.max_retries:
+                logger.warning(f"Не удалось скачать байты {start}-{end} {remote.url}: {error}")
+                raise UrlDownloadError('не удалось скачать файл по ссылке')
+            logger.warning(f"Повтор скачивания байтов {start}-{end} {remote.url}: {error}")
+            await asyncio.sleep(min(2 ** attempt, 10))
@@ -0,0 +1,104 @@
+import asyncio
+import hmac
+import logging
+import secrets
+import signal
+import time
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    # Встроенный HTTP-сервер для приема обновлений от Telegram: обновление кладется
+    # в update_queue приложения, ответ 200 отправляется сразу, не дожидаясь обработки.
+    def __init__(self, application, path='/telegram', secret_token=None, host='0.0.0.0', port=8080):
+        self.application = application
+        self.path = path
+        # Без секрета любой POST на открытый порт принимался бы как обновление от Telegram
+        # (в том числе команды от имени администратора), поэтому пустой секрет заменяется случайным
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.host = host
+        self.port = port
+        self.updates_received = 0
+        self.started_at = None
+        self._runner = None
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.started_at = time.monotonic()
+        logger.info(f"Вебхук слушает {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_update(self, request):
+        received = request.headers.get(SECRET_TOKEN_HEADER, '')
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            logger.warning(f"Отклонен запрос вебхука без верного секрета от {request.remote}")
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        update = Update.de_json(data, self.application.bot)
+        if update is None:
+            return web.Response(status=400)
+        self.updates_received += 1
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(self, request):
+        return web.json_response({
+            'status': 'ok' if self.application.running else 'starting',
+            'uptime': round(time.monotonic() - self.started_at, 1) if self.started_at else 0,
+            'updates_received': self.updates_received,
+            'update_queue': self.application.update_queue.qsize()
+        })
+
+
+async def run_webhook(application, webhook_url, path, secret_token=None, host='0.0.0.0', port=8080,
+                      max_connections=40):
+    # Аналог run_polling для вебхука: post_init/post_shutdown вызываются здесь же,
+    # т.к. Application вызывает их только внутри собственных run_* методов
+    server = WebhookServer(application, path, secret_token, host, port)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        await application.bot.set_webhook(
+            url=f"{webhook_url.rstrip('/')}{path}",
+            secret_token=server.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=max_connections
+        )
+        await application.start()
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()